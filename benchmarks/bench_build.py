@@ -0,0 +1,333 @@
+"""Time Sphinx builds of synthetic projects, phase by phase.
+
+Each build runs in a fresh subprocess so that peak memory is measured
+independently. Results are written as JSON so they can be tracked over time,
+e.g.::
+
+    python benchmarks/bench_build.py --processes 2000 --objects 500 \\
+        --builder probs_rdf --builder html -o results.json
+
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate import generate_project  # noqa: E402
+
+PHASES = {
+    # phase name -> (module, attribute path) of the function to time
+    "directives": [
+        ("sphinx_probs_rdf.directives", "SystemObjectDescription.run"),
+        ("sphinx_probs_rdf.directives", "ObjectEquivalentTo.run"),
+        ("sphinx_probs_rdf.directives", "TTL.run"),
+    ],
+    "transform": [("sphinx_probs_rdf.resolve", "ProbsTransform.run")],
+    "resolve_xref": [("sphinx_probs_rdf.directives", "SystemDomain.resolve_xref")],
+    "postprocess": [("sphinx_probs_rdf.postprocess", "postprocess")],
+    "serialize": [("rdflib.graph", "Graph.serialize")],
+}
+
+
+class PhaseTimer:
+    """Accumulate time spent in instrumented functions.
+
+    Re-entrant calls (e.g. nested directives) are only counted once.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._depth = defaultdict(int)
+
+    def wrap(self, phase, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._depth[phase] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth[phase] -= 1
+                if self._depth[phase] == 0:
+                    self.totals[phase] += time.perf_counter() - start
+                    self.calls[phase] += 1
+
+        return wrapper
+
+    def instrument(self):
+        import importlib
+
+        for phase, targets in PHASES.items():
+            for module_name, attr_path in targets:
+                module = importlib.import_module(module_name)
+                *owner_path, name = attr_path.split(".")
+                owner = module
+                for part in owner_path:
+                    owner = getattr(owner, part)
+                original = getattr(owner, name)
+                wrapped = self.wrap(phase, original)
+                setattr(owner, name, wrapped)
+                if owner is module:
+                    # Also patch references imported by name elsewhere
+                    for other in list(sys.modules.values()):
+                        if (
+                            getattr(other, "__name__", "").startswith(
+                                "sphinx_probs_rdf"
+                            )
+                            and getattr(other, name, None) is original
+                        ):
+                            setattr(other, name, wrapped)
+
+
+def _peak_memory_kib(who="self"):
+    try:
+        import resource
+    except ImportError:  # pragma: no cover -- not available on Windows
+        return None
+    if who == "children":
+        # Largest of the parallel reading/writing processes
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _private_memory_kib(pid):
+    """Memory of process `pid` which is not shared with others (its USS)."""
+    total = 0
+    with open("/proc/%d/smaps_rollup" % pid) as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+class WorkerMemorySampler:
+    """Sample the private memory of this process's children (Linux only).
+
+    Peak RSS counts pages shared with the parent after forking, so it does
+    not show how much of the parent's memory each worker has copied; this
+    polls the workers' private memory instead.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_worker = 0  # largest private memory of one worker
+        self.peak_total = 0  # largest sum over the workers alive at once
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _children(self):
+        me = os.getpid()
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open("/proc/%s/stat" % name) as f:
+                    # The command may contain spaces, but is in parentheses
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == me:
+                yield int(name)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            total = 0
+            for pid in self._children():
+                try:
+                    private = _private_memory_kib(pid)
+                except OSError:
+                    continue  # finished
+                self.peak_worker = max(self.peak_worker, private)
+                total += private
+            self.peak_total = max(self.peak_total, total)
+
+    def start(self, *args):
+        if os.path.exists("/proc/self/smaps_rollup") and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, *args):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def run_build(
+    srcdir, outdir, builder, parallel=1, confoverrides=None, gc_freeze=True
+):
+    """Run one build in this process and return a dict of timings.
+
+    :param gc_freeze: set to False to compare with writing workers which
+        do not share a frozen environment (see `view.freeze_for_parallel_write`).
+    """
+    import sphinx_probs_rdf  # noqa: F401 -- import before instrumenting
+    from sphinx.application import Sphinx
+
+    # Write output.ttl in this process, so that the postprocess and serialize
+    # phases are timed in HTML builds too
+    confoverrides = {"probs_rdf_background_export": False, **(confoverrides or {})}
+
+    if not gc_freeze:
+        import gc
+
+        gc.freeze = lambda: None
+
+    timer = PhaseTimer()
+    timer.instrument()
+
+    marks = {}
+
+    def mark(name):
+        def handler(*args):
+            marks[name] = time.perf_counter()
+
+        return handler
+
+    sampler = WorkerMemorySampler()
+
+    warnings = io.StringIO()
+    start = time.perf_counter()
+    app = Sphinx(
+        srcdir,
+        srcdir,
+        os.path.join(outdir, builder),
+        os.path.join(outdir, builder, ".doctrees"),
+        builder,
+        confoverrides=confoverrides,
+        status=None,
+        warning=warnings,
+        freshenv=True,
+        parallel=parallel,
+    )
+    app.connect("env-before-read-docs", mark("read_start"))
+    app.connect("env-updated", mark("read_end"))
+    app.connect("build-finished", mark("write_end"))
+    if parallel > 1:
+        # Only the writing workers, not those reading in parallel
+        app.connect("env-updated", sampler.start)
+    setup_done = time.perf_counter()
+    try:
+        app.build(force_all=True)
+    finally:
+        sampler.stop()
+    end = time.perf_counter()
+
+    phases = dict(timer.totals)
+    phases["setup"] = setup_done - start
+    if "read_start" in marks and "read_end" in marks:
+        phases["read"] = marks["read_end"] - marks["read_start"]
+    if "read_end" in marks and "write_end" in marks:
+        phases["write"] = marks["write_end"] - marks["read_end"]
+
+    return {
+        "builder": builder,
+        "parallel": parallel,
+        "total": end - start,
+        "phases": phases,
+        "calls": dict(timer.calls),
+        "peak_memory_kib": _peak_memory_kib(),
+        "peak_worker_memory_kib": _peak_memory_kib("children"),
+        "peak_worker_private_kib": sampler.peak_worker or None,
+        "peak_workers_private_total_kib": sampler.peak_total or None,
+        "gc_freeze": gc_freeze,
+        "warnings": len(warnings.getvalue().splitlines()),
+    }
+
+
+def run_build_isolated(*args, **kwargs):
+    """Run `run_build` in a fresh interpreter."""
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=ctx) as executor:
+        return executor.submit(run_build, *args, **kwargs).result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", choices=["rst", "myst"], action="append")
+    parser.add_argument("--processes", type=int, default=1000)
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--recipe-lines", type=int, default=2)
+    parser.add_argument("--xrefs", type=int, default=1)
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--builder", action="append")
+    parser.add_argument("-j", "--parallel", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workdir", help="where to generate projects (default: temp)")
+    parser.add_argument("-o", "--output", help="JSON file to write results to")
+    args = parser.parse_args(argv)
+
+    formats = args.format or ["rst", "myst"]
+    builders = args.builder or ["probs_rdf", "html"]
+    params = {
+        "processes": args.processes,
+        "objects": args.objects,
+        "depth": args.depth,
+        "recipe_lines": args.recipe_lines,
+        "xrefs": args.xrefs,
+        "docs": args.docs,
+        "seed": args.seed,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        for fmt in formats:
+            srcdir = os.path.join(workdir, "src-" + fmt)
+            generate_project(srcdir, fmt=fmt, **params)
+            for builder in builders:
+                for i in range(args.repeat):
+                    outdir = os.path.join(workdir, "out-%s-%d" % (fmt, i))
+                    result = run_build_isolated(
+                        srcdir, outdir, builder, parallel=args.parallel
+                    )
+                    result["format"] = fmt
+                    results.append(result)
+                    print(
+                        "%-5s %-10s total %7.2fs  peak %s KiB  %s"
+                        % (
+                            fmt,
+                            builder,
+                            result["total"],
+                            result["peak_memory_kib"],
+                            "  ".join(
+                                "%s=%.2f" % kv
+                                for kv in sorted(result["phases"].items())
+                            ),
+                        ),
+                        file=sys.stderr,
+                    )
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
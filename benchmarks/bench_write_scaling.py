@@ -0,0 +1,114 @@
+"""Time the write phase of HTML builds with increasing numbers of processes.
+
+Sphinx forks worker processes to write documents in parallel (``-j``). This
+generates one synthetic project, builds it with each number of processes in
+turn, and reports the time spent writing and the peak memory of the main
+process and of the workers, e.g.::
+
+    python benchmarks/bench_write_scaling.py --processes 20000 --docs 64 \\
+        --workers 1,2,4,8,16 --compare-gc-freeze -o scaling.json
+
+The workers' memory is given as their peak RSS, which includes pages still
+shared with the main process, and (on Linux) as the peak of their private
+memory: what they have copied from the main process or allocated. With
+``--compare-gc-freeze``, parallel builds are repeated without freezing the
+environment in the garbage collector before the workers fork, to show how
+much copying that saves.
+
+Speed-ups are limited by the number of CPUs available, which is included in
+the results. ``output.ttl`` is written in the main process rather than in the
+background, so that it does not compete with the workers.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_build import run_build_isolated  # noqa: E402
+from generate import generate_project  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", choices=["rst", "myst"], default="rst")
+    parser.add_argument("--processes", type=int, default=5000)
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--recipe-lines", type=int, default=2)
+    parser.add_argument("--xrefs", type=int, default=1)
+    parser.add_argument("--docs", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", default="1,2,4,8,16",
+                        help="comma-separated numbers of processes")
+    parser.add_argument("--compare-gc-freeze", action="store_true",
+                        help="also build without gc.freeze() before writing")
+    parser.add_argument("--workdir", help="where to generate projects (default: temp)")
+    parser.add_argument("-o", "--output", help="JSON file to write results to")
+    args = parser.parse_args(argv)
+
+    params = {
+        "processes": args.processes,
+        "objects": args.objects,
+        "depth": args.depth,
+        "recipe_lines": args.recipe_lines,
+        "xrefs": args.xrefs,
+        "docs": args.docs,
+        "seed": args.seed,
+    }
+    workers = [int(n) for n in args.workers.split(",")]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        srcdir = os.path.join(workdir, "src-" + args.format)
+        generate_project(srcdir, fmt=args.format, **params)
+        runs = [(n, True) for n in workers]
+        if args.compare_gc_freeze:
+            runs += [(n, False) for n in workers if n > 1]
+        for n, gc_freeze in runs:
+            outdir = os.path.join(workdir, "out-j%d" % n)
+            result = run_build_isolated(
+                srcdir, outdir, "html", parallel=n, gc_freeze=gc_freeze
+            )
+            results.append(result)
+            base = results[0]["phases"]["write"]
+            line = "-j %-3d %-9s write %7.2fs (x%.2f)  transform %6.2fs" % (
+                n,
+                "" if gc_freeze else "no-freeze",
+                result["phases"]["write"],
+                base / result["phases"]["write"],
+                result["phases"].get("transform", 0.0),
+            )
+            line += "  peak %s KiB" % result["peak_memory_kib"]
+            if n > 1:
+                line += "  workers %s KiB (private %s KiB, total %s KiB)" % (
+                    result["peak_worker_memory_kib"],
+                    result["peak_worker_private_kib"],
+                    result["peak_workers_private_total_kib"],
+                )
+            print(line, file=sys.stderr)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Generate synthetic Sphinx projects for benchmarking.
+
+The generated projects contain a configurable number of processes and
+objects, spread over several documents, with nested process hierarchies,
+quantified recipes and cross-references between things.
+"""
+
+import argparse
+import os
+import random
+from typing import List
+
+CONF_TEMPLATE = """\
+extensions = {extensions!r}
+probs_rdf_system_prefix = "http://example.org/system/"
+exclude_patterns = ["_build"]
+"""
+
+
+def _object_name(i):
+    return "Obj%d" % i
+
+
+def _process_name(i):
+    return "P%d" % i
+
+
+def _recipe_lines(rng, n_objects, recipe_lines):
+    """Return (consumes, produces) lists of "Object = amount unit" strings."""
+    chosen = rng.sample(range(n_objects), min(n_objects, 2 * recipe_lines))
+    lines = ["%s = %.3f kg" % (_object_name(i), rng.uniform(0.1, 10.0)) for i in chosen]
+    split = max(1, len(lines) // 2)
+    return lines[:split], lines[split:]
+
+
+def _rst_process(name, label, consumes, produces, xrefs, become_parent):
+    out = [".. system:process:: %s" % name, "    :label: %s" % label]
+    if become_parent:
+        out.append("    :become_parent:")
+    if consumes:
+        out.append("    :consumes:")
+        out.extend("        %s" % line for line in consumes)
+    if produces:
+        out.append("    :produces:")
+        out.extend("        %s" % line for line in produces)
+    out.append("")
+    if xrefs:
+        refs = ", ".join(":system:ref:`%s`" % x for x in xrefs)
+        out.append("    See also %s." % refs)
+        out.append("")
+    return out
+
+
+def _myst_process(name, label, consumes, produces, xrefs, become_parent):
+    out = ["```{system:process} %s" % name, "---", "label: %s" % label]
+    if become_parent:
+        out.append("become_parent:")
+    if consumes:
+        out.append("consumes: |")
+        out.extend("  %s" % line for line in consumes)
+    if produces:
+        out.append("produces: |")
+        out.extend("  %s" % line for line in produces)
+    out.append("---")
+    if xrefs:
+        refs = ", ".join("{system:ref}`%s`" % x for x in xrefs)
+        out.append("See also %s." % refs)
+    out.append("```")
+    out.append("")
+    return out
+
+
+def _rst_object(name, label):
+    return [".. system:object:: %s" % name, "    :label: %s" % label, ""]
+
+
+def _myst_object(name, label):
+    return [
+        "```{system:object} %s" % name,
+        "---",
+        "label: %s" % label,
+        "---",
+        "```",
+        "",
+    ]
+
+
+def generate_project(
+    path: str,
+    fmt: str = "rst",
+    processes: int = 100,
+    objects: int = 50,
+    depth: int = 2,
+    recipe_lines: int = 2,
+    xrefs: int = 1,
+    docs: int = 4,
+    seed: int = 0,
+) -> List[str]:
+    """Write a synthetic project to `path` and return the document names.
+
+    :param fmt: "rst" or "myst"
+    :param processes: total number of processes
+    :param objects: total number of objects
+    :param depth: nesting depth of process hierarchies (1 = flat)
+    :param recipe_lines: number of consumed (and produced) items per process
+    :param xrefs: number of cross-references in each process's content
+    :param docs: number of documents to spread processes and objects over
+    """
+    if fmt not in ("rst", "myst"):
+        raise ValueError("Unknown format %r" % fmt)
+    rng = random.Random(seed)
+    suffix = ".rst" if fmt == "rst" else ".md"
+    make_process = _rst_process if fmt == "rst" else _myst_process
+    make_object = _rst_object if fmt == "rst" else _myst_object
+    end_sub = (
+        ".. end-sub-processes::\n" if fmt == "rst" else "```{end-sub-processes}\n```\n"
+    )
+
+    os.makedirs(path, exist_ok=True)
+    extensions = ["sphinx_probs_rdf"]
+    if fmt == "myst":
+        extensions.insert(0, "myst_parser")
+    with open(os.path.join(path, "conf.py"), "w") as f:
+        f.write(CONF_TEMPLATE.format(extensions=extensions))
+
+    docs = max(1, docs)
+    docnames = ["doc%d" % i for i in range(docs)]
+    bodies: List[List[str]] = [["%s\n%s\n" % (d, "=" * len(d))] for d in docnames]
+    if fmt == "myst":
+        bodies = [["# %s\n" % d] for d in docnames]
+
+    for i in range(objects):
+        body = bodies[i * docs // max(1, objects)]
+        body.extend(make_object(_object_name(i), "Object %d" % i))
+
+    # Processes are written in runs: each run opens `depth - 1` parents with
+    # :become_parent: before writing a leaf and closing them again.
+    open_parents = 0
+    for i in range(processes):
+        d = i * docs // max(1, processes)
+        body = bodies[d]
+        last_in_doc = (i + 1) * docs // max(1, processes) != d or i == processes - 1
+        become_parent = open_parents < depth - 1 and not last_in_doc
+        consumes, produces = (
+            _recipe_lines(rng, objects, recipe_lines) if objects else ([], [])
+        )
+        targets = [
+            (
+                _object_name(rng.randrange(objects))
+                if objects and rng.random() < 0.5
+                else _process_name(rng.randrange(processes))
+            )
+            for _ in range(xrefs)
+        ]
+        body.extend(
+            make_process(
+                _process_name(i),
+                "Process %d" % i,
+                consumes,
+                produces,
+                targets,
+                become_parent,
+            )
+        )
+        if become_parent:
+            open_parents += 1
+        elif open_parents and (rng.random() < 0.5 or last_in_doc):
+            while open_parents:
+                body.append(end_sub)
+                open_parents -= 1
+
+    index = ["Benchmark\n=========\n" if fmt == "rst" else "# Benchmark\n"]
+    if fmt == "rst":
+        index.append(".. toctree::\n\n" + "".join("   %s\n" % d for d in docnames))
+    else:
+        index.append("```{toctree}\n" + "".join("%s\n" % d for d in docnames) + "```\n")
+    with open(os.path.join(path, "index" + suffix), "w") as f:
+        f.write("\n".join(index))
+    for docname, body in zip(docnames, bodies):
+        with open(os.path.join(path, docname + suffix), "w") as f:
+            f.write("\n".join(body))
+
+    return ["index"] + docnames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="directory to write the project to")
+    parser.add_argument("--format", choices=["rst", "myst"], default="rst")
+    parser.add_argument("--processes", type=int, default=100)
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--recipe-lines", type=int, default=2)
+    parser.add_argument("--xrefs", type=int, default=1)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    generate_project(
+        args.path,
+        fmt=args.format,
+        processes=args.processes,
+        objects=args.objects,
+        depth=args.depth,
+        recipe_lines=args.recipe_lines,
+        xrefs=args.xrefs,
+        docs=args.docs,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
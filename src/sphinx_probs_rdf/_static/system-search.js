@@ -0,0 +1,74 @@
+/*
+ * Search widget for system processes and objects (the system:search
+ * directive). The index is written by search.py, and only fetched when a
+ * search box is first used.
+ */
+(function () {
+  "use strict";
+
+  const MAX_RESULTS = 50;
+  let index = null;
+
+  function contentRoot() {
+    const root = document.documentElement.dataset.content_root;
+    if (root !== undefined) return root;
+    if (typeof DOCUMENTATION_OPTIONS !== "undefined") {
+      return DOCUMENTATION_OPTIONS.URL_ROOT || "";
+    }
+    return "";
+  }
+
+  function loadIndex() {
+    if (index === null) {
+      index = fetch(contentRoot() + "_static/probs_rdf_search.json")
+        .then((response) => response.json());
+    }
+    return index;
+  }
+
+  function search(data, query) {
+    const terms = query.toLowerCase().split(/\s+/).filter(Boolean);
+    const results = [];
+    if (!terms.length) return results;
+    for (const [name, label, type, doc, anchor] of data.things) {
+      const text = (name + " " + label).toLowerCase();
+      if (terms.every((term) => text.includes(term))) {
+        results.push({
+          name: name,
+          label: label,
+          type: data.types[type],
+          href: contentRoot() + data.docs[doc] + "#" + anchor,
+        });
+        if (results.length >= MAX_RESULTS) break;
+      }
+    }
+    return results;
+  }
+
+  function setUp(widget) {
+    const input = widget.querySelector("input");
+    const list = widget.querySelector("ul");
+    input.addEventListener("focus", loadIndex, { once: true });
+    input.addEventListener("input", () => {
+      const query = input.value;
+      loadIndex().then((data) => {
+        if (input.value !== query) return; // a newer search is running
+        list.replaceChildren();
+        for (const result of search(data, query)) {
+          const item = document.createElement("li");
+          const link = document.createElement("a");
+          link.href = result.href;
+          link.textContent = result.name;
+          item.append(link);
+          if (result.label) item.append(" (" + result.label + ")");
+          item.append(" — " + result.type);
+          list.append(item);
+        }
+      });
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll(".system-search").forEach(setUp);
+  });
+})();
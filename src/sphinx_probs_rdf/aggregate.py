@@ -0,0 +1,110 @@
+"""Aggregation of process recipes up the process composition hierarchy."""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from .directives import RecipeEntry
+
+if TYPE_CHECKING:
+    from .hierarchy import Hierarchy
+
+# Net flows smaller than this (e.g. rounding errors left after netting a flow
+# produced by one child and consumed by another) are dropped
+TOLERANCE = 1e-9
+
+# (object, metric) -> net amount produced
+Flows = Dict[Tuple[str, Optional[str]], float]
+
+
+def recipe_flows(entries: List[RecipeEntry]) -> Flows:
+    """Net flows of a recipe: produced amounts are positive, consumed negative."""
+    flows: Flows = {}
+    for entry in entries:
+        if entry.amount is None:
+            continue
+        key = (entry.object, entry.metric)
+        sign = 1 if entry.direction == "produces" else -1
+        flows[key] = flows.get(key, 0.0) + sign * entry.amount
+    return flows
+
+
+def flows_to_recipe(flows: Flows) -> List[RecipeEntry]:
+    """Recipe entries for net flows, consumed objects first, then sorted."""
+    entries = [
+        RecipeEntry(
+            obj,
+            "produces" if amount > 0 else "consumes",
+            abs(amount),
+            metric,
+        )
+        for (obj, metric), amount in flows.items()
+        if abs(amount) > TOLERANCE
+    ]
+    entries.sort(key=lambda e: (e.direction, e.object, e.metric or ""))
+    return entries
+
+
+def aggregate_recipes(
+    hierarchy: "Hierarchy", process_recipe: Dict[str, List[RecipeEntry]]
+) -> Dict[str, List[RecipeEntry]]:
+    """Roll recipes up the process hierarchy.
+
+    The aggregate recipe of a process without a recipe of its own is the sum
+    of its children's recipes (or their aggregates), by object and metric.
+    Flows between children cancel out: an object produced by one child and
+    consumed in the same amount by another does not appear in the aggregate.
+    Processes with a recipe of their own keep it, and it is used for their
+    ancestors' aggregates instead of their children's. Lines without an
+    amount are left out, and a recipe with no amounts at all (listing flows
+    only descriptively) is aggregated as if the process had none.
+
+    The hierarchy is visited once, children before parents, so the time
+    taken is proportional to the total size of the aggregate recipes.
+    Processes in cycles are not aggregated.
+    """
+    flows: Dict[str, Flows] = {}
+    result = {}
+    for process in reversed(hierarchy.order):
+        own = recipe_flows(process_recipe.get(process, []))
+        if own:
+            flows[process] = own
+            continue
+        total: Flows = {}
+        children = hierarchy.children(process)
+        for child in children:
+            if child not in flows:
+                continue  # part of a cycle
+            for key, amount in flows[child].items():
+                total[key] = total.get(key, 0.0) + amount
+        flows[process] = total
+        if children:
+            entries = flows_to_recipe(total)
+            if entries:
+                result[process] = entries
+    return result
+
+
+def add_aggregate_recipes(graph, recipes: Dict[str, List[RecipeEntry]]):
+    """Add aggregate recipes to `graph`.
+
+    They have the same form as process recipes, but are linked to processes
+    by ``probs_rdf:hasAggregateRecipe`` rather than ``rec:hasRecipe``, so that
+    they are not mistaken for (and counted again with) the recipes they sum.
+    The PRObs recipe vocabulary has no term for derived recipes, so this one
+    is in this extension's own namespace.
+    """
+    from rdflib import BNode, Literal, URIRef  # type: ignore
+    from .namespaces import PROBS_RDF, PROBS_RECIPE
+
+    def quads():
+        context = getattr(graph, "default_context", graph)
+        for process, entries in recipes.items():
+            recipe = BNode()
+            yield URIRef(process), PROBS_RDF.hasAggregateRecipe, recipe, context
+            for entry in entries:
+                item = BNode()
+                yield recipe, PROBS_RECIPE[entry.direction], item, context
+                yield item, PROBS_RECIPE.object, URIRef(entry.object), context
+                yield item, PROBS_RECIPE.quantity, Literal(entry.amount), context
+                yield item, PROBS_RECIPE.metric, URIRef(entry.metric), context
+
+    graph.addN(quads())
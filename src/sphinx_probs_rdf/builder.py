@@ -1,17 +1,75 @@
 import os.path
-from typing import Set, cast, Optional
+from typing import Iterable, List, Optional, Sequence, Set, cast
 
 from docutils.nodes import Node
 from sphinx.builders import Builder
 from sphinx.locale import __
 from sphinx.util import logging
 
-from .postprocess import postprocess
 from .directives import SystemDomain
 
 logger = logging.getLogger(__name__)
 
 
+OUTPUT_FILENAME = "output.ttl"
+
+
+def write_graph(env, outdir: str, suffix: str = "") -> List[str]:
+    """Postprocess the system graph and write it to `outdir`/output.ttl.
+
+    With `probs_rdf_binary_output`, it is also written to
+    `outdir`/output.rdfbin (see `dump.write_dump`), and with
+    `probs_rdf_jsonld_output` to `outdir`/output.jsonld. With
+    `probs_rdf_stats`, statistics of the model are written too.
+
+    :param suffix: added to the names of all the files written.
+    :return: paths of the files written, without `suffix`.
+    """
+    from .postprocess import postprocessed
+
+    domain = cast(SystemDomain, env.get_domain("system"))
+    written: List[str] = []
+
+    def path(name: str) -> str:
+        written.append(os.path.join(outdir, name))
+        return written[-1] + suffix
+
+    filename = path(OUTPUT_FILENAME)
+    # N-Triples is a subset of Turtle, and much faster to write
+    fmt = "nt" if env.config.probs_rdf_output_format == "nt" else "turtle"
+    if env.config.probs_rdf_stats:
+        from .stats import STATS_HTML_FILENAME, STATS_JSON_FILENAME, write_stats
+
+        write_stats(env, path(STATS_JSON_FILENAME), path(STATS_HTML_FILENAME))
+    aggregates = None
+    if env.config.probs_rdf_aggregate_recipes:
+        aggregates = domain.get_aggregate_recipes()
+    with postprocessed(
+        domain.graph,
+        equivalence=env.config.probs_rdf_materialize_equivalence,
+        aggregates=aggregates,
+    ) as graph:
+        with open(filename, "wb") as f:
+            if fmt == "turtle" and domain.store_path() is not None:
+                # Write from the database one subject at a time, rather than
+                # sorting the whole graph in memory
+                from .sqlitestore import serialize_turtle
+
+                serialize_turtle(graph, f)
+            else:
+                graph.serialize(f, format=fmt, encoding="utf-8")
+        if env.config.probs_rdf_binary_output:
+            from .dump import DUMP_FILENAME, write_dump
+
+            write_dump(graph, path(DUMP_FILENAME))
+        if env.config.probs_rdf_jsonld_output:
+            from .jsonld import JSONLD_FILENAME, jsonld_context, write_jsonld
+
+            with open(path(JSONLD_FILENAME), "w", encoding="utf-8") as text:
+                write_jsonld(graph, text, jsonld_context(env.config))
+    return written
+
+
 class ProbsSystemRDFBuilder(Builder):
     """
     Extracts RDF from system definitions
@@ -30,16 +88,30 @@ class ProbsSystemRDFBuilder(Builder):
     def prepare_writing(self, docnames: Set[str]) -> None:
         return
 
+    def write(
+        self,
+        build_docnames: Optional[Iterable[str]],
+        updated_docnames: Sequence[str],
+        method: str = "update",
+    ) -> None:
+        # The graph is complete once reading has finished, so skip resolving
+        # doctrees and running post-transforms for documents that are never
+        # written.
+        return
+
     def write_doc(self, docname: str, doctree: Node) -> None:
         return
 
     def finish(self) -> None:
-        assert self.app.builder
-        env = self.app.builder.env
-        assert env is not None
-        domain = cast(SystemDomain, env.get_domain("system"))
-        filename = os.path.join(self.outdir, 'output.ttl')
-        graph = domain.graph
-        postprocess(graph)
-        with open(filename, 'wb') as f:
-            graph.serialize(f, format="turtle")
+        assert self.env is not None
+        write_graph(self.env, self.outdir)
+        if self.config.probs_rdf_sqlite_output:
+            from .sqlexport import SQLITE_FILENAME, export_sqlite
+
+            updated, removed = export_sqlite(
+                self.env, os.path.join(self.outdir, SQLITE_FILENAME)
+            )
+            logger.info(
+                __("%s: %d documents updated, %d removed"),
+                SQLITE_FILENAME, updated, removed,
+            )
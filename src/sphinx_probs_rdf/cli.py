@@ -0,0 +1,255 @@
+"""Command line interface, run as ``python -m sphinx_probs_rdf``."""
+
+import argparse
+import multiprocessing
+import os
+import os.path
+import sys
+import time
+from typing import Dict, List, Optional
+
+from .version import __version__
+
+
+def jobs_argument(value: str) -> int:
+    """Parse the -j option, as for sphinx-build."""
+    if value == "auto":
+        return multiprocessing.cpu_count()
+    jobs = int(value)
+    if jobs <= 0:
+        raise argparse.ArgumentTypeError("job number should be a positive number")
+    return jobs
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m sphinx_probs_rdf",
+        description="Tools for PRObs system definitions written with Sphinx.",
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser(
+        "extract",
+        help="write the RDF graph without building any documentation",
+        description=(
+            "Read the source files and write OUTPUTDIR/output.ttl, skipping "
+            "the parts of the Sphinx pipeline that are only needed for "
+            "writing documentation."
+        ),
+    )
+    _add_build_arguments(extract)
+    extract.set_defaults(func=extract_command)
+
+    watch = subparsers.add_parser(
+        "watch",
+        help="keep OUTPUTDIR/output.ttl up to date as source files change",
+        description=(
+            "Like `extract`, but keep running and rebuild the RDF graph "
+            "whenever a source file changes. The environment is kept in "
+            "memory, so only changed files are read again. For large graphs, "
+            "use -D probs_rdf_output_format=nt to write N-Triples (which is "
+            "also valid Turtle) much faster."
+        ),
+    )
+    _add_build_arguments(watch)
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=0.25,
+        metavar="SECONDS",
+        help="how often to check for changed files (default: %(default)s)",
+    )
+    watch.set_defaults(func=watch_command)
+
+    return parser
+
+
+def _add_build_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("sourcedir", help="path to documentation source files")
+    parser.add_argument("outputdir", help="path to output directory")
+    parser.add_argument(
+        "-c",
+        dest="confdir",
+        metavar="PATH",
+        help="path where configuration file (conf.py) is located "
+        "(default: same as SOURCEDIR)",
+    )
+    parser.add_argument(
+        "-d",
+        dest="doctreedir",
+        metavar="PATH",
+        help="path for the cached environment and doctree files "
+        "(default: OUTPUTDIR/.doctrees)",
+    )
+    parser.add_argument(
+        "-j",
+        dest="jobs",
+        metavar="N",
+        default=1,
+        type=jobs_argument,
+        help='read files in parallel with N processes ("auto" for the number '
+        "of CPUs)",
+    )
+    parser.add_argument(
+        "-D",
+        dest="define",
+        metavar="setting=value",
+        action="append",
+        default=[],
+        help="override a setting in configuration file",
+    )
+    parser.add_argument(
+        "-E",
+        dest="freshenv",
+        action="store_true",
+        help="don't use a saved environment, always read all files",
+    )
+    parser.add_argument(
+        "-q", dest="quiet", action="store_true", help="no output on stdout"
+    )
+    parser.add_argument(
+        "-W",
+        dest="warningiserror",
+        action="store_true",
+        help="turn warnings into errors",
+    )
+
+
+def _confoverrides(args) -> dict:
+    confoverrides = {}
+    for item in args.define:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit("-D option argument must be in the form name=value")
+        confoverrides[key] = value
+    return confoverrides
+
+
+def make_app(args, confoverrides: dict):
+    """Create a Sphinx application for the probs_rdf builder from `args`."""
+    from sphinx.application import Sphinx
+
+    doctreedir = args.doctreedir or os.path.join(args.outputdir, ".doctrees")
+    return Sphinx(
+        args.sourcedir,
+        args.confdir or args.sourcedir,
+        args.outputdir,
+        doctreedir,
+        "probs_rdf",
+        confoverrides,
+        status=None if args.quiet else sys.stdout,
+        warning=sys.stderr,
+        freshenv=args.freshenv,
+        warningiserror=args.warningiserror,
+        parallel=args.jobs,
+    )
+
+
+def _lean_confoverrides(args) -> dict:
+    confoverrides = _confoverrides(args)
+    # Lean mode skips building documentation nodes which are never written.
+    # As a config value it also keeps this environment separate from any
+    # normal build's.
+    confoverrides["probs_rdf_lean"] = True
+    return confoverrides
+
+
+def extract_command(args) -> int:
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    with patch_docutils(args.confdir or args.sourcedir), docutils_namespace():
+        app = make_app(args, _lean_confoverrides(args))
+        app.build()
+        return app.statuscode
+
+
+def _status(message: str):
+    """Write `message` to the Sphinx app's status stream (nothing with -q)."""
+    from sphinx.util import logging
+
+    logging.getLogger(__name__).info(message)
+
+
+class Watcher:
+    """Rebuild the RDF output of a Sphinx app when its source files change.
+
+    The app, and so the environment including the domain's graph, is kept
+    between builds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.mtimes: Dict[str, float] = {}
+
+    def source_files(self) -> List[str]:
+        """List the source files that would be found by Sphinx."""
+        app = self.app
+        suffixes = tuple(app.config.source_suffix)
+        skip = {os.path.abspath(app.outdir), os.path.abspath(app.doctreedir)}
+        files: List[str] = []
+        for dirpath, dirnames, filenames in os.walk(app.srcdir):
+            dirnames[:] = [
+                d
+                for d in dirnames
+                if not d.startswith(".")
+                and os.path.abspath(os.path.join(dirpath, d)) not in skip
+            ]
+            files.extend(
+                os.path.join(dirpath, f) for f in filenames if f.endswith(suffixes)
+            )
+        files.extend(
+            os.path.join(app.confdir, p) for p in app.config.probs_rdf_paths
+        )
+        return files
+
+    def scan(self) -> Dict[str, float]:
+        mtimes = {}
+        for filename in self.source_files():
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime
+            except OSError:
+                pass
+        return mtimes
+
+    def build(self):
+        self.mtimes = self.scan()
+        self.app.build()
+
+    def poll(self) -> bool:
+        """Rebuild if any source files have changed. Return True if rebuilt."""
+        if self.scan() == self.mtimes:
+            return False
+        start = time.perf_counter()
+        self.build()
+        _status(
+            "Rebuilt %s in %.2fs"
+            % (os.path.join(self.app.outdir, "output.ttl"), time.perf_counter() - start)
+        )
+        return True
+
+
+def watch_command(args) -> int:
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    with patch_docutils(args.confdir or args.sourcedir), docutils_namespace():
+        app = make_app(args, _lean_confoverrides(args))
+        watcher = Watcher(app)
+        watcher.build()
+        _status("Watching %s for changes (press Ctrl+C to stop)" % app.srcdir)
+        try:
+            while True:
+                time.sleep(args.interval)
+                try:
+                    watcher.poll()
+                except Exception as exc:
+                    # Keep watching: the error may be fixed by the next save
+                    print("Build failed: %s" % exc, file=sys.stderr)
+        except KeyboardInterrupt:
+            return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,349 @@
+"""Diagrams of processes: their parents and children, and recipe flows.
+
+With ``probs_rdf_process_diagrams = True``, HTML process definitions include
+an SVG diagram with the process in the middle, its parents above and
+children below, the objects it consumes on the left and those it produces on
+the right. The SVG is written directly (Graphviz is not needed).
+
+Each diagram is described by a small `DiagramSpec` holding just what it
+shows, and named by a hash of it: ``_images/probs_rdf/<hash>.svg``. Diagrams
+which already exist in the output directory are not rendered again, so only
+processes whose neighbourhood has changed cost anything in incremental
+builds. The others are rendered at the end of the build, in a process pool
+when Sphinx is run with several processes (``-j``).
+
+A manifest of the diagrams used by each document is kept alongside them, so
+that diagrams no longer used by any document are removed.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from html import escape
+import json
+import multiprocessing
+import os
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple, cast
+
+from docutils import nodes
+from sphinx.util import logging
+
+from .directives import SystemDomain
+
+logger = logging.getLogger(__name__)
+
+DIAGRAM_DIR = "probs_rdf"  # within the builder's image directory
+MANIFEST_FILENAME = "manifest.json"  # docname -> keys of its diagrams
+
+MAX_ITEMS = 8  # per side; further items are summarised as "… N more"
+MAX_LABEL = 40  # characters
+
+# Layout, in pixels
+FONT_SIZE = 12
+CHAR_WIDTH = 7
+BOX_HEIGHT = 24
+PADDING = 8
+MARGIN = 10
+GAP_X = 16
+GAP_Y = 40
+FLOW_LENGTH = 100
+
+STYLE = """\
+text { font: %dpx sans-serif; fill: #222; }
+rect { stroke: #666; fill: #f4f4f4; }
+rect.process { fill: #dde8f3; stroke: #357; }
+rect.object { fill: #e7f3e3; stroke: #585; }
+line { stroke: #888; }
+line.flow { marker-end: url(#arrow); }
+text.amount { font-size: %dpx; fill: #555; }
+""" % (FONT_SIZE, FONT_SIZE - 2)
+
+
+class DiagramSpec(NamedTuple):
+    """What a process diagram shows: labels, and flows as (label, amount)."""
+
+    label: str
+    parents: Tuple[str, ...]
+    children: Tuple[str, ...]
+    consumes: Tuple[Tuple[str, str], ...]
+    produces: Tuple[Tuple[str, str], ...]
+
+    def key(self) -> str:
+        data = json.dumps(self, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _label(view, uri) -> str:
+    labels = view.labels(uri)
+    return labels[0] if labels else view.n3(uri)
+
+
+def _amount(row) -> str:
+    # The metric is a quantity kind (such as Mass) rather than a unit, so
+    # only the number is shown
+    if row.get("amount") is None:
+        return ""
+    return "%g" % row["amount"]
+
+
+def diagram_spec(view, uri, recipe=None) -> DiagramSpec:
+    """Describe the diagram of process `uri`.
+
+    Items are sorted by label and then URI, as the graph may list them in a
+    different order depending on how documents were read (e.g. with ``-j``),
+    and the spec's key should only depend on what the diagram shows.
+
+    :param recipe: recipe rows by direction, if not the process's own (such
+        as an aggregate recipe).
+    """
+    if recipe is None:
+        recipe = view.recipe(uri) or {}
+
+    def labels(uris):
+        return tuple(label for label, _ in sorted(
+            (_label(view, item), str(item)) for item in uris
+        ))
+
+    def flows(direction):
+        items = sorted(
+            (_label(view, row["object"]), str(row["object"]), _amount(row))
+            for row in recipe.get(direction, ())
+        )
+        return tuple((label, amount) for label, _, amount in items)
+
+    return DiagramSpec(
+        _label(view, uri),
+        labels(view.parents("process", uri)),
+        labels(view.children("process", uri)),
+        flows("consumes"),
+        flows("produces"),
+    )
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= MAX_LABEL else text[:MAX_LABEL - 1] + "…"
+
+
+def _limit(items: Sequence, more) -> list:
+    if len(items) <= MAX_ITEMS:
+        return list(items)
+    return list(items[:MAX_ITEMS - 1]) + [more(len(items) - MAX_ITEMS + 1)]
+
+
+def _width(text: str) -> int:
+    return len(text) * CHAR_WIDTH + 2 * PADDING
+
+
+class _Canvas:
+    def __init__(self):
+        self.items: List[str] = []
+
+    def box(self, x, y, text, cls):
+        width = _width(text)
+        self.items.append(
+            '<rect class="%s" x="%d" y="%d" width="%d" height="%d" rx="3"/>'
+            '<text x="%d" y="%d" text-anchor="middle">%s</text>'
+            % (cls, x, y, width, BOX_HEIGHT, x + width // 2,
+               y + BOX_HEIGHT // 2 + FONT_SIZE // 2 - 2, escape(text))
+        )
+        return width
+
+    def line(self, x1, y1, x2, y2, cls=""):
+        self.items.append(
+            '<line%s x1="%d" y1="%d" x2="%d" y2="%d"/>'
+            % (' class="%s"' % cls if cls else "", x1, y1, x2, y2)
+        )
+
+    def text(self, x, y, text, cls):
+        self.items.append(
+            '<text class="%s" x="%d" y="%d" text-anchor="middle">%s</text>'
+            % (cls, x, y, escape(text))
+        )
+
+
+def render_svg(spec: DiagramSpec) -> str:
+    """Render a process diagram as a standalone SVG document."""
+    label = _truncate(spec.label)
+    parents = _limit([_truncate(p) for p in spec.parents], "… %d more".__mod__)
+    children = _limit([_truncate(c) for c in spec.children], "… %d more".__mod__)
+    consumes = _limit(
+        [(_truncate(o), a) for o, a in spec.consumes],
+        lambda n: ("… %d more" % n, ""),
+    )
+    produces = _limit(
+        [(_truncate(o), a) for o, a in spec.produces],
+        lambda n: ("… %d more" % n, ""),
+    )
+
+    def row_width(labels):
+        return sum(_width(t) for t in labels) + GAP_X * max(len(labels) - 1, 0)
+
+    # Middle row: consumed objects, the process, produced objects
+    left = max((_width(o) for o, _ in consumes), default=0)
+    right = max((_width(o) for o, _ in produces), default=0)
+    middle = (
+        (left + FLOW_LENGTH if consumes else 0)
+        + _width(label)
+        + (FLOW_LENGTH + right if produces else 0)
+    )
+    width = max(middle, row_width(parents), row_width(children)) + 2 * MARGIN
+
+    side = max(len(consumes), len(produces), 1) * (BOX_HEIGHT + 8) - 8
+    top = MARGIN + (BOX_HEIGHT + GAP_Y if parents else 0)
+    bottom = top + side
+    height = bottom + (GAP_Y + BOX_HEIGHT if children else 0) + MARGIN
+
+    canvas = _Canvas()
+    x0 = (width - middle) // 2
+    px = x0 + (left + FLOW_LENGTH if consumes else 0)
+    py = top + (side - BOX_HEIGHT) // 2
+    pw = canvas.box(px, py, label, "process")
+    cy = py + BOX_HEIGHT // 2
+
+    for items, x_box, direction in [
+        (consumes, x0, "consumes"),
+        (produces, px + pw + FLOW_LENGTH, "produces"),
+    ]:
+        y = top + (side - (len(items) * (BOX_HEIGHT + 8) - 8)) // 2
+        for obj, amount in items:
+            w = canvas.box(x_box, y, obj, "object")
+            oy = y + BOX_HEIGHT // 2
+            if direction == "consumes":
+                x1, y1, x2, y2 = x_box + w, oy, px, cy
+            else:
+                x1, y1, x2, y2 = px + pw, cy, x_box, oy
+            canvas.line(x1, y1, x2 - 2, y2, "flow")
+            if amount:
+                canvas.text((x1 + x2) // 2, (y1 + y2) // 2 - 4, amount, "amount")
+            y += BOX_HEIGHT + 8
+
+    for items, y, above in [
+        (parents, MARGIN, True),
+        (children, bottom + GAP_Y, False),
+    ]:
+        x = (width - row_width(items)) // 2
+        for item in items:
+            w = canvas.box(x, y, item, "process")
+            if above:
+                canvas.line(x + w // 2, y + BOX_HEIGHT, px + pw // 2, py)
+            else:
+                canvas.line(px + pw // 2, py + BOX_HEIGHT, x + w // 2, y)
+            x += w + GAP_X
+
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+        'viewBox="0 0 %d %d">\n'
+        "<defs><style>\n%s</style>\n"
+        '<marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" '
+        'markerWidth="6" markerHeight="6" orient="auto">'
+        '<path d="M0,0 L10,5 L0,10 z" fill="#888"/></marker></defs>\n'
+        "%s\n</svg>\n"
+        % (width, height, width, height, STYLE, "\n".join(canvas.items))
+    )
+
+
+def _render_file(item: Tuple[str, DiagramSpec]):
+    filename, spec = item
+    partial = "%s.%d.part" % (filename, os.getpid())
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(render_svg(spec))
+    os.replace(partial, filename)
+
+
+def render_diagrams(
+    specs: Dict[str, DiagramSpec], outdir: str, nproc: int = 1
+) -> int:
+    """Render diagrams which do not exist in `outdir` yet.
+
+    Returns the number rendered.
+    """
+    from sphinx.util.parallel import parallel_available
+
+    os.makedirs(outdir, exist_ok=True)
+    existing = set(os.listdir(outdir))
+    missing = [
+        (os.path.join(outdir, key + ".svg"), spec)
+        for key, spec in sorted(specs.items())
+        if key + ".svg" not in existing
+    ]
+    if nproc <= 1 or len(missing) <= 1 or not parallel_available:
+        for item in missing:
+            _render_file(item)
+        return len(missing)
+
+    # Fork like Sphinx's own parallel reading and writing
+    context = multiprocessing.get_context("fork")
+    chunksize = max(1, len(missing) // (nproc * 4))
+    with ProcessPoolExecutor(min(nproc, len(missing)), mp_context=context) as pool:
+        for _ in pool.map(_render_file, missing, chunksize=chunksize):
+            pass
+    return len(missing)
+
+
+def prune_diagrams(outdir: str, keys: Iterable[str]) -> int:
+    """Remove diagrams in `outdir` other than `keys`.
+
+    Returns the number removed.
+    """
+    keep = {key + ".svg" for key in keys}
+    removed = 0
+    for filename in os.listdir(outdir):
+        if filename.endswith(".svg") and filename not in keep:
+            os.remove(os.path.join(outdir, filename))
+            removed += 1
+    return removed
+
+
+def _read_manifest(outdir: str) -> Dict[str, List[str]]:
+    try:
+        with open(os.path.join(outdir, MANIFEST_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_diagrams(app, exc):
+    """Render the diagrams used by the documents written in this build.
+
+    Diagrams which are no longer used by any document are removed.
+    """
+    if exc or app.builder.format != "html":
+        return
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    written = domain.caches.get("diagrams")  # docname -> key -> spec
+    if not written:
+        return
+    outdir = os.path.join(app.builder.outdir, app.builder.imagedir, DIAGRAM_DIR)
+    specs: Dict[str, DiagramSpec] = {}
+    for diagrams in written.values():
+        specs.update(diagrams)
+    rendered = render_diagrams(specs, outdir, app.parallel)
+    if rendered:
+        logger.info("rendered %d process diagrams", rendered)
+
+    found_docs = app.env.found_docs
+    manifest = {
+        docname: keys
+        for docname, keys in _read_manifest(outdir).items()
+        if docname in found_docs and docname not in written
+    }
+    for docname, diagrams in written.items():
+        if diagrams:
+            manifest[docname] = sorted(diagrams)
+    used = [key for keys in manifest.values() for key in keys]
+    removed = prune_diagrams(outdir, used)
+    if removed:
+        logger.info("removed %d unused process diagrams", removed)
+    partial = os.path.join(outdir, MANIFEST_FILENAME + ".part")
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(partial, os.path.join(outdir, MANIFEST_FILENAME))
+
+
+def visit_probs_diagram_html(self, node):
+    """Render a `probs_diagram` node as an image of its (cached) SVG file."""
+    src = "%s/%s/%s.svg" % (self.builder.imgpath, DIAGRAM_DIR, node["key"])
+    self.body.append(
+        '<div class="system-diagram"><img src="%s" alt="%s" loading="lazy" />'
+        "</div>\n" % (escape(src), escape(node["alt"]))
+    )
+    raise nodes.SkipNode
@@ -1,13 +1,22 @@
 from collections import defaultdict
-from typing import Any, List, Dict, Iterator, Tuple, Optional, NamedTuple, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    List,
+    Dict,
+    Iterator,
+    Tuple,
+    Optional,
+    NamedTuple,
+    cast,
+)
+from itertools import groupby
+import os
 import re
-import yaml
 
 from docutils import nodes
 from docutils.nodes import Node, Element
 from docutils.parsers.rst import directives  # type: ignore
-from rdflib import ConjunctiveGraph, URIRef, Literal, BNode, Namespace  # type: ignore
-from rdflib.namespace import RDF, RDFS  # type: ignore
 from sphinx import addnodes
 from sphinx.addnodes import desc_signature, pending_xref
 from sphinx.builders import Builder
@@ -18,9 +27,19 @@ from sphinx.domains import Domain, Index, ObjType
 from sphinx.environment import BuildEnvironment
 from sphinx.roles import XRefRole
 from sphinx.util.docutils import SphinxDirective
+from sphinx.util.osutil import relative_uri
 from sphinx.util.nodes import make_refnode, find_pending_xref_condition, make_id
 from sphinx.util import logging
 
+# rdflib and yaml are imported where they are used, so that loading the
+# extension stays cheap for projects which don't use the system domain.
+if TYPE_CHECKING:
+    from rdflib import ConjunctiveGraph  # type: ignore
+    from .equivalence import EquivalenceClasses
+    from .hierarchy import Hierarchy
+    from .view import GraphView
+    from .inventory import ExternalThing
+
 logger = logging.getLogger(__name__)
 
 
@@ -69,21 +88,22 @@ ITEM_STRING_REGEX = re.compile(
 
 
 def _parse_item(item):
+    import yaml
+
     if isinstance(item, str):
         match = ITEM_STRING_REGEX.match(item)
         if match:
-            extra = {}
-            if match.group(4):
-                try:
-                    extra = yaml.safe_load(match.group(4))
-                except yaml.YAMLError:
-                    pass
-            return {
+            result = {
                 "object": match.group(1),
                 "amount": float(match.group(2)) if match.group(2) else None,
                 "unit": match.group(3),
-                **extra,
             }
+            if match.group(4):
+                try:
+                    result.update(yaml.safe_load(match.group(4)))
+                except yaml.YAMLError:
+                    pass
+            return result
         else:
             # Try parsing whole thing as yaml dict
             try:
@@ -148,6 +168,9 @@ class TTL(CodeBlock):
                 location=(self.env.docname, self.lineno),
             )
 
+        if self.config.probs_rdf_lean:
+            return []
+
         # Force language
         self.arguments = ["turtle"]
         return super().run()
@@ -217,9 +240,13 @@ class EndSubObjectsDirective(SphinxDirective):
         return [paragraph_node]
 
 
-PROBS = Namespace("http://w3id.org/probs-lab/ontology#")
-PROBS_RECIPE = Namespace("http://w3id.org/probs-lab/process-recipe#")
-QUANTITYKIND = Namespace("http://qudt.org/vocab/quantitykind/")
+def __getattr__(name):
+    # The namespaces used to be defined here
+    if name in ("PROBS", "PROBS_RECIPE", "QUANTITYKIND"):
+        from . import namespaces
+
+        return getattr(namespaces, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 class probs_info(nodes.Element, nodes.General):
@@ -270,12 +297,58 @@ class ObjectEquivalentTo(SphinxDirective):
         node += [title, contentnode]
         self.state.nested_parse(self.content, self.content_offset, contentnode)
 
+        from .namespaces import PROBS
+
         g = self.env.get_domain("system").get_graph(self.env.docname)
         g.add((uri1, PROBS.objectEquivalentTo, uri2))
 
         return [self.indexnode, node]
 
 
+class probs_table(nodes.Element, nodes.General):
+    """Compact table of recipe or query data, rendered directly in HTML.
+
+    Holds the rows as plain data (see `resolve._table`) rather than as a
+    docutils table with a pending cross-reference for each link. Only links
+    to things which were not found are kept as pending cross-references, in
+    the node's children.
+    """
+
+
+class probs_diagram(nodes.Element, nodes.General):
+    """Diagram of a process, rendered as an image (see `diagrams`).
+
+    Holds the "key" naming the diagram's SVG file, and "alt" text.
+    """
+
+
+class probs_query(nodes.Element, nodes.General):
+    """Node for a SPARQL query, evaluated once the graph has been built."""
+
+
+class Query(SphinxDirective):
+    """Table of the results of a SPARQL SELECT query on the system graph."""
+
+    has_content = True
+    option_spec = {
+        "class": directives.class_option,
+    }
+
+    def run(self):
+        self.assert_has_content()
+        if self.config.probs_rdf_lean:
+            return []
+
+        domain = cast(SystemDomain, self.env.get_domain("system"))
+        domain.note_query(self.env.docname)
+
+        node = probs_query(
+            "", query="\n".join(self.content), classes=self.options.get("class", [])
+        )
+        self.set_source_info(node)
+        return [node]
+
+
 class SystemObjectDescription(ObjectDescription):
     has_content = True
     required_arguments = 1
@@ -287,6 +360,10 @@ class SystemObjectDescription(ObjectDescription):
         than inline descriptions.
 
         """
+        if self.config.probs_rdf_lean:
+            # Only the graph is needed: skip building the HTML structure
+            return super().run()
+
         nest_depth = "nested-%d" % self.get_nesting_depth()
 
         indexnode, node = super().run()
@@ -354,17 +431,9 @@ class Process(SystemObjectDescription):
         domain.note_thing(
             uri, "process", self.options.get("label", sig), node_id, location=signode
         )
-        # XXX avoid parse_uri too many times?
-        domain.note_process_recipe(
-            uri,
-            [
-                parse_uri(self.config, obj["object"])
-                for obj in self.options.get("consumes", [])
-            ],
-            [
-                parse_uri(self.config, obj["object"])
-                for obj in self.options.get("produces", [])
-            ],
+        domain.note_process_recipe(uri, self.recipe_entries)
+        domain.note_references(
+            uri, self.references, location=(self.env.docname, self.lineno)
         )
 
     def before_content(self):
@@ -376,7 +445,7 @@ class Process(SystemObjectDescription):
             parents.append(uri)
 
     def transform_content(self, contentnode):
-        if self.names:
+        if self.names and not self.config.probs_rdf_lean:
             uri = self.names[0]
             info = probs_process_info("", uri=uri)
             contentnode.insert(0, info)
@@ -389,6 +458,10 @@ class Process(SystemObjectDescription):
         self.env.ref_context["system:process"] = parents[-1] if parents else None
 
     def define_graph(self, g, uri, sig: str):
+        from rdflib import BNode, Literal  # type: ignore
+        from rdflib.namespace import RDF, RDFS  # type: ignore
+        from .namespaces import PROBS, PROBS_RECIPE
+
         label = self.options.get("label", sig)
 
         g.add((uri, RDF.type, PROBS.Process))
@@ -397,21 +470,25 @@ class Process(SystemObjectDescription):
 
         # ComposedOf relationships
         # determine parent
+        self.references: List[Tuple[str, str]] = []
         if "parent" in self.options:
             parent = parse_uri(self.config, self.options["parent"])
         else:
             parent = self.env.ref_context.get("system:process")
         if parent:
             g.add((parent, PROBS.processComposedOf, uri))
+            self.references.append(("process", parent))
         for child in self.options.get("composed_of", []):
             if child.startswith("*"):
                 # include children of the named process -- this is expanded
                 # later as a postprocessing step once all processes are defined.
                 child_uri = parse_uri(self.config, child[1:])
                 g.add((uri, PROBS.processComposedOfChildrenOf, child_uri))
+                self.references.append(("children-of", child_uri))
             else:
                 child_uri = parse_uri(self.config, child)
                 g.add((uri, PROBS.processComposedOf, child_uri))
+                self.references.append(("process", child_uri))
 
         # Recipes (inputs and outputs)
         # First expand any expressions
@@ -422,11 +499,24 @@ class Process(SystemObjectDescription):
 
         recipe_consumes: List[BNode] = []
         recipe_produces: List[BNode] = []
+        self.recipe_entries: List[RecipeEntry] = []
         _process_inputs_outputs(
-            g, self.config, uri, "consumes", consumes, recipe_consumes
+            g,
+            self.config,
+            uri,
+            "consumes",
+            consumes,
+            recipe_consumes,
+            self.recipe_entries,
         )
         _process_inputs_outputs(
-            g, self.config, uri, "produces", produces, recipe_produces
+            g,
+            self.config,
+            uri,
+            "produces",
+            produces,
+            recipe_produces,
+            self.recipe_entries,
         )
         if recipe_consumes or recipe_produces:
             recipe = BNode()
@@ -437,13 +527,18 @@ class Process(SystemObjectDescription):
                 g.add((recipe, PROBS_RECIPE.produces, item))
 
 
-def _process_inputs_outputs(g, config, uri, relation, objects, recipe_items):
+def _process_inputs_outputs(g, config, uri, relation, objects, recipe_items, entries):
+    from rdflib import BNode, Literal, URIRef  # type: ignore
+    from .namespaces import PROBS, PROBS_RECIPE
+
     units = config.probs_rdf_units
     for obj in objects:
         obj_uri = parse_uri(config, obj["object"])
         g.add((uri, PROBS[relation], obj_uri))
 
-        if "amount" in obj:
+        if "amount" not in obj:
+            entries.append(RecipeEntry(obj_uri, relation, None, None))
+        else:
             # Have a recipe
 
             # XXX only support a few units for now, this could be more general.
@@ -458,12 +553,16 @@ def _process_inputs_outputs(g, config, uri, relation, objects, recipe_items):
                 scale, metric = units["kg"]
             else:
                 scale, metric = units[obj["unit"]]
+            metric = URIRef(metric)
 
             item = BNode()
             g.add((item, PROBS_RECIPE.object, obj_uri))
             g.add((item, PROBS_RECIPE.quantity, Literal(scale * obj["amount"])))
             g.add((item, PROBS_RECIPE.metric, metric))
             recipe_items.append(item)
+            entries.append(
+                RecipeEntry(obj_uri, relation, scale * obj["amount"], metric)
+            )
 
 
 def parse_traded(value):
@@ -495,6 +594,8 @@ def parse_uri(config, item, default=None):
     A missing suffix means the same as the object currently being defined.
 
     """
+    from rdflib import Namespace, URIRef  # type: ignore
+
     if item and item[0] == "<" and item[-1] == ">":
         return URIRef(item[1:-1])
     prefix, _, item_id = item.rpartition(":")
@@ -531,6 +632,9 @@ class Object(SystemObjectDescription):
         domain.note_thing(
             uri, "object", self.options.get("label", sig), node_id, location=signode
         )
+        domain.note_references(
+            uri, self.references, location=(self.env.docname, self.lineno)
+        )
 
     def before_content(self):
         """Handle object nesting before content."""
@@ -541,7 +645,7 @@ class Object(SystemObjectDescription):
             parents.append(uri)
 
     def transform_content(self, contentnode):
-        if self.names:
+        if self.names and not self.config.probs_rdf_lean:
             uri = self.names[0]
             info = probs_object_info("", uri=uri)
             contentnode.insert(0, info)
@@ -554,6 +658,10 @@ class Object(SystemObjectDescription):
         self.env.ref_context["system:object"] = parents[-1] if parents else None
 
     def define_graph(self, g, uri, sig: str):
+        from rdflib import Literal, URIRef  # type: ignore
+        from rdflib.namespace import RDF, RDFS  # type: ignore
+        from .namespaces import PROBS
+
         label = self.options.get("label", sig)
 
         g.add((uri, RDF.type, PROBS.Object))
@@ -562,12 +670,14 @@ class Object(SystemObjectDescription):
         g.add((uri, PROBS.objectName, Literal(label)))
 
         # ComposedOf relationships
+        self.references: List[Tuple[str, str]] = []
         if "parent_object" in self.options:
             parent = parse_uri(self.config, self.options["parent_object"])
         else:
             parent = self.env.ref_context.get("system:object")
         if parent:
             g.add((parent, PROBS.objectComposedOf, uri))
+            self.references.append(("object", parent))
         for child in self.options.get("composed_of", []):
             if child.startswith("*"):
                 # include children of the named object -- this is expanded later
@@ -577,6 +687,7 @@ class Object(SystemObjectDescription):
             else:
                 child_uri = parse_uri(self.config, child)
                 g.add((uri, PROBS.objectComposedOf, child_uri))
+            self.references.append(("object", child_uri))
 
         if "traded" in self.options:
             imp, exp = self.options["traded"]
@@ -614,129 +725,160 @@ class Object(SystemObjectDescription):
         return parse_uri(self.config, item, default_item_id)
 
 
-class ObjectIndex(Index):
+class SystemIndex(Index):
+    """Index of things, grouped by the first letter of their labels.
+
+    With `probs_rdf_index_page_size` set, HTML indices are split into pages
+    of up to that many things each, within each letter, and the index itself
+    only links to the pages (see `index_pages`).
+    """
+
+    thing_type = ""
+
+    def entries(self, uri: str, thing: "ThingEntry") -> List[tuple]:
+        """Index entries for a thing: its own entry, then any sub-entries.
+
+        Each is (name, subtype, docname, anchor, extra, qualifier, description).
+        By default there is just the thing's own entry.
+        """
+        return [
+            (
+                thing.label,
+                0,
+                thing.docname,
+                thing.node_id,
+                thing.docname,
+                "",
+                thing.thing_type,
+            )
+        ]
+
+    def generate(self, docnames=None):
+        groups = []
+        for letter, items in groupby(
+            self.domain.get_things_by_type(self.thing_type),
+            key=lambda item: item[1].label[:1].upper(),
+        ):
+            groups.append(
+                (letter, [self.entries(uri, thing) for uri, thing in items])
+            )
+
+        page_size = self.domain.env.config.probs_rdf_index_page_size
+        builder = self.domain.env.app.builder
+        if page_size > 0 and builder is not None and builder.format == "html":
+            return self._paginate(groups, page_size), False
+
+        content = [
+            (letter, [entry for entries in items for entry in entries])
+            for letter, items in groups
+        ]
+        return content, True
+
+    def _paginate(self, groups, page_size: int):
+        domain = cast(SystemDomain, self.domain)
+        pages: List[Tuple[str, str, str, list]] = []
+        domain.caches["index_pages:" + self.name] = pages
+        content = []
+        for letter, items in groups:
+            links = []
+            for start in range(0, len(items), page_size):
+                chunk = items[start:start + page_size]
+                pagename = "%s-%s-%d" % (self.domain.name, self.name, len(pages) + 1)
+                first, last = chunk[0][0][0], chunk[-1][0][0]
+                title = first if first == last else "%s – %s" % (first, last)
+                # Link to the letter's heading, as the index template always
+                # adds an anchor
+                anchor = "cap-" + letter
+                links.append(
+                    (title, 0, pagename, anchor, "%d" % len(chunk), "", "")
+                )
+                entries = [entry for entries in chunk for entry in entries]
+                page_title = "%s: %s" % (self.localname, title)
+                pages.append((pagename, page_title, letter, entries))
+            content.append((letter, links))
+        return content
+
+
+class ObjectIndex(SystemIndex):
     """Index of objects."""
 
     name = "objectindex"
     localname = "Object Index"
     shortname = "objects"
+    thing_type = "object"
 
     def generate(self, docnames=None):
-        content = defaultdict(list)
-
-        objects = {
-            uri: thing
-            for uri, thing in self.domain.things.items()
-            if thing.thing_type == "object"
-        }
-        processes = {
-            uri: thing
-            for uri, thing in self.domain.things.items()
-            if thing.thing_type == "process"
-        }
-        process_recipe = self.domain.process_recipe
-        object_processes = defaultdict(list)
-
-        # Add the objects initially; this is necessary for any objects which are
-        # NOT linked to processes to be included.
-        for obj_uri in objects:
-            object_processes[obj_uri] = []
+        from .validate import warn_undefined_objects
+
+        warn_undefined_objects(self.domain)
+        return super().generate(docnames)
+
+    def entries(self, uri, thing):
+        result = [
+            (
+                thing.label,
+                1,
+                thing.docname,
+                thing.node_id,
+                thing.docname,
+                "",
+                thing.thing_type,
+            )
+        ]
 
         # Add in all the places that an object is consumed or produced by a
-        # process
-        for process_uri, objs in process_recipe.items():
-            if process_uri not in processes:
-                logger.warning(
-                    "Process %s is not defined",
-                    process_uri,
-                    # location=(self.env.docname, self.lineno)
-                )
-                continue
-            for obj_uri, direction in objs:
-                if obj_uri not in objects:
-                    logger.warning(
-                        "Object %s %s by process %s is not defined",
-                        obj_uri,
-                        direction[:-1] + "d",
-                        process_uri,
-                        # location=(self.env.docname, self.lineno)
+        # process (references to undefined processes are reported by the
+        # reference checks in validate.py)
+        things = self.domain.things
+        for process_uri, entry in self.domain.get_object_usage(uri):
+            p = things.get(process_uri)
+            if p is not None and p.thing_type == "process":
+                result.append(
+                    (
+                        p.label,
+                        2,
+                        p.docname,
+                        p.node_id,
+                        entry.direction,
+                        "",
+                        p.thing_type,
                     )
-                    continue
-                object_processes[obj_uri].append((process_uri, direction))
-
-        # convert the mapping of objects to processes to produce the expected
-        # output, shown below, using the object name as a key to group
-        #
-        # name, subtype, docname, anchor, extra, qualifier, description
-        for obj_uri, process_uris in object_processes.items():
-            obj = objects[obj_uri]
-            k = obj.label.upper()[0]
-            content[k].append(
-                (
-                    obj.label,
-                    1,
-                    obj.docname,
-                    obj.node_id,
-                    obj.docname,
-                    "",
-                    obj.thing_type,
                 )
-            )
-
-            for process_uri, direction in process_uris:
-                if process_uri in processes:
-                    p = processes[process_uri]
-                    content[k].append(
-                        (p.label, 2, p.docname, p.node_id, direction, "", p.thing_type)
-                    )
-                else:
-                    logger.debug("Missing process in domain: %s", process_uri)
-
-        # convert the dict to the sorted list of tuples expected
-        content = sorted(content.items())
-
-        return content, True
+            else:
+                logger.debug("Missing process in domain: %s", process_uri)
+        return result
 
 
-class ProcessIndex(Index):
+class ProcessIndex(SystemIndex):
     """Index of processes."""
 
     name = "processindex"
     localname = "Process Index"
     shortname = "processes"
+    thing_type = "process"
 
-    def generate(self, docnames=None):
-        content = defaultdict(list)
 
-        # sort the list of processes in alphabetical order
-        processes = {
-            uri: thing
-            for uri, thing in self.domain.things.items()
-            if thing.thing_type == "process"
-        }
+def index_pages(app, *args):
+    """Write the pages of paginated indices (see `SystemIndex`).
 
-        # generate the expected output, shown below, from the above using the
-        # first letter of the recipe as a key to group thing
-        #
-        # name, subtype, docname, anchor, extra, qualifier, description
-        for process_uri, thing in processes.items():
-            k = thing.label.upper()[0]
-            content[k].append(
-                (
-                    thing.label,
-                    0,
-                    thing.docname,
-                    thing.node_id,
-                    thing.docname,
-                    "",
-                    thing.thing_type,
-                )
-            )
+    Connected to html-collect-pages, which is emitted after the indices have
+    been generated.
+    """
+    domain = app.env.get_domain("system")
+    for index in domain.indices:
+        pages = domain.caches.get("index_pages:" + index.name, [])
+        for pagename, title, letter, entries in pages:
+            context = {
+                "indextitle": title,
+                "content": [(letter, entries)],
+                "collapse_index": True,
+            }
+            yield pagename, context, "domainindex.html"
 
-        # convert the dict to the sorted list of tuples expected
-        content = sorted(content.items())
 
-        return content, True
+def _same_database(store1, store2) -> bool:
+    path = getattr(store1, "path", None)
+    return path is not None and path == getattr(store2, "path", None)
 
 
 class ThingEntry(NamedTuple):
@@ -746,6 +888,13 @@ class ThingEntry(NamedTuple):
     label: str
 
 
+class RecipeEntry(NamedTuple):
+    object: str
+    direction: str  # "consumes" or "produces"
+    amount: Optional[float]
+    metric: Optional[str]
+
+
 class SystemDomain(Domain):
 
     name = "system"
@@ -762,12 +911,23 @@ class SystemDomain(Domain):
         "process": Process,
         "object": Object,
         "object-equivalent-to": ObjectEquivalentTo,
+        "query": Query,
     }
     indices = [ProcessIndex, ObjectIndex]
     initial_data: dict = {
         "things": {},
         "process_recipe": {},
+        "object_usage": {},
         "graph": None,
+        "external_sources": {},
+        "references": {},
+        "reference_locations": {},
+        "duplicates": {},
+        "queries": {},
+        "context_digests": {},
+        "graph_digest": None,
+        "inventories": {},
+        "notebook_digests": {},
     }
 
     # Keeping track of where things are defined
@@ -777,25 +937,235 @@ class SystemDomain(Domain):
         return self.data.setdefault("things", {})  # uri -> ThingEntry
 
     @property
-    def graph(self) -> ConjunctiveGraph:
+    def graph(self) -> "ConjunctiveGraph":
         if self.data.get("graph") is None:
-            g = self.data["graph"] = ConjunctiveGraph()
+            from rdflib import ConjunctiveGraph, Namespace  # type: ignore
+            from .namespaces import PROBS, PROBS_RDF, PROBS_RECIPE
+
             config = self.env.config
+            g = self.data["graph"] = ConjunctiveGraph(store=self._new_store())
             g.bind("sys", Namespace(config.probs_rdf_system_prefix))
             g.bind("probs", PROBS)
             g.bind("rec", PROBS_RECIPE)
+            g.bind("probs_rdf", PROBS_RDF)
             for prefix, uri in config.probs_rdf_extra_prefixes.items():
                 g.bind(prefix, uri)
+            g.store.commit()
         return self.data["graph"]
 
     @graph.setter
-    def graph(self, graph: ConjunctiveGraph):
+    def graph(self, graph: "ConjunctiveGraph"):
         self.data["graph"] = graph
 
+    def store_path(self) -> Optional[str]:
+        """The path of the graph's database, if `probs_rdf_store` uses one."""
+        config = self.env.config
+        if config.probs_rdf_store == "sqlite":
+            return os.path.abspath(
+                config.probs_rdf_store_path
+                or os.path.join(self.env.doctreedir, "probs_rdf_graph.sqlite")
+            )
+        return None
+
+    def _new_store(self):
+        """Create an empty rdflib store, as set by `probs_rdf_store`."""
+        config = self.env.config
+        path = self.store_path()
+        if path is not None:
+            from .sqlitestore import SQLiteStore
+
+            store = SQLiteStore()
+            store.open(path, create=True)
+            # Any existing data belongs to an environment being replaced
+            store.clear()
+            return store
+        elif config.probs_rdf_store != "memory":
+            logger.warning(
+                "Unknown probs_rdf_store %r, using 'memory'", config.probs_rdf_store
+            )
+        return "default"
+
     @property
-    def process_recipe(self) -> Dict[str, list]:
+    def process_recipe(self) -> Dict[str, List[RecipeEntry]]:
         return self.data.setdefault("process_recipe", {})  # uri -> list
 
+    @property
+    def object_usage(self) -> Dict[str, List[str]]:
+        """Reverse index of `process_recipe`: object -> processes using it."""
+        return self.data.setdefault("object_usage", {})  # uri -> list of uris
+
+    def get_object_usage(self, uri: str) -> List[Tuple[str, RecipeEntry]]:
+        """List (process, recipe entry) pairs for processes using object `uri`."""
+        return [
+            (process, entry)
+            for process in self.object_usage.get(uri, [])
+            for entry in self.process_recipe.get(process, [])
+            if entry.object == uri
+        ]
+
+    @property
+    def references(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Composition references made by each thing, as (kind, uri) pairs.
+
+        The kind is "process", "object" or "children-of" (for the sources of
+        processComposedOfChildrenOf relations).
+        """
+        return self.data.setdefault("references", {})  # uri -> list
+
+    @property
+    def reference_locations(self) -> Dict[str, Tuple[str, int]]:
+        """Where the things making references are defined, for reporting."""
+        return self.data.setdefault("reference_locations", {})  # uri -> location
+
+    @property
+    def duplicates(self) -> Dict[str, List[str]]:
+        """Things which have been defined in more than one document."""
+        return self.data.setdefault("duplicates", {})  # uri -> docnames
+
+    @property
+    def external_sources(self) -> Dict[str, float]:
+        return self.data.setdefault("external_sources", {})  # path -> mtime
+
+    @property
+    def inventory_cache(self) -> Dict[str, tuple]:
+        """Inventories of other projects, see `inventory.load_inventories`."""
+        return self.data.setdefault("inventories", {})  # name -> cached entries
+
+    @property
+    def notebook_digests(self) -> Dict[str, str]:
+        """Notebooks read without outputs, see `notebooks`."""
+        return self.data.setdefault("notebook_digests", {})  # docname -> digest
+
+    @property
+    def queries(self) -> Dict[str, int]:
+        return self.data.setdefault("queries", {})  # docname -> number of queries
+
+    @property
+    def context_digests(self) -> Dict[str, int]:
+        """Digests of the graph's contexts, see `get_graph_digest`."""
+        return self.data.setdefault("context_digests", {})  # identifier -> int
+
+    # Indexes derived from the domain data. These are not pickled, and are
+    # cleared whenever documents have been read.
+
+    @property
+    def caches(self) -> Dict[str, Any]:
+        if not hasattr(self, "_caches"):
+            self._caches: Dict[str, Any] = {}
+        return self._caches
+
+    def clear_caches(self):
+        self.caches.clear()
+
+    def intern_uri(self, uri):
+        """Return the instance of `uri` shared by the domain data.
+
+        Objects and metrics are referred to by many recipe entries, and
+        processes by other things' references. Sharing one instance of each
+        URI saves memory, and means it is only pickled once.
+        """
+        if uri is None:
+            return None
+        interned = getattr(self, "_interned", None)
+        if interned is None:
+            # Share the URIs of data kept from previous builds too
+            interned = self._interned = {}
+            for key in self.things:
+                interned.setdefault(key, key)
+            for entries in self.process_recipe.values():
+                for entry in entries:
+                    interned.setdefault(entry.object, entry.object)
+                    if entry.metric is not None:
+                        interned.setdefault(entry.metric, entry.metric)
+        return interned.setdefault(uri, uri)
+
+    def get_hierarchy(self, thing_type: str) -> "Hierarchy":
+        """Return the composition hierarchy of "process" or "object" things."""
+        key = "hierarchy:" + thing_type
+        if key not in self.caches:
+            from .hierarchy import build_hierarchy
+
+            self.caches[key] = build_hierarchy(self.graph, thing_type)
+        return self.caches[key]
+
+    def get_equivalence(self) -> "EquivalenceClasses":
+        """Return the classes of objects related by probs:objectEquivalentTo."""
+        if "equivalence" not in self.caches:
+            from .equivalence import build_equivalence
+
+            self.caches["equivalence"] = build_equivalence(self.graph)
+        return self.caches["equivalence"]
+
+    def get_graph_digest(self) -> str:
+        """Return a digest of the graph's content, for caching query results.
+
+        The digest of each context is kept until the context is cleared (i.e.
+        its document or external file is read again), so only changed
+        contexts are digested again on incremental builds.
+        """
+        if "graph_digest" not in self.caches:
+            from .query import combine_digests, context_digest
+
+            known = self.context_digests
+            digests = {}
+            for context in self.graph.contexts():
+                identifier = str(context.identifier)
+                if identifier not in known:
+                    known[identifier] = context_digest(context)
+                digests[identifier] = known[identifier]
+            for identifier in set(known) - set(digests):
+                del known[identifier]
+            self.caches["graph_digest"] = combine_digests(digests)
+        return self.caches["graph_digest"]
+
+    def get_aggregate_recipes(self) -> Dict[str, List[RecipeEntry]]:
+        """Return recipes of parent processes, summed from their children's."""
+        if "aggregate_recipes" not in self.caches:
+            from .aggregate import aggregate_recipes
+
+            self.caches["aggregate_recipes"] = aggregate_recipes(
+                self.get_hierarchy("process"), self.process_recipe
+            )
+        return self.caches["aggregate_recipes"]
+
+    def get_things_by_type(self, thing_type: str) -> List[Tuple[str, ThingEntry]]:
+        """Return things of a type as (uri, entry) pairs, sorted by label."""
+        if "things_by_type" not in self.caches:
+            by_type: Dict[str, List[Tuple[str, ThingEntry]]] = defaultdict(list)
+            for uri, thing in self.things.items():
+                by_type[thing.thing_type].append((uri, thing))
+            for items in by_type.values():
+                items.sort(
+                    key=lambda item: (item[1].label.upper(), item[1].label, item[0])
+                )
+            self.caches["things_by_type"] = by_type
+        return self.caches["things_by_type"].get(thing_type, [])
+
+    def lookup_thing(self, uri: str) -> Optional[ThingEntry]:
+        """Find the thing a link to `uri` refers to, as `resolve_xref` would."""
+        thing = self.things.get(uri)
+        if thing is None:
+            matches = self.find_thing(uri, thing_type="ref")
+            if matches:
+                thing = matches[0][1]
+        return thing
+
+    def get_external_things(self) -> Dict[str, "ExternalThing"]:
+        """Things defined in other projects, from `probs_rdf_inventories`."""
+        if "inventory" not in self.caches:
+            from .inventory import external_things
+
+            self.caches["inventory"] = external_things(self)
+        return self.caches["inventory"]
+
+    def get_view(self) -> "GraphView":
+        """Return a compact, read-only view of the graph for writing."""
+        if "view" not in self.caches:
+            from .view import build_view
+
+            self.caches["view"] = build_view(self.graph)
+        return self.caches["view"]
+
     def get_graph(self, graph_id):
         return self.graph.get_context(graph_id)
 
@@ -803,9 +1173,10 @@ class SystemDomain(Domain):
         self, uri: str, thing_type: str, label: str, node_id: str, location: Any = None
     ):
         """Note the definition of a thing (what Sphinx calls an "object")."""
-        if uri in self.things:
-            # duplicated
-            other = self.things[uri]
+        docname = self.env.docname
+        other = self.things.get(uri)
+        if other is not None and other.docname == docname:
+            # duplicated within this document
             logger.warning(
                 __(
                     "duplicate description of %s, "
@@ -815,28 +1186,129 @@ class SystemDomain(Domain):
                 other.docname,
                 location=location,
             )
-        self.things[uri] = ThingEntry(self.env.docname, node_id, thing_type, label)
+        elif other is not None:
+            # duplicated in another document: this is reported once all
+            # documents have been read, see validate.py
+            self.note_duplicate(uri, [other.docname, docname])
+        elif uri in self.duplicates:
+            # the other definitions' entry was removed when this document
+            # was cleared
+            self.note_duplicate(uri, [docname])
+        self.things[self.intern_uri(uri)] = ThingEntry(
+            docname, node_id, thing_type, label
+        )
 
-    def note_process_recipe(self, uri: str, consumes: list, produces: list):
-        self.process_recipe[uri] = [(k, "consumes") for k in consumes] + [
-            (k, "produces") for k in produces
+    def note_duplicate(self, uri: str, docnames: List[str]):
+        known = self.duplicates.setdefault(uri, [])
+        for docname in docnames:
+            if docname not in known:
+                known.append(docname)
+
+    def note_references(
+        self,
+        uri: str,
+        references: List[Tuple[str, str]],
+        location: Optional[Tuple[str, int]] = None,
+    ):
+        """Note the references made by a thing defined at (docname, lineno)."""
+        uri = self.intern_uri(uri)
+        if references:
+            self.references[uri] = [
+                (kind, self.intern_uri(other)) for kind, other in references
+            ]
+        else:
+            self.references.pop(uri, None)
+        if location is not None:
+            self.reference_locations[uri] = location
+        else:
+            self.reference_locations.pop(uri, None)
+
+    def note_query(self, docname: str):
+        self.queries[docname] = self.queries.get(docname, 0) + 1
+
+    def note_process_recipe(self, uri: str, entries: List[RecipeEntry]):
+        self.forget_process_recipe(uri)
+        uri = self.intern_uri(uri)
+        entries = [
+            RecipeEntry(
+                self.intern_uri(entry.object),
+                entry.direction,
+                entry.amount,
+                self.intern_uri(entry.metric),
+            )
+            for entry in entries
         ]
+        self.process_recipe[uri] = entries
+        for entry in entries:
+            processes = self.object_usage.setdefault(entry.object, [])
+            if uri not in processes:
+                processes.append(uri)
+
+    def forget_process_recipe(self, uri: str):
+        for entry in self.process_recipe.pop(uri, []):
+            processes = self.object_usage.get(entry.object, [])
+            if uri in processes:
+                processes.remove(uri)
+            if not processes:
+                self.object_usage.pop(entry.object, None)
 
     def clear_doc(self, docname: str) -> None:
         for uri, thing in list(self.things.items()):
             if thing.docname == docname:
                 del self.things[uri]
-
-        g = self.get_graph(docname)
-        g.remove((None, None, None))
+                self.forget_process_recipe(uri)
+                self.references.pop(uri, None)
+                self.reference_locations.pop(uri, None)
+
+        for uri, docnames in list(self.duplicates.items()):
+            if docname in docnames:
+                docnames.remove(docname)
+                if not docnames:
+                    del self.duplicates[uri]
+
+        self.queries.pop(docname, None)
+        self.context_digests.pop(docname, None)
+        self.notebook_digests.pop(docname, None)
+
+        if self.data.get("graph") is not None:
+            g = self.get_graph(docname)
+            g.remove((None, None, None))
+            # For disk-backed stores, let parallel reading processes write
+            g.store.commit()
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
-        # XXX check duplicates?
+        for uri, others in otherdata.get("duplicates", {}).items():
+            self.note_duplicate(uri, [d for d in others if d in docnames])
         for uri, thing in otherdata["things"].items():
             if thing.docname in docnames:
-                self.things[uri] = thing
-        if "graph" in otherdata:
-            self.graph += otherdata["graph"]
+                if uri in self.things and self.things[uri].docname != thing.docname:
+                    self.note_duplicate(uri, [self.things[uri].docname, thing.docname])
+                self.things[self.intern_uri(uri)] = thing
+                if uri in otherdata.get("process_recipe", {}):
+                    self.note_process_recipe(uri, otherdata["process_recipe"][uri])
+                self.note_references(
+                    uri,
+                    otherdata.get("references", {}).get(uri, []),
+                    otherdata.get("reference_locations", {}).get(uri),
+                )
+        for docname in docnames:
+            self.context_digests.pop(docname, None)
+            if docname in otherdata.get("queries", {}):
+                self.queries[docname] = otherdata["queries"][docname]
+            if docname in otherdata.get("notebook_digests", {}):
+                self.notebook_digests[docname] = otherdata["notebook_digests"][docname]
+        if otherdata.get("graph") is not None:
+            # Keep the per-document contexts, so that they can be cleared
+            # again on incremental builds
+            other_graph = otherdata["graph"]
+            if _same_database(other_graph.store, self.graph.store):
+                # Already written to the shared database by the other process
+                return
+            for docname in docnames:
+                context = self.get_graph(docname)
+                self.graph.addN(
+                    (s, p, o, context) for s, p, o in other_graph.get_context(docname)
+                )
 
     def find_thing(
         self,
@@ -879,7 +1351,9 @@ class SystemDomain(Domain):
         matches = self.find_thing(target, thing_type=thing_type)
 
         if not matches:
-            return None
+            return self.resolve_external_xref(
+                fromdocname, builder, thing_type, target, node, contnode
+            )
         elif len(matches) > 1:
             logger.warning(
                 __("more than one target found for cross-reference %r: %s"),
@@ -903,6 +1377,46 @@ class SystemDomain(Domain):
             builder, fromdocname, thing.docname, thing.node_id, children, uri
         )
 
+    def resolve_external_xref(
+        self,
+        fromdocname: str,
+        builder: Builder,
+        thing_type: str,
+        target: str,
+        node: pending_xref,
+        contnode: Element,
+    ) -> Optional[Element]:
+        """Resolve a reference to a thing defined in another project."""
+        if not self.env.config.probs_rdf_inventories:
+            return None
+        from .inventory import find_external
+
+        thing_types = self.objtypes_for_role(thing_type) or []
+        matches = find_external(self, target, thing_types)
+        if not matches:
+            return None
+        elif len(matches) > 1:
+            logger.warning(
+                __("more than one target found for cross-reference %r: %s"),
+                target,
+                ", ".join(match[0] for match in matches),
+                type="ref",
+                subtype="system",
+                location=node,
+            )
+        uri, thing = matches[0]
+        url = thing.url
+        if "://" not in url and not url.startswith("/"):
+            # Relative to the root of this project's output
+            url = relative_uri(builder.get_target_uri(fromdocname), url)
+
+        content = find_pending_xref_condition(node, "resolved")
+        children = content.children if content else [contnode]
+        return nodes.reference(
+            "", "", *children, internal=False, refuri=url,
+            reftitle="%s (in %s)" % (uri, thing.project),
+        )
+
     # TODO: implement `resolve_any_xref`?
 
     def get_objects(self) -> Iterator[Tuple[str, str, str, str, str, int]]:
@@ -918,8 +1432,18 @@ class SystemDomain(Domain):
         #   2 = unimportant (after full-text matches)
         #   -1 = don't show in search at all
 
+        # With a separate search index (see search.py), keep things out of
+        # Sphinx's own
+        priority = -1 if self.env.config.probs_rdf_search_index else 1
         for uri, thing in self.things.items():
-            yield (uri, thing.label, thing.thing_type, thing.docname, thing.node_id, 1)
+            yield (
+                uri,
+                thing.label,
+                thing.thing_type,
+                thing.docname,
+                thing.node_id,
+                priority,
+            )
 
     def get_full_qualified_name(self, node):
         # XXX Fix me to return URI
@@ -0,0 +1,493 @@
+"""Compact binary dump of the system graph, and a fast API for reading it.
+
+With ``probs_rdf_binary_output = True``, the postprocessed graph is written
+alongside `output.ttl` as `output.rdfbin`, which `load` opens by memory
+mapping it: nothing is parsed up front, and only the parts of the file that
+are looked at are read from disk. Neither Sphinx nor rdflib is imported.
+
+The file holds a term dictionary and the triples as arrays of term indices:
+
+- an 8-byte magic string, the format version and the length of a JSON
+  header, followed by the header (section offsets, byte order, literal
+  languages and namespace bindings);
+- ``term_offsets``, ``term_data``: the terms' values, UTF-8 encoded and
+  concatenated, sorted by kind (URIs first) and value, so URIs can be found
+  by binary search;
+- ``term_kind`` (URI, blank node or literal) and ``term_extra`` (a literal's
+  datatype as a term index, or its language as ``-2 - index``, or -1);
+- ``s``, ``p``, ``o``: the triples, sorted by subject, predicate and object;
+- ``by_object``: indices of the triples, sorted by object and subject.
+
+Arrays are in the byte order of the machine which wrote them; on a machine
+with the other byte order they are read into memory and swapped instead.
+"""
+
+from array import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import (
+    Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union,
+)
+
+MAGIC = b"PROBSRDF"
+VERSION = 1
+DUMP_FILENAME = "output.rdfbin"
+ALIGNMENT = 8
+
+URI, BNODE, LITERAL = range(3)
+
+SECTIONS = [
+    ("term_offsets", "Q"),
+    ("term_data", "B"),
+    ("term_kind", "B"),
+    ("term_extra", "i"),
+    ("s", "I"),
+    ("p", "I"),
+    ("o", "I"),
+    ("by_object", "I"),
+]
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+PROBS = "http://w3id.org/probs-lab/ontology#"
+PROBS_RECIPE = "http://w3id.org/probs-lab/process-recipe#"
+PROBS_RDF = "urn:x-sphinx-probs-rdf:"
+DIRECTIONS = ("consumes", "produces")
+
+
+class Literal(NamedTuple):
+    """A literal term, as returned by `SystemData`."""
+
+    value: str  # the lexical form
+    datatype: Optional[str] = None
+    language: Optional[str] = None
+
+
+Term = Union[str, Literal]  # URIs are str, blank nodes are str "_:label"
+
+
+def _term_key(term) -> Tuple[int, str]:
+    from rdflib import BNode, URIRef  # type: ignore
+
+    if isinstance(term, URIRef):
+        return URI, str(term)
+    if isinstance(term, BNode):
+        return BNODE, str(term)
+    return LITERAL, str(term)
+
+
+def write_dump(graph, filename: str):
+    """Write `graph` to `filename` in the compact binary format.
+
+    The file is written under a temporary name and then moved into place, so
+    that processes which have the previous version open keep reading it.
+    """
+    ids: Dict = {}
+    triples = set()
+    for triple in graph.triples((None, None, None)):
+        key = []
+        for term in triple:
+            i = ids.get(term)
+            if i is None:
+                i = ids[term] = len(ids)
+            key.append(i)
+        triples.add(tuple(key))
+
+    # Literals' datatypes must be terms too
+    for term in list(ids):
+        datatype = getattr(term, "datatype", None)
+        if datatype is not None and datatype not in ids:
+            ids[datatype] = len(ids)
+
+    terms = list(ids)
+    keys = [_term_key(term) for term in terms]
+    order = sorted(
+        range(len(terms)),
+        key=lambda i: (keys[i][0], keys[i][1].encode("utf-8"),
+                       str(getattr(terms[i], "datatype", None) or ""),
+                       getattr(terms[i], "language", None) or ""),
+    )
+    new_id = [0] * len(terms)
+    for new, old in enumerate(order):
+        new_id[old] = new
+
+    langs: List[str] = []
+    lang_index: Dict[str, int] = {}
+    sections: Dict[str, array] = {name: array(code) for name, code in SECTIONS}
+    data = bytearray()
+    offsets = sections["term_offsets"]
+    offsets.append(0)
+    for old in order:
+        kind, value = keys[old]
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+        sections["term_kind"].append(kind)
+        extra = -1
+        if kind == LITERAL:
+            term = terms[old]
+            if term.language:
+                if term.language not in lang_index:
+                    lang_index[term.language] = len(langs)
+                    langs.append(term.language)
+                extra = -2 - lang_index[term.language]
+            elif term.datatype is not None:
+                extra = new_id[ids[term.datatype]]
+        sections["term_extra"].append(extra)
+    sections["term_data"] = array("B", bytes(data))
+
+    spo = sorted((new_id[s], new_id[p], new_id[o]) for s, p, o in triples)
+    for name, column in zip("spo", zip(*spo)):
+        sections[name] = array("I", column)
+    sections["by_object"] = array(
+        "I", sorted(range(len(spo)), key=lambda i: (spo[i][2], spo[i][0], spo[i][1]))
+    )
+
+    header_sections = {}
+    position = 0
+    for name, code in SECTIONS:
+        header_sections[name] = [position, code, len(sections[name])]
+        position += _padded(len(sections[name]) * sections[name].itemsize)
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "sections": header_sections,
+        "langs": langs,
+        "namespaces": [[prefix, str(ns)] for prefix, ns in graph.namespaces()],
+    }).encode("utf-8")
+    # Pad the header so that the sections are aligned
+    end = len(MAGIC) + 8 + len(header)
+    header += b" " * (_padded(end) - end)
+
+    partial = filename + ".part"
+    with open(partial, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", VERSION, len(header)))
+        f.write(header)
+        for name, _ in SECTIONS:
+            raw = sections[name].tobytes()
+            f.write(raw)
+            f.write(b"\0" * (_padded(len(raw)) - len(raw)))
+    os.replace(partial, filename)
+
+
+def _padded(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+class SystemData:
+    """A system graph opened from a binary dump; see `load`.
+
+    URIs are given and returned as plain strings. Lookups of unknown URIs
+    return nothing rather than raising errors.
+    """
+
+    # Sections of the file, set from the header by `__init__`
+    _term_offsets: Sequence[int]
+    _term_data: memoryview
+    _term_kind: Sequence[int]
+    _term_extra: Sequence[int]
+    _s: Sequence[int]
+    _p: Sequence[int]
+    _o: Sequence[int]
+    _by_object: Sequence[int]
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        self._views = [buffer]
+        if buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a system graph dump" % filename)
+        version, header_length = struct.unpack_from("<II", buffer, len(MAGIC))
+        if version != VERSION:
+            self.close()
+            raise ValueError(
+                "%s has unsupported format version %d" % (filename, version)
+            )
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(buffer[start:start + header_length]))
+        start += header_length
+        self._langs: List[str] = header["langs"]
+        self.namespaces: List[Tuple[str, str]] = [
+            (prefix, ns) for prefix, ns in header["namespaces"]
+        ]
+
+        swap = header["byteorder"] != sys.byteorder
+        for name, (offset, code, length) in header["sections"].items():
+            size = length * array(code).itemsize
+            raw = buffer[start + offset:start + offset + size]
+            self._views.append(raw)
+            if swap and array(code).itemsize > 1:
+                section: Sequence[int] = array(code, raw.tobytes())
+                section.byteswap()  # type: ignore
+            else:
+                section = raw.cast(code)
+                self._views.append(section)
+            setattr(self, "_" + name, section)
+
+        self._num_uris = bisect.bisect_left(self._term_kind, BNODE)
+
+    def close(self):
+        """Close the file. Nothing can be looked up afterwards."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        """Number of triples."""
+        return len(self._s)
+
+    # Terms
+
+    def _value(self, i: int) -> str:
+        return str(self._term_data[self._term_offsets[i]:self._term_offsets[i + 1]],
+                   "utf-8")
+
+    def _term(self, i: int) -> Term:
+        kind = self._term_kind[i]
+        value = self._value(i)
+        if kind == URI:
+            return value
+        if kind == BNODE:
+            return "_:" + value
+        extra = self._term_extra[i]
+        if extra >= 0:
+            return Literal(value, self._value(extra))
+        if extra < -1:
+            return Literal(value, language=self._langs[-2 - extra])
+        return Literal(value)
+
+    def _uri_id(self, uri: str) -> Optional[int]:
+        key = uri.encode("utf-8")
+        offsets, data = self._term_offsets, self._term_data
+        lo, hi = 0, self._num_uris
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(data[offsets[mid]:offsets[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._num_uris and bytes(data[offsets[lo]:offsets[lo + 1]]) == key:
+            return lo
+        return None
+
+    def _ids(self, *uris: str) -> Optional[List[int]]:
+        ids = [self._uri_id(uri) for uri in uris]
+        return None if None in ids else ids  # type: ignore
+
+    # Triples
+
+    def _with_subject(self, s: int) -> range:
+        return range(bisect.bisect_left(self._s, s), bisect.bisect_right(self._s, s))
+
+    def _with_object(self, o: int) -> Iterator[int]:
+        by_object, objects = self._by_object, self._o
+        lo, hi = 0, len(by_object)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if objects[by_object[mid]] < o:
+                lo = mid + 1
+            else:
+                hi = mid
+        for j in range(lo, len(by_object)):
+            i = by_object[j]
+            if objects[i] != o:
+                break
+            yield i
+
+    def _objects(self, s: int, p: int) -> List[int]:
+        return [self._o[i] for i in self._with_subject(s) if self._p[i] == p]
+
+    def _subjects(self, p: int, o: int) -> List[int]:
+        return [self._s[i] for i in self._with_object(o) if self._p[i] == p]
+
+    def triples(
+        self, s: Optional[str] = None, p: Optional[str] = None, o: Optional[str] = None
+    ) -> Iterator[Tuple[Term, Term, Term]]:
+        """Triples matching a pattern of URIs (None matches anything)."""
+        ids: List[Optional[int]] = []
+        for uri in (s, p, o):
+            i = None if uri is None else self._uri_id(uri)
+            if uri is not None and i is None:
+                return
+            ids.append(i)
+        si, pi, oi = ids
+        candidates: Iterable[int]
+        if si is not None:
+            candidates = self._with_subject(si)
+        elif oi is not None:
+            candidates = self._with_object(oi)
+        else:
+            candidates = range(len(self._s))
+        term = self._term
+        for i in candidates:
+            if pi is not None and self._p[i] != pi:
+                continue
+            if oi is not None and self._o[i] != oi:
+                continue
+            yield term(self._s[i]), term(self._p[i]), term(self._o[i])
+
+    # Systems
+
+    def _instances(self, type_uri: str) -> List[str]:
+        ids = self._ids(RDF_TYPE, type_uri)
+        if ids is None:
+            return []
+        return sorted(self._value(s) for s in self._subjects(*ids))
+
+    def processes(self) -> List[str]:
+        """URIs of all processes, sorted."""
+        return self._instances(PROBS + "Process")
+
+    def objects(self) -> List[str]:
+        """URIs of all objects, sorted."""
+        return self._instances(PROBS + "Object")
+
+    def label(self, uri: str) -> Optional[str]:
+        """The rdfs:label of `uri`, if any."""
+        ids = self._ids(uri, RDFS_LABEL)
+        if ids is None:
+            return None
+        for o in self._objects(*ids):
+            return self._value(o)
+        return None
+
+    def _composition(self, uri: str, parents: bool) -> List[str]:
+        for predicate in (PROBS + "processComposedOf", PROBS + "objectComposedOf"):
+            ids = self._ids(uri, predicate)
+            if ids is None:
+                continue
+            if parents:
+                related = self._subjects(ids[1], ids[0])
+            else:
+                related = self._objects(*ids)
+            if related:
+                return sorted(self._value(i) for i in related)
+        return []
+
+    def children(self, uri: str) -> List[str]:
+        """Direct parts of process or object `uri` (its composed-of relations)."""
+        return self._composition(uri, parents=False)
+
+    def parents(self, uri: str) -> List[str]:
+        """Processes or objects which `uri` is directly part of."""
+        return self._composition(uri, parents=True)
+
+    def recipe(
+        self, uri: str, aggregate: bool = False
+    ) -> Optional[Dict[str, List[dict]]]:
+        """Recipe of process `uri` by direction, or None if it has none.
+
+        Each row is a dict of "object", "amount" and "metric" (None if not
+        given). With `aggregate`, returns the aggregate recipe of the process
+        instead, if written with `probs_rdf_aggregate_recipes`.
+        """
+        if aggregate:
+            predicate = PROBS_RDF + "hasAggregateRecipe"
+        else:
+            predicate = PROBS_RECIPE + "hasRecipe"
+        ids = self._ids(uri, predicate)
+        recipes = self._objects(*ids) if ids is not None else []
+        if not recipes:
+            return None
+        field = {
+            name: self._uri_id(PROBS_RECIPE + name)
+            for name in ("object", "quantity", "metric")
+        }
+        result: Dict[str, List[dict]] = {}
+        for direction in DIRECTIONS:
+            result[direction] = rows = []
+            d = self._uri_id(PROBS_RECIPE + direction)
+            if d is None:
+                continue
+            for item in self._objects(recipes[0], d):
+                values = {}
+                for name, field_id in field.items():
+                    found = [] if field_id is None else self._objects(item, field_id)
+                    values[name] = self._value(found[0]) if found else None
+                quantity = values["quantity"]
+                rows.append({
+                    "object": values["object"],
+                    "amount": float(quantity) if quantity is not None else None,
+                    "metric": values["metric"],
+                })
+        return result
+
+    def usage(self, uri: str) -> Dict[str, List[str]]:
+        """Processes whose recipes consume and produce object `uri`."""
+        result: Dict[str, List[str]] = {direction: [] for direction in DIRECTIONS}
+        ids = self._ids(
+            uri, PROBS_RECIPE + "object", PROBS_RECIPE + "hasRecipe"
+        )
+        if ids is None:
+            return result
+        obj, object_predicate, has_recipe = ids
+        for direction in DIRECTIONS:
+            d = self._uri_id(PROBS_RECIPE + direction)
+            if d is None:
+                continue
+            processes = {
+                self._value(process)
+                for item in self._subjects(object_predicate, obj)
+                for recipe in self._subjects(d, item)
+                for process in self._subjects(has_recipe, recipe)
+            }
+            result[direction] = sorted(processes)
+        return result
+
+    def to_graph(self):
+        """Convert to an rdflib `Graph` (this imports rdflib, and is slow)."""
+        from rdflib import BNode, Graph, Literal as RDFLiteral, URIRef  # type: ignore
+
+        terms: list = []
+        for i in range(len(self._term_kind)):
+            kind = self._term_kind[i]
+            value = self._value(i)
+            if kind == URI:
+                terms.append(URIRef(value))
+            elif kind == BNODE:
+                terms.append(BNode(value))
+            else:
+                extra = self._term_extra[i]
+                if extra >= 0:
+                    terms.append(RDFLiteral(value, datatype=self._value(extra)))
+                elif extra < -1:
+                    terms.append(RDFLiteral(value, lang=self._langs[-2 - extra]))
+                else:
+                    terms.append(RDFLiteral(value))
+
+        g = Graph(bind_namespaces="none")
+        for prefix, ns in self.namespaces:
+            g.bind(prefix, ns)
+        s, p, o = self._s, self._p, self._o
+        g.addN((terms[s[i]], terms[p[i]], terms[o[i]], g) for i in range(len(s)))
+        return g
+
+
+def load(filename: str) -> SystemData:
+    """Open a system graph dump (`output.rdfbin`) written by the builder.
+
+    For example::
+
+        from sphinx_probs_rdf import load
+
+        with load("_build/probs_rdf/output.rdfbin") as system:
+            for process in system.processes():
+                print(process, system.label(process), system.recipe(process))
+
+    Opening the file is nearly instant however large it is, since nothing
+    is read until it is looked up.
+    """
+    return SystemData(filename)
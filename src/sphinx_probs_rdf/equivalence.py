@@ -0,0 +1,79 @@
+"""Equivalence classes of objects linked by probs:objectEquivalentTo."""
+
+from typing import Dict, Generic, Hashable, Iterable, List, Tuple, TypeVar
+
+# Items are sorted by their string form, as in `hierarchy`
+T = TypeVar("T", bound=Hashable)
+
+
+class UnionFind(Generic[T]):
+    """Disjoint-set forest with union by size and path halving."""
+
+    def __init__(self):
+        self._parent: Dict[T, T] = {}
+        self._size: Dict[T, int] = {}
+
+    def add(self, item: T):
+        if item not in self._parent:
+            self._parent[item] = item
+            self._size[item] = 1
+
+    def find(self, item: T) -> T:
+        """Return the root of the set containing `item`."""
+        self.add(item)
+        parent = self._parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: T, b: T):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+
+    def groups(self) -> List[List[T]]:
+        """List the sets, each sorted, containing more than one item."""
+        groups: Dict[T, List[T]] = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        sets = [sorted(g, key=str) for g in groups.values() if len(g) > 1]
+        return sorted(sets, key=lambda g: [str(item) for item in g])
+
+
+class EquivalenceClasses(Generic[T]):
+    """Equivalence classes given by pairs of equivalent items.
+
+    The representative of each class is its smallest member, so it does not
+    depend on the order the pairs were given in.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[T, T]]):
+        uf: UnionFind[T] = UnionFind()
+        for a, b in pairs:
+            uf.union(a, b)
+        self.classes = uf.groups()
+        self._class_of: Dict[T, List[T]] = {
+            item: members for members in self.classes for item in members
+        }
+
+    def members(self, item: T) -> List[T]:
+        """All members of the class containing `item` (including itself)."""
+        return self._class_of.get(item, [item])
+
+    def representative(self, item: T) -> T:
+        return self.members(item)[0]
+
+    def __len__(self):
+        return len(self.classes)
+
+
+def build_equivalence(graph) -> EquivalenceClasses:
+    """Find classes of objects related by probs:objectEquivalentTo."""
+    from .namespaces import PROBS
+
+    return EquivalenceClasses(graph.subject_objects(PROBS.objectEquivalentTo))
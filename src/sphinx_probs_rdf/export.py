@@ -0,0 +1,144 @@
+"""Writing `output.ttl` in the background, while documents are written.
+
+The graph is complete once all documents have been read, so for builders
+which write documents (such as ``html``), `output.ttl` is postprocessed and
+serialized in a forked process started as soon as reading has finished.
+The process works on its own copy of the graph, so the graph in the
+environment does not change while documents are being written. Any error
+in it is raised when the build finishes. All the files it writes (including
+`output.rdfbin`, `output.jsonld` and statistics, if enabled) are written
+under partial names, and only moved into place if the build succeeds.
+
+This needs ``fork`` (as for Sphinx's parallel builds), more than one CPU,
+and the in-memory store: a forked process cannot share the SQLite store's
+connection. Otherwise, or with ``probs_rdf_background_export = False``,
+`output.ttl` is written when the build finishes, as before.
+"""
+
+import multiprocessing
+import os
+import traceback
+from typing import List, cast
+
+from sphinx.errors import SphinxError
+
+from .builder import OUTPUT_FILENAME, ProbsSystemRDFBuilder, write_graph
+from .directives import SystemDomain
+
+PARTIAL_SUFFIX = ".part"
+
+
+class ExportError(SphinxError):
+    category = "output.ttl export error"
+
+
+class BackgroundExport:
+    """A forked process writing the graph to `outdir`."""
+
+    def __init__(self, env, outdir: str):
+        self.outdir = outdir
+        self.filename = os.path.join(outdir, OUTPUT_FILENAME)
+        context = multiprocessing.get_context("fork")
+        self._conn, child_conn = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=self._run, args=(env, child_conn), daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+
+    def _run(self, env, conn):
+        try:
+            written = write_graph(env, self.outdir, suffix=PARTIAL_SUFFIX)
+        except BaseException:
+            conn.send((None, traceback.format_exc()))
+        else:
+            conn.send((written, None))
+        finally:
+            conn.close()
+
+    def join(self):
+        """Wait for the export to finish, and move the files into place."""
+        try:
+            written, error = self._conn.recv()
+        except EOFError:  # e.g. killed
+            self._process.join()
+            written, error = None, "process exited with code %s" % (
+                self._process.exitcode
+            )
+        self._conn.close()
+        self._process.join()
+        if error is not None:
+            self._remove_partial()
+            raise ExportError("Writing %s failed:\n%s" % (self.filename, error))
+        for filename in written:
+            os.replace(filename + PARTIAL_SUFFIX, filename)
+
+    def cancel(self):
+        """Stop the export, leaving any existing output in place."""
+        self._conn.close()
+        self._process.terminate()
+        self._process.join()
+        self._remove_partial()
+
+    def _remove_partial(self):
+        # The child may not have said which files it wrote
+        for filename in _output_filenames(self.outdir):
+            try:
+                os.remove(filename + PARTIAL_SUFFIX)
+            except FileNotFoundError:
+                pass
+
+
+def _output_filenames(outdir: str) -> List[str]:
+    """Paths of all the files `write_graph` may write to `outdir`."""
+    from .dump import DUMP_FILENAME
+    from .jsonld import JSONLD_FILENAME
+    from .stats import STATS_HTML_FILENAME, STATS_JSON_FILENAME
+
+    names = [OUTPUT_FILENAME, DUMP_FILENAME, JSONLD_FILENAME,
+             STATS_JSON_FILENAME, STATS_HTML_FILENAME]
+    return [os.path.join(outdir, name) for name in names]
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def start_background_export(app, env):
+    """Start writing `output.ttl` once reading has finished, if possible.
+
+    This runs after external RDF files have been read into the graph.
+    """
+    from sphinx.util.parallel import parallel_available
+
+    if not app.config.probs_rdf_background_export or not parallel_available:
+        return
+    if isinstance(app.builder, ProbsSystemRDFBuilder):
+        return  # the graph is written by the builder, with nothing to overlap
+    if app.config.probs_rdf_store != "memory":
+        return
+    if _available_cpus() < 2:
+        return  # it would only compete with writing documents
+    domain = cast(SystemDomain, env.get_domain("system"))
+    if domain.data.get("graph") is None:
+        return  # the system domain was never used
+    os.makedirs(app.outdir, exist_ok=True)
+    domain.caches["export"] = BackgroundExport(env, app.outdir)
+
+
+def finish_background_export(app, exc) -> bool:
+    """Wait for a background export, if one was started.
+
+    Returns whether there was one.
+    """
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    export = domain.caches.pop("export", None)
+    if export is None:
+        return False
+    if exc:
+        export.cancel()
+    else:
+        export.join()
+    return True
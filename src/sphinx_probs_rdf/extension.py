@@ -0,0 +1,330 @@
+import os
+from os import path
+from sphinx.util.fileutil import copy_asset_file
+from typing import Any, Dict, cast
+from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.errors import ConfigError
+
+from .version import __version__
+from .builder import ProbsSystemRDFBuilder, write_graph
+from .export import finish_background_export, start_background_export
+from .directives import (
+    SystemDomain,
+    StartSubProcessesDirective,
+    StartSubObjectsDirective,
+    EndSubProcessesDirective,
+    EndSubObjectsDirective,
+    TTL,
+    ObjectEquivalentTo,
+    index_pages,
+    probs_table,
+    probs_diagram,
+)
+from .diagrams import visit_probs_diagram_html, write_diagrams
+from .inventory import load_inventories, write_inventory
+from .notebooks import configure_myst_nb, note_notebook, outdated_notebooks
+from .resolve import ProbsTransform, visit_probs_table_html
+from .search import SearchWidget, write_search_index
+from .validate import check_references
+from .view import freeze_for_parallel_write, unfreeze
+
+
+# Old version
+NB_RENDER_PRIORITY = {
+    "probs_rdf": (
+        "application/vnd.jupyter.widget-view+json",
+        "application/javascript",
+        "text/html",
+        "image/svg+xml",
+        "image/png",
+        "image/jpeg",
+        "text/markdown",
+        "text/latex",
+        "text/plain",
+    )
+}
+
+NB_RENDER_PRIORITY_NEW = [
+    (k, v, (1 + i) * 10)
+    for k, items in NB_RENDER_PRIORITY.items()
+    for i, v in enumerate(items)
+]
+
+
+def copy_custom_files(app, exc):
+    if app.builder.format == "html" and not exc:
+        staticdir = path.join(app.builder.outdir, "_static")
+        here = path.dirname(__file__)
+        copy_asset_file(path.join(here, "_static/system-definitions.css"), staticdir)
+        if app.config.probs_rdf_search_index:
+            copy_asset_file(path.join(here, "_static/system-search.js"), staticdir)
+
+
+def add_search_script(app):
+    if app.config.probs_rdf_search_index:
+        app.add_js_file("system-search.js")
+
+
+def save_graph(app, exc):
+    if finish_background_export(app, exc):
+        return
+    if not exc:
+        assert app.builder
+        if isinstance(app.builder, ProbsSystemRDFBuilder):
+            # Already written by the builder itself
+            return
+        assert app.builder.env is not None
+        domain = cast(SystemDomain, app.builder.env.get_domain("system"))
+        if domain.data.get("graph") is None:
+            # The system domain was never used
+            return
+        write_graph(app.builder.env, app.builder.outdir)
+
+
+# Metrics are kept as plain strings in the config, so that rdflib does not
+# need to be imported unless the system domain is used.
+QUANTITYKIND = "http://qudt.org/vocab/quantitykind/"
+DEFAULT_UNIT_METRICS = {
+    "kg": (1, QUANTITYKIND + "Mass"),
+    "m2": (1, QUANTITYKIND + "Area"),
+    "m3": (1, QUANTITYKIND + "Volume"),
+    "-": (1, QUANTITYKIND + "Dimensionless"),
+}
+
+
+def parse_uri(config, value, default_ns) -> str:
+    if value and value[0] == "<" and value[-1] == ">":
+        return value[1:-1]
+    prefix, _, item_id = value.rpartition(":")
+    if not prefix:
+        ns = default_ns
+    else:
+        ns = config.probs_rdf_extra_prefixes[prefix]
+    if not item_id:
+        raise ValueError("Missing suffix in %r" % value)
+    return str(ns) + item_id
+
+
+def merge_default_config(app: Sphinx, config: Config):
+    d = config.probs_rdf_units
+    for unit, value in d.items():
+        if isinstance(value, str):
+            scale = 1
+            metric = value
+        else:
+            scale, metric = value
+        metric = parse_uri(config, metric, QUANTITYKIND)
+        d[unit] = (scale, metric)
+    for unit, (scale, metric) in DEFAULT_UNIT_METRICS.items():
+        if unit not in d:
+            d[unit] = (scale, metric)
+
+    # Checked here rather than when the output is written, which may be in the
+    # background export process
+    mode = config.probs_rdf_materialize_equivalence
+    if mode is not None:
+        from .postprocess import EQUIVALENCE_MODES
+
+        if mode not in EQUIVALENCE_MODES:
+            raise ConfigError(
+                "probs_rdf_materialize_equivalence should be one of %s, not %r"
+                % (", ".join(map(repr, EQUIVALENCE_MODES)), mode)
+            )
+
+
+def read_external_graph(app: Sphinx, env):
+    """Read in any data from external RDF files.
+
+    Files which have not changed since they were last read are skipped. The
+    others are parsed in parallel if Sphinx was run with several processes.
+    """
+    from .external import add_parsed_file, parse_files
+
+    paths = env.config.probs_rdf_paths
+    if not paths:
+        return
+    domain = cast(SystemDomain, env.get_domain("system"))
+    g = domain.graph
+    changed = {}
+    for p in paths:
+        location = path.join(app.confdir, p)
+        mtime = os.stat(location).st_mtime
+        if domain.external_sources.get(location) != mtime:
+            changed[location] = mtime
+
+    if not changed:
+        return
+
+    for location, parsed in zip(changed, parse_files(list(changed), app.parallel)):
+        # This replaces any previous triples in the file's context
+        add_parsed_file(g, parsed)
+        domain.external_sources[location] = changed[location]
+        domain.context_digests.pop(parsed.identifier, None)
+
+    # Check if the external graph has duplicated any of our own prefix
+    # definitions
+    seen = set()
+    bound_namespaces = list(g.namespace_manager.namespaces())
+    g.namespace_manager.reset()
+    for prefix, ns in bound_namespaces:
+        if ns in seen:
+            g.bind(prefix, ns)
+        seen.add(ns)
+
+
+def prepare_graph_store(app: Sphinx, env, docnames):
+    """Set up the graph's store before any documents are read.
+
+    If `probs_rdf_store` has changed, every document is about to be read
+    again, so the old graph is dropped. A disk-backed graph is created now so
+    that parallel reading processes share its database, rather than each
+    creating a new one.
+    """
+    domain = cast(SystemDomain, env.get_domain("system"))
+    graph = domain.data.get("graph")
+    if graph is not None and getattr(graph.store, "path", None) != domain.store_path():
+        domain.data["graph"] = None
+        domain.external_sources.clear()
+        domain.context_digests.clear()
+    if env.config.probs_rdf_store != "memory":
+        domain.graph
+
+
+def commit_graph_store(app: Sphinx, doctree):
+    """Commit a disk-backed graph after each document is read.
+
+    This releases the database's write lock for other reading processes.
+    """
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    graph = domain.data.get("graph")
+    if graph is not None:
+        graph.store.commit()
+
+
+def clear_domain_caches(app: Sphinx, env):
+    """Clear indexes derived from the domain data, after reading."""
+    domain = cast(SystemDomain, env.get_domain("system"))
+    domain.clear_caches()
+
+
+def digest_graph(app: Sphinx, env):
+    """Digest the graph after reading, if there are queries to cache.
+
+    This is done before the environment is pickled, so that the digests of
+    unchanged contexts are kept for the next build. If the graph has changed,
+    documents containing queries are written again, even if they were not
+    read again themselves.
+    """
+    domain = cast(SystemDomain, env.get_domain("system"))
+    if not domain.queries:
+        return []
+    digest = domain.get_graph_digest()
+    if domain.data.get("graph_digest") == digest:
+        return []
+    domain.data["graph_digest"] = digest
+    return list(domain.queries)
+
+
+def save_query_cache(app: Sphinx, exc):
+    if not exc:
+        domain = cast(SystemDomain, app.env.get_domain("system"))
+        cache = domain.caches.get("queries")
+        if cache is not None:
+            cache.save()
+
+
+def setup(app: Sphinx) -> Dict[str, Any]:
+    app.add_builder(ProbsSystemRDFBuilder)
+    # Add config for jupyter-book / myst_nb.
+    # See https://jupyterbook.org/advanced/advanced.html#enabling-a-custom-builder
+    # -using-jupyter-book
+    #
+    # Older version -- kept for compatibility with myst-nb<0.14 for now
+    if (
+        "nb_render_priority" in app.config
+        and app.config["nb_render_priority"] != "--unset--"
+    ):
+        app.config["nb_render_priority"]["probs_rdf"] = NB_RENDER_PRIORITY["probs_rdf"]
+    elif "nb_mime_priority_overrides" in app.config:
+        app.config["nb_mime_priority_overrides"] = NB_RENDER_PRIORITY_NEW
+    else:
+        app.add_config_value("nb_render_priority", NB_RENDER_PRIORITY, "probs_rdf")
+        app.add_config_value(
+            "nb_mime_priority_overrides", NB_RENDER_PRIORITY_NEW, "env"
+        )
+
+    app.add_domain(SystemDomain)
+
+    app.add_directive("start-sub-processes", StartSubProcessesDirective)
+    app.add_directive("start-sub-objects", StartSubObjectsDirective)
+    app.add_directive("end-sub-processes", EndSubProcessesDirective)
+    app.add_directive("end-sub-objects", EndSubObjectsDirective)
+    app.add_directive("ttl", TTL)
+    app.add_directive("object-equivalent-to", ObjectEquivalentTo)
+    app.add_directive_to_domain("system", "search", SearchWidget)
+
+    app.add_post_transform(ProbsTransform)
+    app.add_node(probs_table, html=(visit_probs_table_html, None))
+    app.add_node(probs_diagram, html=(visit_probs_diagram_html, None))
+
+    # Since the graph is built when parsing, any change should trigger a rebuild
+    app.add_config_value("probs_rdf_system_prefix", "", "env", [str])
+    app.add_config_value("probs_rdf_extra_prefixes", {}, "env", [dict])
+    app.add_config_value("probs_rdf_units", {}, "env", [dict])
+    app.add_config_value("probs_rdf_paths", [], "env", [list])
+    app.add_config_value("probs_rdf_lean", False, "env", [bool])
+    app.add_config_value("probs_rdf_output_format", "turtle", "", [str])
+    app.add_config_value("probs_rdf_show_ancestry", False, "html", [bool])
+    app.add_config_value("probs_rdf_aggregate_recipes", False, "html", [bool])
+    app.add_config_value("probs_rdf_process_diagrams", False, "html", [bool])
+    app.add_config_value("probs_rdf_search_index", False, "html", [bool])
+    app.add_config_value("probs_rdf_index_page_size", 0, "html", [int])
+    app.add_config_value("probs_rdf_materialize_equivalence", None, "", [str])
+    app.add_config_value("probs_rdf_store", "memory", "env", [str])
+    app.add_config_value("probs_rdf_store_path", None, "env", [str])
+    app.add_config_value(
+        "probs_rdf_check_references", ["processes", "duplicates"], "", [list]
+    )
+    app.add_config_value("probs_rdf_query_time_budget", 1.0, "", [float, int])
+    app.add_config_value("probs_rdf_background_export", True, "", [bool])
+    app.add_config_value("probs_rdf_binary_output", False, "", [bool])
+    app.add_config_value("probs_rdf_sqlite_output", False, "", [bool])
+    app.add_config_value("probs_rdf_jsonld_output", False, "", [bool])
+    app.add_config_value("probs_rdf_stats", False, "", [bool])
+    app.add_config_value("probs_rdf_inventories", {}, "env", [dict])
+    app.add_config_value("probs_rdf_inventory_cache_limit", 5, "", [int])
+    app.add_config_value("probs_rdf_skip_notebook_outputs", False, "", [bool])
+    app.connect("config-inited", merge_default_config)
+
+    app.connect("env-before-read-docs", prepare_graph_store)
+    app.connect("doctree-read", commit_graph_store)
+    app.connect("doctree-read", note_notebook)
+    app.connect("env-get-outdated", outdated_notebooks)
+    app.connect("env-updated", clear_domain_caches, priority=400)
+    app.connect("env-updated", read_external_graph)
+    app.connect("env-updated", digest_graph, priority=600)
+    app.connect("env-updated", start_background_export, priority=900)
+    app.connect("env-check-consistency", check_references)
+    app.connect("env-check-consistency", freeze_for_parallel_write, priority=900)
+    app.connect("build-finished", save_graph)
+    app.connect("build-finished", save_query_cache)
+    app.connect("build-finished", write_search_index)
+    app.connect("build-finished", write_diagrams)
+    app.connect("build-finished", write_inventory)
+
+    # Add the custom CSS for the directives
+    app.connect("build-finished", copy_custom_files)
+    app.connect("build-finished", unfreeze)
+    app.connect("builder-inited", add_search_script)
+    app.connect("builder-inited", load_inventories)
+    # After myst-nb has set up its parser config
+    app.connect("builder-inited", configure_myst_nb, priority=600)
+    app.connect("html-collect-pages", index_pages)
+    app.add_css_file("system-definitions.css")
+
+    return {
+        "version": __version__,
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
@@ -0,0 +1,78 @@
+"""Parsing of the external RDF files listed in `probs_rdf_paths`.
+
+Turtle parsing is slow, so when Sphinx is run with several processes (``-j``)
+the files are parsed in a process pool. Each file is sent back to the main
+process in a compact form -- its distinct terms, and the triples as a flat
+array of indices into them -- which is smaller and faster to pickle than
+the triples themselves, and then added to the graph in the original order.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+
+class ParsedFile(NamedTuple):
+    identifier: str  # context identifier, as used by ConjunctiveGraph.parse
+    bindings: List[Tuple[str, str]]  # prefixes declared in the file, in order
+    terms: list
+    triples: array  # three indices into `terms` per triple
+
+
+def parse_file(location: str) -> ParsedFile:
+    """Parse a Turtle file into compact form."""
+    from rdflib import Graph  # type: ignore
+    from rdflib.parser import create_input_source  # type: ignore
+
+    source = create_input_source(location=location, format="ttl")
+    g = Graph(bind_namespaces="none")
+    g.parse(source, format="ttl")
+
+    ids: Dict = {}
+    terms: list = []
+    triples = array("q")
+    for triple in g:
+        for term in triple:
+            i = ids.get(term)
+            if i is None:
+                i = ids[term] = len(terms)
+                terms.append(term)
+            triples.append(i)
+
+    bindings = [(prefix, str(ns)) for prefix, ns in g.namespaces()]
+    identifier = source.getPublicId() or location
+    return ParsedFile(identifier, bindings, terms, triples)
+
+
+def add_parsed_file(graph, parsed: ParsedFile):
+    """Add a parsed file to `graph`, replacing any previous version of it.
+
+    This has the same effect as ``graph.parse(location, format="ttl")``.
+    """
+    from rdflib import Graph, URIRef  # type: ignore
+
+    context = Graph(store=graph.store, identifier=URIRef(parsed.identifier))
+    context.remove((None, None, None))
+    terms, triples = parsed.terms, parsed.triples
+    context.addN(
+        (terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]], context)
+        for i in range(0, len(triples), 3)
+    )
+    for prefix, ns in parsed.bindings:
+        context.bind(prefix, ns)
+
+
+def parse_files(locations: Sequence[str], nproc: int = 1) -> Iterator[ParsedFile]:
+    """Parse files, using up to `nproc` processes. Results are in order."""
+    from sphinx.util.parallel import parallel_available
+
+    if nproc <= 1 or len(locations) <= 1 or not parallel_available:
+        for location in locations:
+            yield parse_file(location)
+        return
+
+    # Fork like Sphinx's own parallel reading and writing
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(min(nproc, len(locations)), mp_context=context) as pool:
+        yield from pool.map(parse_file, locations)
@@ -0,0 +1,185 @@
+"""Precomputed transitive closure of process and object hierarchies."""
+
+from collections import defaultdict, deque
+from typing import Dict, FrozenSet, Generic, Hashable, Iterable, List, Tuple, TypeVar
+
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+# Nodes are sorted by their string form, which for URIs is their usual order
+T = TypeVar("T", bound=Hashable)
+
+EMPTY: FrozenSet = frozenset()
+
+
+class Hierarchy(Generic[T]):
+    """Index of a composition hierarchy, given as (parent, child) edges.
+
+    Ancestor and descendant sets are computed once, in topological order, so
+    that looking them up afterwards does not need any graph walks. Memory use
+    is proportional to the number of nodes times the depth of the hierarchy,
+    so they are only computed when first needed.
+    """
+
+    def __init__(self, edges: Iterable[Tuple[T, T]]):
+        self._parents: Dict[T, List[T]] = defaultdict(list)
+        self._children: Dict[T, List[T]] = defaultdict(list)
+        seen = set()
+        for parent, child in edges:
+            if (parent, child) not in seen:
+                seen.add((parent, child))
+                self._children[parent].append(child)
+                self._parents[child].append(parent)
+        for items in self._parents.values():
+            items.sort(key=str)
+        for items in self._children.values():
+            items.sort(key=str)
+
+        self.nodes = frozenset(self._parents) | frozenset(self._children)
+        # parents before children, excluding nodes in cycles
+        self.order, self._remaining = self._topological_order()
+        if self._remaining:
+            logger.warning(
+                "Cycle in composition hierarchy involving %s",
+                ", ".join(str(node) for node in self._remaining[:5]),
+            )
+        self._ancestors: Dict[T, FrozenSet[T]] = {}
+        self._descendants: Dict[T, FrozenSet[T]] = {}
+        self._computed = False
+
+    def _topological_order(self) -> Tuple[List[T], List[T]]:
+        """Return nodes with parents before children, and any nodes in cycles."""
+        in_degree = {node: len(self._parents.get(node, ())) for node in self.nodes}
+        roots = sorted((node for node, n in in_degree.items() if n == 0), key=str)
+        queue = deque(roots)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for child in self._children.get(node, ()):
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+        remaining = sorted((node for node, n in in_degree.items() if n > 0), key=str)
+        return order, remaining
+
+    def _compute(self):
+        if self._computed:
+            return
+        self._computed = True
+        order, remaining = self.order, self._remaining
+
+        for node in order:
+            ancestors = set()
+            for parent in self._parents.get(node, ()):
+                ancestors.add(parent)
+                ancestors |= self._ancestors[parent]
+            self._ancestors[node] = frozenset(ancestors) if ancestors else EMPTY
+
+        for node in reversed(order):
+            descendants = set()
+            for child in self._children.get(node, ()):
+                descendants.add(child)
+                descendants |= self._descendants.get(child, EMPTY)
+            self._descendants[node] = frozenset(descendants) if descendants else EMPTY
+
+        if remaining:
+            # Fall back to searching the graph for nodes in or below cycles
+            for node in remaining:
+                self._ancestors[node] = self._search(node, self._parents)
+            for node in self.nodes:
+                if node in remaining or any(
+                    d in remaining for d in self._descendants.get(node, ())
+                ):
+                    self._descendants[node] = self._search(node, self._children)
+
+    @staticmethod
+    def _search(node: T, edges: Dict[T, List[T]]) -> FrozenSet[T]:
+        found = set()
+        queue = deque(edges.get(node, ()))
+        while queue:
+            item = queue.popleft()
+            if item not in found:
+                found.add(item)
+                queue.extend(edges.get(item, ()))
+        found.discard(node)
+        return frozenset(found)
+
+    def parents(self, node: T) -> List[T]:
+        """Direct parents of `node`, sorted."""
+        return list(self._parents.get(node, ()))
+
+    def children(self, node: T) -> List[T]:
+        """Direct children of `node`, sorted."""
+        return list(self._children.get(node, ()))
+
+    def ancestors(self, node: T) -> FrozenSet[T]:
+        """All ancestors of `node`."""
+        self._compute()
+        return self._ancestors.get(node, EMPTY)
+
+    def descendants(self, node: T) -> FrozenSet[T]:
+        """All descendants of `node`."""
+        self._compute()
+        return self._descendants.get(node, EMPTY)
+
+    def count_descendants(self, node: T) -> int:
+        return len(self.descendants(node))
+
+    def is_ancestor(self, ancestor: T, node: T) -> bool:
+        return ancestor in self.ancestors(node)
+
+    def roots(self) -> List[T]:
+        """Nodes with children but no parents, sorted."""
+        return sorted(
+            (node for node in self._children if node not in self._parents), key=str
+        )
+
+    def breadcrumb(self, node: T) -> List[T]:
+        """A path of ancestors from a root down to the parent of `node`.
+
+        Where there are several parents, the first (in sorted order) is
+        followed.
+        """
+        path: List[T] = []
+        seen = {node}
+        current = node
+        while self._parents.get(current):
+            current = self._parents[current][0]
+            if current in seen:
+                break
+            seen.add(current)
+            path.append(current)
+        path.reverse()
+        return path
+
+
+COMPOSITION_RELATIONS = {
+    # thing type -> (composed of, composed of children of)
+    "process": ("processComposedOf", "processComposedOfChildrenOf"),
+    "object": ("objectComposedOf", "objectComposedOfChildrenOf"),
+}
+
+
+def composition_edges(graph, thing_type: str) -> List[tuple]:
+    """List (parent, child) composition edges for "process" or "object".
+
+    "Composed of children of" relations are expanded, as they are when
+    postprocessing the graph.
+    """
+    from .namespaces import PROBS
+
+    composed_of, children_of = COMPOSITION_RELATIONS[thing_type]
+    edges = list(graph.subject_objects(PROBS[composed_of]))
+    direct = defaultdict(list)
+    for parent, child in edges:
+        direct[parent].append(child)
+    for parent, source in graph.subject_objects(PROBS[children_of]):
+        edges.extend((parent, child) for child in direct.get(source, ()))
+    return edges
+
+
+def build_hierarchy(graph, thing_type: str) -> Hierarchy:
+    """Build the composition hierarchy of "process" or "object" from `graph`."""
+    return Hierarchy(composition_edges(graph, thing_type))
@@ -0,0 +1,217 @@
+"""Inventories of system things, for references between projects.
+
+HTML builds write `probs_rdf.inv` alongside Sphinx's `objects.inv`: the URI,
+type, label, document and anchor of each process and object defined in the
+project, compressed with zlib. Other projects list it in
+`probs_rdf_inventories`, much like `intersphinx_mapping`::
+
+    probs_rdf_inventories = {
+        "energy": ("https://example.org/energy-model/", None),
+    }
+
+The value is the base URL of the other project's HTML output, and the
+location of its inventory if not ``<base URL>/probs_rdf.inv`` (a URL or a
+path relative to the configuration directory). References to things which
+are not defined in this project are then resolved to links into the other
+projects, and such things are not reported as undefined -- without parsing
+the other projects' graphs.
+
+Inventories are kept in the environment: local files are read again when
+they change, and remote ones once they are older than
+`probs_rdf_inventory_cache_limit` days.
+"""
+
+import os
+import posixpath
+import time
+import zlib
+from typing import IO, Dict, NamedTuple, cast
+
+from sphinx.util import logging
+
+from .directives import SystemDomain
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_FILENAME = "probs_rdf.inv"
+INVENTORY_HEADER = b"# PRObs RDF inventory version 1\n"
+
+FETCH_TIMEOUT = 30  # seconds
+
+
+class InventoryEntry(NamedTuple):
+    thing_type: str
+    label: str
+    docname: str
+    anchor: str
+    location: str  # relative to the project's base URL, including the anchor
+
+
+class ExternalThing(NamedTuple):
+    """A thing defined in another project."""
+
+    project: str
+    thing_type: str
+    label: str
+    url: str
+
+
+def dump_inventory(f: IO[bytes], entries: Dict[str, InventoryEntry], project: str):
+    """Write `entries` (by URI) to binary file `f`."""
+    f.write(INVENTORY_HEADER)
+    f.write(("# Project: %s\n" % project).encode("utf-8"))
+    f.write(b"# The remainder of this file is compressed using zlib.\n")
+    compressor = zlib.compressobj(9)
+    for uri in sorted(entries):
+        entry = entries[uri]
+        label = " ".join(entry.label.split())
+        line = "\t".join(
+            [uri, entry.thing_type, entry.docname, entry.anchor, entry.location, label]
+        )
+        f.write(compressor.compress((line + "\n").encode("utf-8")))
+    f.write(compressor.flush())
+
+
+def parse_inventory(data: bytes) -> Dict[str, InventoryEntry]:
+    """Read the entries of an inventory, by URI."""
+    if not data.startswith(INVENTORY_HEADER):
+        raise ValueError("not a probs_rdf inventory")
+    # Skip the remaining header lines
+    start = 0
+    for _ in range(3):
+        start = data.index(b"\n", start) + 1
+    entries = {}
+    for line in zlib.decompress(data[start:]).decode("utf-8").splitlines():
+        uri, thing_type, docname, anchor, location, label = line.split("\t", 5)
+        entries[uri] = InventoryEntry(thing_type, label, docname, anchor, location)
+    return entries
+
+
+def write_inventory(app, exc):
+    """Write the inventory of this project's things, for HTML builders."""
+    if exc or app.builder.format != "html":
+        return
+    builder = app.builder
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    entries = {
+        uri: InventoryEntry(
+            thing.thing_type,
+            thing.label,
+            thing.docname,
+            thing.node_id,
+            builder.get_target_uri(thing.docname) + "#" + thing.node_id,
+        )
+        for uri, thing in domain.things.items()
+    }
+    with open(os.path.join(builder.outdir, INVENTORY_FILENAME), "wb") as f:
+        dump_inventory(f, entries, app.config.project)
+
+
+def _is_url(location: str) -> bool:
+    return "://" in location
+
+
+def _fetch(app, location: str) -> bytes:
+    if _is_url(location):
+        from sphinx.util import requests
+
+        config = app.config
+        response = requests.get(
+            location,
+            timeout=FETCH_TIMEOUT,
+            _user_agent=config.user_agent,
+            _tls_info=(config.tls_verify, config.tls_cacerts),
+        )
+        response.raise_for_status()
+        return response.content
+    with open(location, "rb") as f:
+        return f.read()
+
+
+def load_inventories(app):
+    """Load the inventories in `probs_rdf_inventories`, unless cached.
+
+    The cache maps each project name to (base URL, inventory location, cache
+    key, entries), where the key is the file's modification time for local
+    files and the time it was fetched for remote ones.
+    """
+    config = app.config
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    cache = domain.inventory_cache
+    for name in list(cache):
+        if name not in config.probs_rdf_inventories:
+            del cache[name]
+
+    now = time.time()
+    max_age = config.probs_rdf_inventory_cache_limit * 86400
+    for name, (base_url, location) in config.probs_rdf_inventories.items():
+        if location is None:
+            location = posixpath.join(base_url, INVENTORY_FILENAME)
+        if not _is_url(location):
+            location = os.path.join(app.confdir, location)
+        cached = cache.get(name)
+        try:
+            if _is_url(location):
+                key = now
+                if (
+                    cached is not None
+                    and cached[:2] == (base_url, location)
+                    and (max_age < 0 or now - cached[2] < max_age)
+                ):
+                    continue
+            else:
+                key = os.stat(location).st_mtime
+                if cached is not None and cached[:3] == (base_url, location, key):
+                    continue
+            entries = parse_inventory(_fetch(app, location))
+        except Exception as exc:
+            logger.warning(
+                "failed to read system inventory %r from %s: %s", name, location, exc
+            )
+            continue  # keep any older version
+        cache[name] = (base_url, location, key, entries)
+        logger.info("loaded system inventory %r (%d things)", name, len(entries))
+    domain.caches.pop("inventory", None)
+
+
+def external_things(domain: SystemDomain) -> Dict[str, ExternalThing]:
+    """Things defined in other projects, by URI, from the cached inventories.
+
+    Where several projects define a thing, the first in
+    `probs_rdf_inventories` is used.
+    """
+    result: Dict[str, ExternalThing] = {}
+    names = list(domain.env.config.probs_rdf_inventories)
+    for name in reversed(names):
+        cached = domain.inventory_cache.get(name)
+        if cached is None:
+            continue
+        base_url, _, _, entries = cached
+        base_url = base_url.rstrip("/") + "/"
+        for uri, entry in entries.items():
+            result[uri] = ExternalThing(
+                name, entry.thing_type, entry.label, base_url + entry.location
+            )
+    return result
+
+
+def find_external(domain: SystemDomain, name: str, thing_types=None):
+    """Find things in other projects, as `SystemDomain.find_thing` does.
+
+    A thing whose URI is `name` is preferred; otherwise all those whose URI
+    ends with `name` are found. Returns a list of (uri, external thing)
+    tuples.
+    """
+
+    def wanted(thing: ExternalThing) -> bool:
+        return thing_types is None or thing.thing_type in thing_types
+
+    things = domain.get_external_things()
+    thing = things.get(name)
+    if thing is not None and wanted(thing):
+        return [(name, thing)]
+    return [
+        (uri, thing)
+        for uri, thing in things.items()
+        if uri.endswith(name) and wanted(thing)
+    ]
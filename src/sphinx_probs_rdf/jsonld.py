@@ -0,0 +1,180 @@
+"""Streaming JSON-LD output of the system graph.
+
+With ``probs_rdf_jsonld_output = True``, the graph is also written as
+`output.jsonld`: one JSON-LD document with a fixed compact context (the
+``probs``, ``rec`` and system prefixes, those in `probs_rdf_extra_prefixes`,
+and a few standard ones), and one node object per subject in ``@graph``,
+on a line of its own.
+
+rdflib's JSON-LD serializer builds the whole document in memory first. Here
+subjects are visited in sorted order, and each node is written as soon as
+its triples have been looked up, so memory use is bounded by the list of
+subjects rather than by the size of the output. Blank nodes which are the
+object of a single triple (such as recipes and their items) are nested in
+the node referring to them; other blank nodes get nodes of their own.
+"""
+
+import json
+import math
+from typing import IO, Dict, List, Set, Tuple
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+JSONLD_FILENAME = "output.jsonld"
+
+STANDARD_PREFIXES = {
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "skos": "http://www.w3.org/2004/02/skos/core#",
+    "xsd": XSD,
+    "quantitykind": "http://qudt.org/vocab/quantitykind/",
+}
+
+
+def _boolean(value: str) -> bool:
+    # The lexical forms of xsd:boolean
+    if value in ("true", "1"):
+        return True
+    elif value in ("false", "0"):
+        return False
+    raise ValueError(value)
+
+
+# Literals of these types are written as plain JSON values
+NATIVE_TYPES = {
+    XSD + "string": str,
+    XSD + "integer": int,
+    XSD + "boolean": _boolean,
+}
+
+
+def jsonld_context(config) -> Dict[str, str]:
+    """The compact context used for the system graph."""
+    from .namespaces import PROBS, PROBS_RDF, PROBS_RECIPE
+
+    context = dict(STANDARD_PREFIXES)
+    context.update({
+        "probs": str(PROBS),
+        "rec": str(PROBS_RECIPE),
+        "probs_rdf": str(PROBS_RDF),
+    })
+    if config.probs_rdf_system_prefix:
+        context["sys"] = config.probs_rdf_system_prefix
+    for prefix, uri in config.probs_rdf_extra_prefixes.items():
+        context[prefix] = str(uri)
+    return context
+
+
+class _Compactor:
+    def __init__(self, context: Dict[str, str]):
+        # Longest namespaces first, so the most specific prefix is used
+        self.namespaces: List[Tuple[str, str]] = sorted(
+            ((ns, prefix) for prefix, ns in context.items()),
+            key=lambda item: -len(item[0]),
+        )
+        self._cache: Dict[str, str] = {}
+
+    def iri(self, uri: str) -> str:
+        result = self._cache.get(uri)
+        if result is None:
+            result = uri
+            for ns, prefix in self.namespaces:
+                if uri.startswith(ns):
+                    local = uri[len(ns):]
+                    # Otherwise the compact IRI would be read as an absolute IRI
+                    if not local.startswith("//"):
+                        result = prefix + ":" + local
+                    break
+            if len(self._cache) < 100_000:
+                self._cache[uri] = result
+        return result
+
+    def literal(self, term):
+        value = str(term)
+        if term.language:
+            return {"@value": value, "@language": term.language}
+        datatype = str(term.datatype) if term.datatype is not None else XSD + "string"
+        native = NATIVE_TYPES.get(datatype)
+        if native is not None:
+            try:
+                return native(value)
+            except ValueError:
+                pass  # ill-typed, keep the lexical form
+        elif datatype == XSD + "double":
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            # NaN and infinities can't be written as JSON numbers
+            if math.isfinite(number):
+                return {"@value": number, "@type": self.iri(datatype)}
+        return {"@value": value, "@type": self.iri(datatype)}
+
+
+def write_jsonld(graph, f: IO[str], context: Dict[str, str]):
+    """Write `graph` to text file `f` as JSON-LD, one subject at a time."""
+    from rdflib import BNode, Literal, URIRef  # type: ignore
+
+    compact = _Compactor(context)
+
+    # Blank nodes referred to exactly once are nested where they are used
+    references: Dict[BNode, int] = {}
+    for o in graph.objects():
+        if isinstance(o, BNode):
+            references[o] = references.get(o, 0) + 1
+    nested: Set[BNode] = {node for node, count in references.items() if count == 1}
+    del references
+    written: Set[BNode] = set()
+
+    def node_id(term) -> str:
+        if isinstance(term, BNode):
+            return "_:" + str(term)
+        return compact.iri(str(term))
+
+    def node(subject) -> dict:
+        result: Dict[str, object] = {"@id": node_id(subject)}
+        properties: Dict[str, list] = {}
+        types: List[str] = []
+        for p, o in sorted(set(graph.predicate_objects(subject))):
+            if str(p) == RDF_TYPE and isinstance(o, URIRef):
+                types.append(compact.iri(str(o)))
+                continue
+            if isinstance(o, Literal):
+                value = compact.literal(o)
+            elif isinstance(o, BNode) and o in nested and o not in written:
+                written.add(o)
+                value = node(o)
+                del value["@id"]
+            else:
+                value = {"@id": node_id(o)}
+            properties.setdefault(compact.iri(str(p)), []).append(value)
+        if types:
+            result["@type"] = types[0] if len(types) == 1 else types
+        for key, values in properties.items():
+            result[key] = values[0] if len(values) == 1 else values
+        return result
+
+    f.write('{"@context": ')
+    json.dump(context, f, ensure_ascii=False, allow_nan=False)
+    f.write(',\n "@graph": [')
+    first = True
+
+    def write_node(subject):
+        nonlocal first
+        f.write("\n  " if first else ",\n  ")
+        first = False
+        json.dump(node(subject), f, ensure_ascii=False, allow_nan=False)
+
+    subjects = sorted(
+        set(graph.subjects()), key=lambda s: (isinstance(s, BNode), str(s))
+    )
+    for subject in subjects:
+        if subject not in nested:
+            write_node(subject)
+    # Blank nodes only referred to from a cycle of other blank nodes
+    for subject in subjects:
+        if subject in nested and subject not in written:
+            written.add(subject)
+            write_node(subject)
+    f.write("\n]}\n")
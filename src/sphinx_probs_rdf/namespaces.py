@@ -0,0 +1,15 @@
+"""RDF namespaces used in the system graph.
+
+This imports rdflib, so it is only imported when RDF is actually needed.
+"""
+
+from rdflib import Namespace  # type: ignore
+
+PROBS = Namespace("http://w3id.org/probs-lab/ontology#")
+PROBS_RECIPE = Namespace("http://w3id.org/probs-lab/process-recipe#")
+QUANTITYKIND = Namespace("http://qudt.org/vocab/quantitykind/")
+
+# Terms added by this extension which have no PRObs equivalent (such as the
+# link to aggregate recipes). The extension has no domain of its own, so a URN
+# is used rather than a URL which might one day be dereferenced.
+PROBS_RDF = Namespace("urn:x-sphinx-probs-rdf:")
@@ -0,0 +1,104 @@
+"""Reading notebooks for the ``probs_rdf`` builder without running them.
+
+The ``probs_rdf`` builder only needs the system directives in notebooks'
+markdown cells, but myst-nb executes notebooks and renders their outputs
+whatever the builder. With ``probs_rdf_skip_notebook_outputs = True``, the
+``probs_rdf`` builder tells myst-nb (0.14 or later) not to execute notebooks
+and to leave out code outputs, so only markdown is parsed. Notebooks which
+define things in their outputs (e.g. with code printing directives as
+markdown) need this to be off.
+
+Notebooks read this way are also noted with a digest of their contents:
+
+- in later ``probs_rdf`` builds, notebooks whose modification time has
+  changed but whose contents have not (as after switching branches and
+  back) are not read again;
+- other builders sharing the environment read them again in full, since
+  their doctrees lack the outputs.
+"""
+
+import dataclasses
+import hashlib
+from typing import cast
+
+from sphinx.environment import CONFIG_OK
+from sphinx.errors import FiletypeNotFoundError
+from sphinx.util import get_filetype
+
+from .builder import ProbsSystemRDFBuilder
+from .directives import SystemDomain
+
+# myst-nb parser settings (NbParserConfig fields) for reading notebooks
+# without executing them or rendering outputs
+SKIP_OUTPUTS_SETTINGS = {
+    "execution_mode": "off",
+    "remove_code_outputs": True,
+}
+
+
+def _skipping_outputs(app) -> bool:
+    return app.config.probs_rdf_skip_notebook_outputs and isinstance(
+        app.builder, ProbsSystemRDFBuilder
+    )
+
+
+def _is_notebook(app, filename: str) -> bool:
+    try:
+        return get_filetype(app.config.source_suffix, filename) == "myst-nb"
+    except FiletypeNotFoundError:
+        return False
+
+
+def _digest(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def configure_myst_nb(app):
+    """Turn off notebook execution and outputs, after myst-nb's own setup.
+
+    The parser settings are replaced rather than the ``nb_*`` config values,
+    so that the environment's config is unchanged.
+    """
+    if not _skipping_outputs(app):
+        return
+    config = getattr(app.env, "mystnb_config", None)
+    if config is None:
+        return  # myst-nb is not used (or is older than 0.14)
+    fields = {field.name for field in dataclasses.fields(config)}
+    app.env.mystnb_config = dataclasses.replace(
+        config,
+        **{key: value for key, value in SKIP_OUTPUTS_SETTINGS.items() if key in fields},
+    )
+
+
+def note_notebook(app, doctree):
+    """Note the digest of a notebook read without outputs."""
+    env = app.env
+    filename = env.doc2path(env.docname)
+    if _skipping_outputs(app) and _is_notebook(app, filename):
+        domain = cast(SystemDomain, env.get_domain("system"))
+        domain.notebook_digests[env.docname] = _digest(filename)
+
+
+def outdated_notebooks(app, env, added, changed, removed):
+    """Read notebooks again only if needed, see the module docstring."""
+    domain = cast(SystemDomain, env.get_domain("system"))
+    digests = domain.notebook_digests
+    if not digests:
+        return []
+    if not _skipping_outputs(app):
+        return list(digests)
+    if env.config_status != CONFIG_OK:
+        return []
+    for docname in sorted(changed):
+        digest = digests.get(docname)
+        if digest is None or env.dependencies.get(docname):
+            continue
+        try:
+            unchanged = _digest(env.doc2path(docname)) == digest
+        except OSError:
+            continue
+        if unchanged:
+            changed.discard(docname)
+    return []
@@ -1,17 +1,58 @@
 """Post-processing operations on the RDF graph."""
 
-from rdflib import Graph  # type: ignore
-from rdflib.namespace import RDF  # type: ignore
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
 
-from .directives import PROBS  # type: ignore
+from rdflib import ConjunctiveGraph, Graph  # type: ignore
+
+from .namespaces import PROBS
 
 from sphinx.util import logging
 logger = logging.getLogger(__name__)
 
 
-def postprocess(graph: Graph):
-    """Apply postprocessing steps to graph."""
+def postprocess(
+    graph: Graph,
+    equivalence: Optional[str] = None,
+    aggregates: Optional[Dict[str, List]] = None,
+):
+    """Apply postprocessing steps to graph.
+
+    :param equivalence: how to materialize classes of equivalent objects (see
+        `postprocess_object_equivalence`), or None to leave them as given.
+    :param aggregates: aggregate recipes of parent processes to add (see
+        `aggregate.aggregate_recipes`), or None.
+    """
     postprocess_composed_of_children(graph)
+    if equivalence:
+        postprocess_object_equivalence(graph, equivalence)
+    if aggregates:
+        from .aggregate import add_aggregate_recipes
+
+        add_aggregate_recipes(graph, aggregates)
+
+
+@contextmanager
+def postprocessed(graph: ConjunctiveGraph, **kwargs) -> Iterator[ConjunctiveGraph]:
+    """Apply postprocessing to `graph` only for the duration of the context.
+
+    This lets the domain's graph be kept for later incremental builds.
+    Postprocessing steps add triples to the default context, which is cleared
+    afterwards, and the only triples they remove (unexpanded
+    probs:processComposedOfChildrenOf relations) are restored.
+    """
+    pattern = (None, PROBS.processComposedOfChildrenOf, None)
+    removed = [
+        (s, p, o, context)
+        for s, p, o, context in graph.quads(pattern)
+        if context is not None
+    ]
+    postprocess(graph, **kwargs)
+    try:
+        yield graph
+    finally:
+        graph.default_context.remove((None, None, None))
+        graph.addN(removed)
 
 
 def postprocess_composed_of_children(graph: Graph):
@@ -21,10 +62,39 @@ def postprocess_composed_of_children(graph: Graph):
     # which would need to be sorted into a tree and expanded from the branches
     # backwards.
 
+    # Missing sources are reported by the reference checks in validate.py
     for p, _, source in graph.triples((None, PROBS.processComposedOfChildrenOf, None)):
-        if (source, RDF.type, PROBS.Process) not in graph:
-            logger.error('Requested child "%s" of "%s" is not a Process', source, p)
-
         for child in graph.objects(source, PROBS.processComposedOf):
             graph.add((p, PROBS.processComposedOf, child))
         graph.remove((p, PROBS.processComposedOfChildrenOf, source))
+
+
+# Values of `probs_rdf_materialize_equivalence`, besides None
+EQUIVALENCE_MODES = ("closure", "representative")
+
+
+def postprocess_object_equivalence(graph: Graph, mode: str = "closure"):
+    """Materialize classes of probs:objectEquivalentTo relations.
+
+    The classes are found using union-find, in near-linear time. With mode
+    "closure", every pair of objects in a class is related in both directions
+    (the number of triples grows quadratically with the size of the class).
+    With mode "representative", every object is related in both directions
+    to its class's representative (the first member in sorted order).
+    """
+    from .equivalence import build_equivalence
+
+    if mode not in EQUIVALENCE_MODES:
+        raise ValueError("Unknown object equivalence mode %r" % mode)
+
+    classes = build_equivalence(graph)
+    for members in classes.classes:
+        if mode == "closure":
+            targets = members
+        else:
+            targets = members[:1]
+        for a in members:
+            for b in targets:
+                if a != b:
+                    graph.add((a, PROBS.objectEquivalentTo, b))
+                    graph.add((b, PROBS.objectEquivalentTo, a))
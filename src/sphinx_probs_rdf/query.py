@@ -0,0 +1,128 @@
+"""Evaluation of ``system:query`` directives, with cached results.
+
+Results are cached in the doctree directory, keyed by the query text and a
+digest of the graph's content, so that documents which are written again
+without the graph having changed do not need their queries evaluated again.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILENAME = "probs_rdf_queries.pickle"
+
+
+class QueryResult(NamedTuple):
+    variables: List[str]
+    rows: List[tuple]
+    error: Optional[str]
+    elapsed: float  # seconds taken to evaluate the query
+
+
+# Rounds of refinement of the labels given to blank nodes by context_digest
+BNODE_ROUNDS = 3
+
+
+def _digest(data: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def context_digest(context) -> int:
+    """Order-independent digest of the triples in a graph context.
+
+    Blank nodes get new identifiers each time a document is read, so they are
+    labelled by the triples they appear in instead (like a few rounds of the
+    Weisfeiler-Lehman colour refinement), to keep the digest stable.
+    """
+    from rdflib import BNode  # type: ignore
+
+    triples = [
+        tuple(term if isinstance(term, BNode) else term.n3() for term in triple)
+        for triple in context.triples((None, None, None))
+    ]
+    labels: Dict = {}
+
+    def label(term):
+        return labels.get(term, "_:") if isinstance(term, BNode) else term
+
+    for _ in range(BNODE_ROUNDS):
+        edges: Dict = {}
+        for s, p, o in triples:
+            if isinstance(s, BNode):
+                edges.setdefault(s, []).append("> %s %s" % (p, label(o)))
+            if isinstance(o, BNode):
+                edges.setdefault(o, []).append("< %s %s" % (label(s), p))
+        if not edges:
+            break
+        labels = {
+            bnode: "_:%x" % _digest("\n".join(sorted(items)))
+            for bnode, items in edges.items()
+        }
+
+    total = 0
+    for triple in triples:
+        data = " ".join(label(term) for term in triple)
+        total = (total + _digest(data)) % (1 << 64)
+    return total
+
+
+def combine_digests(digests: Dict[str, int]) -> str:
+    """Digest of a whole graph, from the digests of its contexts."""
+    h = hashlib.sha1()
+    for identifier in sorted(digests):
+        h.update(("%s %d\n" % (identifier, digests[identifier])).encode("utf-8"))
+    return h.hexdigest()
+
+
+def evaluate(graph, query: str) -> QueryResult:
+    """Evaluate a SPARQL SELECT query on `graph`."""
+    start = time.perf_counter()
+    try:
+        result = graph.query(query)
+        if result.type != "SELECT":
+            raise ValueError("only SELECT queries are supported")
+        variables = [str(v) for v in result.vars]
+        rows = [tuple(row) for row in result]
+    except Exception as exc:
+        return QueryResult([], [], str(exc), time.perf_counter() - start)
+    return QueryResult(variables, rows, None, time.perf_counter() - start)
+
+
+class QueryCache:
+    """Query results, keyed by query text and graph digest, kept on disk."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.results: Dict[Tuple[str, str], QueryResult] = {}
+        self.digest: Optional[str] = None
+        try:
+            with open(filename, "rb") as f:
+                self.results = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logger.debug("Could not load query cache %s: %s", filename, exc)
+
+    def get(self, graph, query: str, digest: str) -> Tuple[QueryResult, bool]:
+        """Return the result of `query`, and whether it was evaluated now."""
+        self.digest = digest
+        key = (query, digest)
+        if key in self.results:
+            return self.results[key], False
+        result = self.results[key] = evaluate(graph, query)
+        return result, True
+
+    def save(self):
+        # Results for other versions of the graph can't be used again
+        results = {k: v for k, v in self.results.items() if k[1] == self.digest}
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename, "wb") as f:
+            pickle.dump(results, f, pickle.HIGHEST_PROTOCOL)
@@ -1,18 +1,28 @@
+from html import escape
+import os
 from typing import cast
 from docutils import nodes
 from sphinx.transforms.post_transforms import SphinxPostTransform
 from sphinx import addnodes
+from sphinx.builders.singlehtml import SingleFileHTMLBuilder
+from sphinx.util import logging
+from sphinx.util.osutil import relative_uri
 
-from rdflib import URIRef, namespace
 from sphinx_probs_rdf.directives import (
     SystemDomain,
-    PROBS,
-    PROBS_RECIPE,
     rdf_reference,
+    probs_info,
     probs_process_info,
     probs_object_info,
+    probs_query,
+    probs_table,
+    probs_diagram,
 )
 
+from sphinx_probs_rdf.diagrams import diagram_spec
+
+logger = logging.getLogger(__name__)
+
 
 class ProbsTransform(SphinxPostTransform):
     """Transform to fill in details of PRObs objects."""
@@ -22,20 +32,61 @@ class ProbsTransform(SphinxPostTransform):
 
     def run(self, **kwargs):
         domain = cast(SystemDomain, self.env.get_domain("system"))
-        g = domain.graph
+        html = self.app.builder.format == "html"
+        # HTML builders render tables from compact probs_table nodes, except
+        # singlehtml: links in them are written directly, without Sphinx's
+        # rewriting of URIs into fragments of the single page
+        compact = html and not isinstance(self.app.builder, SingleFileHTMLBuilder)
+        # Diagrams used in this document (if any), by key, rendered at the
+        # end of the build
+        diagrams = None
+        if html and self.config.probs_rdf_process_diagrams:
+            diagrams = {}
+            domain.caches.setdefault("diagrams", {})[self.env.docname] = diagrams
+
+        if self.document.next_node(
+            lambda node: isinstance(node, (rdf_reference, probs_info, probs_query))
+        ) is None:
+            # Nothing to do; avoid creating the graph for documents (or
+            # projects) which don't use the system domain
+            return
+
+        view = domain.get_view()
+        show_ancestry = self.config.probs_rdf_show_ancestry
 
         for node in self.document.findall(rdf_reference):
-            ref = build_rdf_reference(g, node)
+            ref = build_rdf_reference(view, node)
             node.replace_self([ref])
 
         for node in self.document.findall(probs_process_info):
-            info = build_process_info(g, node)
+            hierarchy = domain.get_hierarchy("process") if show_ancestry else None
+            aggregate = None
+            if self.config.probs_rdf_aggregate_recipes:
+                aggregate = domain.get_aggregate_recipes().get(node["uri"])
+            info = build_process_info(
+                view, node, hierarchy, aggregate, compact, diagrams
+            )
             node.replace_self(info)
 
         for node in self.document.findall(probs_object_info):
-            info = build_object_info(g, node)
+            hierarchy = domain.get_hierarchy("object") if show_ancestry else None
+            info = build_object_info(
+                view,
+                node,
+                hierarchy,
+                domain.get_equivalence(),
+                domain.get_object_usage(node["uri"]),
+                compact,
+            )
             node.replace_self(info)
 
+        for node in self.document.findall(probs_query):
+            node.replace_self(self.run_query(domain, view, node, compact))
+
+        if compact:
+            for table in list(self.document.findall(probs_table)):
+                _pend_unresolved_links(domain, view, table)
+
         # for node in self.document.findall(addnodes.desc):
         #     if node["domain"] != "system":
         #         continue
@@ -61,10 +112,34 @@ class ProbsTransform(SphinxPostTransform):
         #     #     node["classes"] += ["toggle"]
         #     #     node.replace_self([nodes.admonition("", *node.children)])
 
-
-def build_rdf_reference(g, node):
-    uri = URIRef(node["target"])
-    n3 = uri.n3(g.namespace_manager)
+    def run_query(self, domain, view, node, compact=False):
+        from .query import CACHE_FILENAME, QueryCache
+
+        if "queries" not in domain.caches:
+            filename = os.path.join(self.env.doctreedir, CACHE_FILENAME)
+            domain.caches["queries"] = QueryCache(filename)
+        cache = domain.caches["queries"]
+        result, evaluated = cache.get(
+            domain.graph, node["query"], domain.get_graph_digest()
+        )
+
+        if result.error is not None:
+            logger.warning("SPARQL query failed: %s", result.error, location=node)
+            return []
+        budget = self.config.probs_rdf_query_time_budget
+        if evaluated and budget is not None and result.elapsed > budget:
+            logger.warning(
+                "SPARQL query took %.2fs (budget %.2fs)",
+                result.elapsed,
+                budget,
+                location=node,
+            )
+        return build_query_table(view, result, node["classes"], compact)
+
+
+def build_rdf_reference(view, node):
+    uri = node["target"]
+    n3 = view.n3(uri)
     contnodes = [
         addnodes.pending_xref_condition("", n3, condition="resolved"),
         addnodes.pending_xref_condition("", "[UNKNOWN!] " + n3, condition="*"),
@@ -81,152 +156,310 @@ def build_rdf_reference(g, node):
     )
     result += newnode
 
-    def preferredLabel(
-        subject,
-        lang=None,
-        default=None,
-        labelProperties=(namespace.SKOS.prefLabel, namespace.RDFS.label),
-    ):
-        """
-        Find the preferred label for subject.
-
-        By default prefers skos:prefLabels over rdfs:labels. In case at least
-        one prefLabel is found returns those, else returns labels. In case a
-        language string (e.g., "en", "de" or even "" for no lang-tagged
-        literals) is given, only such labels will be considered.
-
-        Return a list of (labelProp, label) pairs, where labelProp is either
-        skos:prefLabel or rdfs:label.
-
-        """
-
-        if default is None:
-            default = []
-
-        # setup the language filtering
-        if lang is not None:
-            if lang == "":  # we only want not language-tagged literals
-
-                def langfilter(l_):
-                    return l_.language is None
+    # skos:prefLabels if there are any, otherwise rdfs:labels
+    labels = view.labels(uri)
+    if labels:
+        result += nodes.Text(" (" + ", ".join(labels) + ")")
 
-            else:
+    return result
 
-                def langfilter(l_):
-                    return l_.language == lang
 
-        else:  # we don't care about language tags
+def build_query_table(view, result, classes=(), compact=False):
+    """Table of the results of a SPARQL query."""
+    from rdflib import URIRef  # type: ignore
 
-            def langfilter(l_):
-                return True
+    if not result.rows:
+        return nodes.paragraph("No results", "No results", classes=list(classes))
 
-        for labelProp in labelProperties:
-            labels = list(filter(langfilter, g.objects(subject, labelProp)))
-            if len(labels) == 0:
-                continue
-            else:
-                return [(labelProp, l_) for l_ in labels]
-        return default
+    def cell(term):
+        if term is None:
+            return ("text", "")
+        elif isinstance(term, URIRef):
+            return _link_cell(view, term)
+        return ("text", str(term))
 
-    labels = preferredLabel(uri)
-    if labels:
-        result += nodes.Text(" (" + ", ".join(label for _, label in labels) + ")")
+    header = ["?" + var for var in result.variables]
+    rows = [[cell(term) for term in row] for row in result.rows]
+    return _table(view, header, rows, classes, compact)
 
-    return result
 
+def build_process_info(
+    view, info_node, hierarchy=None, aggregate=None, compact=False, diagrams=None
+):
+    """Details of a process.
 
-def build_process_info(g, info_node):
+    If `diagrams` is given, a `probs_diagram` of the process is included and
+    its spec is added to `diagrams` by key, to be rendered later.
+    """
     uri = info_node["uri"]
     contentnode = nodes.container("")
 
-    recipe = g.value(uri, PROBS_RECIPE.hasRecipe)
-    if recipe:
-        consumes_data = [
-            {
-                "object": g.value(item, PROBS_RECIPE.object),
-                "amount": float(g.value(item, PROBS_RECIPE.quantity)),
-                "metric": g.value(item, PROBS_RECIPE.metric),
-            }
-            for item in g[recipe : PROBS_RECIPE.consumes :]
-        ]
-        produces_data = [
-            {
-                "object": g.value(item, PROBS_RECIPE.object),
-                "amount": float(g.value(item, PROBS_RECIPE.quantity)),
-                "metric": g.value(item, PROBS_RECIPE.metric),
-            }
-            for item in g[recipe : PROBS_RECIPE.produces :]
-        ]
+    if hierarchy is not None:
+        contentnode += _ancestry(view, hierarchy, uri)
+
+    recipe = view.recipe(uri)
+    if diagrams is not None:
+        contentnode += _diagram(view, uri, recipe, aggregate, diagrams)
+    if recipe is not None:
         contentnode += nodes.paragraph("Consumes: ", "Consumes: ")
-        contentnode += _recipe_table(g, consumes_data)
+        contentnode += _recipe_table(view, recipe["consumes"], compact=compact)
         contentnode += nodes.paragraph("Produces: ", "Produces: ")
-        contentnode += _recipe_table(g, produces_data)
+        contentnode += _recipe_table(view, recipe["produces"], compact=compact)
+    elif aggregate:
+        # Summed from the recipes of child processes
+        for direction, title in [
+            ("consumes", "Aggregate consumes: "),
+            ("produces", "Aggregate produces: "),
+        ]:
+            rows = [
+                {"object": e.object, "amount": e.amount, "metric": e.metric}
+                for e in aggregate
+                if e.direction == direction
+            ]
+            if rows:
+                contentnode += nodes.paragraph(title, title)
+                contentnode += _recipe_table(view, rows, compact=compact)
     else:
         # XXX TODO: show consumes and produces without recipe
         pass
 
-    parents = list(g[: PROBS.processComposedOf : uri])
-    if parents:
-        p = nodes.paragraph("", "Parents:")
-        for parent in parents:
-            p += nodes.Text(" ")
-            p += _system_id_link(g, parent)
-        contentnode += p
-
-    children = list(g[uri : PROBS.processComposedOf :])
-    if children:
-        p = nodes.paragraph("", "Children:")
-        for child in children:
-            p += nodes.Text(" ")
-            p += _system_id_link(g, child)
-        contentnode += p
-
+    contentnode += _composition(view, "process", uri)
     return contentnode
 
 
-def build_object_info(g, info_node):
+def _diagram(view, uri, recipe, aggregate, diagrams):
+    if recipe is None and aggregate:
+        recipe = {
+            direction: [
+                {"object": e.object, "amount": e.amount, "metric": e.metric}
+                for e in aggregate
+                if e.direction == direction
+            ]
+            for direction in ("consumes", "produces")
+        }
+    spec = diagram_spec(view, uri, recipe or {})
+    key = spec.key()
+    diagrams[key] = spec
+    return probs_diagram("", key=key, alt="Diagram of %s" % spec.label)
+
+
+def build_object_info(
+    view, info_node, hierarchy=None, equivalence=None, usage=None, compact=False
+):
     uri = info_node["uri"]
     contentnode = nodes.container("")
 
-    parents = list(g[: PROBS.objectComposedOf : uri])
-    if parents:
-        p = nodes.paragraph("", "Parents:")
-        for parent in parents:
-            p += nodes.Text(" ")
-            p += _system_id_link(g, parent)
-        contentnode += p
-
-    children = list(g[uri : PROBS.objectComposedOf :])
-    if children:
-        p = nodes.paragraph("", "Children:")
-        for child in children:
-            p += nodes.Text(" ")
-            p += _system_id_link(g, child)
-        contentnode += p
-
+    # Processes consuming and producing this object, from the domain's reverse
+    # index of process recipes: list of (process uri, recipe entry)
+    for direction, title in [
+        ("consumes", "Consumed by: "),
+        ("produces", "Produced by: "),
+    ]:
+        rows = [
+            _usage_row(process, entry)
+            for process, entry in usage or []
+            if entry.direction == direction
+        ]
+        if rows:
+            contentnode += nodes.paragraph(title, title)
+            contentnode += _recipe_table(view, rows, "Process", compact)
+
+    if hierarchy is not None:
+        contentnode += _ancestry(view, hierarchy, uri)
+
+    if equivalence is not None:
+        others = [item for item in equivalence.members(uri) if item != uri]
+        if others:
+            p = nodes.paragraph("", "Equivalent to:")
+            for other in others:
+                p += nodes.Text(" ")
+                p += _system_id_link(view, other)
+            contentnode += p
+
+    contentnode += _composition(view, "object", uri)
     return contentnode
 
 
-def _recipe_table(g, objects):
-    header_rows = [[nodes.literal("", "Object"), nodes.literal("", "Amount")]]
-    table_data = [
+def _composition(view, kind, uri):
+    """Paragraphs listing the direct parents and children of `uri`."""
+    result = []
+    for title, related in [
+        ("Parents:", view.parents(kind, uri)),
+        ("Children:", view.children(kind, uri)),
+    ]:
+        if related:
+            p = nodes.paragraph("", title)
+            for item in related:
+                p += nodes.Text(" ")
+                p += _system_id_link(view, item)
+            result.append(p)
+    return result
+
+
+def _ancestry(view, hierarchy, uri):
+    """Breadcrumb of ancestors, and count of all descendants, of `uri`."""
+    result = []
+    breadcrumb = hierarchy.breadcrumb(uri)
+    if breadcrumb:
+        p = nodes.paragraph("", "Ancestry:", classes=["system-ancestry"])
+        for i, ancestor in enumerate(breadcrumb):
+            p += nodes.Text(" " if i == 0 else " › ")
+            p += _system_id_link(view, ancestor)
+        result.append(p)
+    count = hierarchy.count_descendants(uri)
+    if count:
+        text = "Descendants: %d" % count
+        result.append(nodes.paragraph(text, text, classes=["system-descendants"]))
+    return result
+
+
+def _usage_row(process, entry):
+    row = {"object": process}
+    if entry.amount is not None:
+        row["amount"] = entry.amount
+        row["metric"] = entry.metric
+    return row
+
+
+def _recipe_table(view, objects, heading="Object", compact=False):
+    rows = [
         [
-            _system_id_link(g, obj["object"], nodes.paragraph),
-            nodes.literal("", "%.1f %s" % (obj["amount"], obj["metric"]))
+            _link_cell(view, obj["object"]),
+            ("literal", "%.1f %s" % (obj["amount"], obj["metric"]))
             if "amount" in obj
-            else "",
+            else ("text", ""),
         ]
         for obj in objects
     ]
-    return build_table_from_list(header_rows + table_data, header_rows=1)
+    return _table(view, [heading, "Amount"], rows, compact=compact)
+
+
+def _link_cell(view, sys_id):
+    return ("ref", str(sys_id), view.n3(sys_id))
+
+
+def _table(view, header, rows, classes=(), compact=False):
+    """Table with a header row of literals, and rows of cells.
+
+    Cells are ("text", text), ("literal", text) or ("ref", uri, label). For
+    HTML builders (other than singlehtml) this is a `probs_table` node holding
+    just the rows, which is rendered directly by `visit_probs_table_html`;
+    otherwise it is built as a docutils table.
+    """
+    if compact:
+        return probs_table("", header=header, rows=rows, classes=list(classes))
+
+    def cell(item):
+        kind, text = item[0], item[-1]
+        if kind == "ref":
+            return _system_id_link(view, item[1], nodes.paragraph)
+        elif kind == "literal":
+            return nodes.literal("", text)
+        return nodes.paragraph(text, text) if text else ""
+
+    header_rows = [
+        [nodes.paragraph("", "", nodes.literal(text, text)) for text in header]
+    ]
+    table_data = [[cell(item) for item in row] for row in rows]
+    table = build_table_from_list(header_rows + table_data, header_rows=1)
+    table["classes"] += list(classes)
+    return table
+
+
+def _pend_unresolved_links(domain, view, table):
+    """Make links in `table` to things not found into pending references.
+
+    Each becomes a ("node", index) cell, rendered from a child of the table,
+    so that it is resolved (or reported as missing, with the
+    ``missing-reference`` event and nitpicky mode) like any other reference.
+    """
+    external = domain.get_external_things()
+    rows = []
+    for row in table["rows"]:
+        cells = []
+        for item in row:
+            if (
+                item[0] == "ref"
+                and domain.lookup_thing(item[1]) is None
+                and item[1] not in external
+            ):
+                table += _system_id_link(view, item[1], nodes.paragraph)
+                item = ("node", len(table.children) - 1)
+            cells.append(item)
+        rows.append(cells)
+    table["rows"] = rows
+
+
+def visit_probs_table_html(self, node):
+    """Render a `probs_table` node, resolving links to system things."""
+    builder = self.builder
+    domain = cast(SystemDomain, builder.env.get_domain("system"))
+
+    def render(child):
+        start = len(self.body)
+        child.walkabout(self)
+        html = "".join(self.body[start:])
+        del self.body[start:]
+        return html
+
+    def literal(text):
+        words = " ".join(
+            '<span class="pre">%s</span>' % escape(word) for word in text.split()
+        )
+        return '<code class="docutils literal notranslate">%s</code>' % words
+
+    def cell(item):
+        kind, text = item[0], item[-1]
+        if kind == "literal":
+            return literal(text)
+        elif kind == "node":
+            return render(node.children[item[1]])
+        elif kind == "ref":
+            thing = domain.lookup_thing(item[1])
+            if thing is None:
+                return _external_link(builder, domain, item[1], text)
+            href = builder.get_relative_uri(builder.current_docname, thing.docname)
+            return (
+                '<p><a class="reference internal" href="%s#%s" title="%s">'
+                "<span>%s</span></a></p>"
+                % (escape(href), escape(thing.node_id), escape(item[1]), escape(text))
+            )
+        return "<p>%s</p>" % escape(text) if text else ""
+
+    classes = node["classes"] + ["docutils", "align-default"]
+    out = ['<table class="%s">\n<thead>\n<tr class="row-odd">' % " ".join(classes)]
+    out.extend('<th class="head">%s</th>' % literal(text) for text in node["header"])
+    out.append("</tr>\n</thead>\n<tbody>\n")
+    for i, row in enumerate(node["rows"]):
+        out.append('<tr class="%s">' % ("row-even" if i % 2 == 0 else "row-odd"))
+        out.extend("<td>%s</td>" % cell(item) for item in row)
+        out.append("</tr>\n")
+    out.append("</tbody>\n</table>\n")
+    self.body.append("".join(out))
+    raise nodes.SkipNode
+
+
+def _external_link(builder, domain, uri, text):
+    """Link to a thing in another project's inventory, or just its label."""
+    external = domain.get_external_things().get(uri)
+    if external is None:
+        return "<p><span>%s</span></p>" % escape(text)
+    url = external.url
+    if "://" not in url and not url.startswith("/"):
+        url = relative_uri(builder.get_target_uri(builder.current_docname), url)
+    return (
+        '<p><a class="reference external" href="%s" title="%s (in %s)">'
+        "<span>%s</span></a></p>"
+        % (escape(url), escape(uri), escape(external.project), escape(text))
+    )
 
 
-def _system_id_link(g, sys_id, within=None):
+def _system_id_link(view, sys_id, within=None):
     """Insert a cross reference to another object/process."""
     refnode = addnodes.pending_xref(
         "", refdomain="system", refexplicit=False, reftype="ref", reftarget=sys_id
     )
-    label = sys_id.n3(g.namespace_manager)
+    label = view.n3(sys_id)
     refnode += nodes.inline(label, label)
     if within is not None:
         wrapper = within("", "")
@@ -263,9 +496,8 @@ def build_table_from_list(
     table += tgroup
 
     for col_width in col_widths:
-        colspec = nodes.colspec()
-        # if col_width is not None:
-        #     colspec.attributes['colwidth'] = col_width
+        # Needed by the text writer; HTML ignores it with "colwidths-auto"
+        colspec = nodes.colspec(colwidth=col_width)
         if stub_columns:
             colspec.attributes["stub"] = 1
             stub_columns -= 1
@@ -0,0 +1,83 @@
+"""Compact search index of system processes and objects.
+
+With ``probs_rdf_search_index = True``, processes and objects are left out of
+Sphinx's own search index (which every page loads), and written instead to
+``_static/probs_rdf_search.json``. This is only fetched by the
+``system:search`` widget when it is first used.
+
+The index lists the target URI of each document once, and each thing as
+``[name, label, type, document, anchor]``, where `name` is the thing's URI
+without `probs_rdf_system_prefix` (or the full URI in angle brackets),
+`label` is empty if it is the same as `name`, and `type` and `document` are
+indices into the ``types`` and ``docs`` lists.
+"""
+
+import json
+import os
+from typing import cast
+
+from docutils import nodes
+from sphinx.util.docutils import SphinxDirective
+
+from .directives import SystemDomain
+
+INDEX_FILENAME = "probs_rdf_search.json"
+
+TYPES = ["process", "object"]
+
+WIDGET_HTML = """\
+<div class="system-search" role="search">
+<input type="search" placeholder="Search processes and objects"
+       aria-label="Search processes and objects" autocomplete="off" />
+<ul class="system-search-results"></ul>
+</div>
+"""
+
+
+def build_search_index(domain: SystemDomain, builder) -> dict:
+    prefix = domain.env.config.probs_rdf_system_prefix
+    things = sorted(domain.things.items())
+    docnames = sorted({thing.docname for _, thing in things})
+    doc_index = {docname: i for i, docname in enumerate(docnames)}
+
+    items = []
+    for uri, thing in things:
+        if prefix and uri.startswith(prefix):
+            name = local_name = uri[len(prefix):]
+        else:
+            local_name = uri
+            name = "<%s>" % uri
+        items.append([
+            name,
+            thing.label if thing.label != local_name else "",
+            TYPES.index(thing.thing_type),
+            doc_index[thing.docname],
+            thing.node_id,
+        ])
+
+    return {
+        "prefix": prefix,
+        "types": TYPES,
+        "docs": [builder.get_target_uri(docname) for docname in docnames],
+        "things": items,
+    }
+
+
+def write_search_index(app, exc):
+    if exc or app.builder.format != "html" or not app.config.probs_rdf_search_index:
+        return
+    domain = cast(SystemDomain, app.env.get_domain("system"))
+    index = build_search_index(domain, app.builder)
+    staticdir = os.path.join(app.builder.outdir, "_static")
+    os.makedirs(staticdir, exist_ok=True)
+    with open(os.path.join(staticdir, INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class SearchWidget(SphinxDirective):
+    """Search box for processes and objects, using the compact search index."""
+
+    def run(self):
+        if self.config.probs_rdf_lean:
+            return []
+        return [nodes.raw("", WIDGET_HTML, format="html")]
@@ -0,0 +1,188 @@
+"""Export of the system model to a normalized SQLite database.
+
+With ``probs_rdf_sqlite_output = True``, the ``probs_rdf`` builder writes
+`output.sqlite` alongside `output.ttl`, for querying the model with SQL
+rather than parsing Turtle. Its tables are:
+
+- ``things``: processes and objects, with their labels and the document
+  and anchor defining them (also as ``processes`` and ``objects`` views);
+- ``composition``: composed-of relations from `parent` to `child`, of kind
+  "process", "object", or "children-of" (for ``*Name`` composition, which
+  includes the children of `child`);
+- ``recipe_items``: what each process consumes and produces, with amounts
+  and metrics.
+
+Each row records the document it comes from, and the ``documents`` table
+records when each document was read. The database is updated in place: only
+rows from documents read again since the last export (or since removed) are
+replaced, in a single transaction.
+"""
+
+import os
+import sqlite3
+from typing import Dict, List, Set, Tuple, cast
+
+from .directives import SystemDomain
+
+SQLITE_FILENAME = "output.sqlite"
+
+SCHEMA_VERSION = "2"
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE documents (
+    docname TEXT PRIMARY KEY,
+    read_time REAL NOT NULL
+);
+CREATE TABLE things (
+    uri TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    label TEXT NOT NULL,
+    docname TEXT NOT NULL,
+    anchor TEXT NOT NULL
+);
+CREATE INDEX things_docname ON things (docname);
+CREATE INDEX things_type ON things (type, label);
+CREATE VIEW processes AS
+    SELECT uri, label, docname, anchor FROM things WHERE type = 'process';
+CREATE VIEW objects AS
+    SELECT uri, label, docname, anchor FROM things WHERE type = 'object';
+CREATE TABLE composition (
+    parent TEXT NOT NULL,
+    child TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    docname TEXT NOT NULL
+);
+CREATE INDEX composition_parent ON composition (parent);
+CREATE INDEX composition_child ON composition (child);
+CREATE INDEX composition_docname ON composition (docname);
+CREATE TABLE recipe_items (
+    process TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    object TEXT NOT NULL,
+    amount REAL,
+    metric TEXT,
+    docname TEXT NOT NULL
+);
+CREATE INDEX recipe_items_process ON recipe_items (process);
+CREATE INDEX recipe_items_object ON recipe_items (object, direction);
+CREATE INDEX recipe_items_docname ON recipe_items (docname);
+"""
+
+TABLES = ["things", "composition", "recipe_items"]
+
+
+def _open(filename: str) -> sqlite3.Connection:
+    """Open the database, recreating it if it has an older schema."""
+    conn = sqlite3.connect(filename, isolation_level=None)
+    try:
+        version = conn.execute(
+            "SELECT value FROM meta WHERE key = 'schema_version'"
+        ).fetchone()
+    except sqlite3.DatabaseError:
+        version = None
+    if version != (SCHEMA_VERSION,):
+        conn.close()
+        os.remove(filename)
+        conn = sqlite3.connect(filename, isolation_level=None)
+        conn.executescript(SCHEMA)
+        conn.execute(
+            "INSERT INTO meta VALUES ('schema_version', ?)", (SCHEMA_VERSION,)
+        )
+    return conn
+
+
+def _composition_rows(domain: SystemDomain, docnames: Set[str]):
+    from .namespaces import PROBS
+
+    kinds = [
+        (PROBS.processComposedOf, "process"),
+        (PROBS.objectComposedOf, "object"),
+        (PROBS.processComposedOfChildrenOf, "children-of"),
+    ]
+    # Going through each relation once is much faster than through each
+    # document's context when many documents have changed
+    for predicate, kind in kinds:
+        for parent, _, child, context in domain.graph.quads((None, predicate, None)):
+            if context is None:
+                continue
+            docname = str(context.identifier)
+            if docname in docnames:
+                yield str(parent), str(child), kind, docname
+
+
+def export_sqlite(env, filename: str) -> Tuple[int, int]:
+    """Bring the database at `filename` up to date with the environment.
+
+    Returns the numbers of documents updated and removed.
+    """
+    domain = cast(SystemDomain, env.get_domain("system"))
+    conn = _open(filename)
+    try:
+        exported: Dict[str, float] = dict(
+            conn.execute("SELECT docname, read_time FROM documents")
+        )
+        # Seconds as a float, or microseconds as an int, depending on the
+        # version of Sphinx; either is stored exactly as a REAL
+        read_times: Dict[str, float] = dict(env.all_docs)
+        changed = sorted(
+            docname for docname, read_time in read_times.items()
+            if exported.get(docname) != read_time
+        )
+        removed = sorted(set(exported) - set(read_times))
+        if not changed and not removed:
+            return 0, 0
+
+        stale = changed + removed
+        conn.execute("BEGIN")
+        conn.execute("CREATE TEMP TABLE stale (docname TEXT PRIMARY KEY)")
+        conn.executemany("INSERT INTO stale VALUES (?)", ((d,) for d in stale))
+
+        # Things whose rows come from a stale document may now be defined
+        # in another document (if they were defined twice)
+        moved: Set[str] = {
+            uri for uri, in conn.execute(
+                "SELECT uri FROM things WHERE docname IN (SELECT docname FROM stale)"
+            )
+        }
+        for table in TABLES + ["documents"]:
+            conn.execute(
+                "DELETE FROM %s WHERE docname IN (SELECT docname FROM stale)" % table
+            )
+        conn.execute("DROP TABLE stale")
+
+        changed_set = set(changed)
+        things: List[Tuple[str, str, str, str, str]] = [
+            (uri, thing.thing_type, thing.label, thing.docname, thing.node_id)
+            for uri, thing in domain.things.items()
+            if thing.docname in changed_set or uri in moved
+        ]
+        conn.executemany("INSERT OR REPLACE INTO things VALUES (?, ?, ?, ?, ?)", things)
+        # A thing defined twice may have moved here from an unchanged document
+        conn.executemany(
+            "DELETE FROM recipe_items WHERE process = ?", ((uri,) for uri, *_ in things)
+        )
+        conn.executemany(
+            "INSERT INTO recipe_items VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (uri, entry.direction, entry.object, entry.amount, entry.metric,
+                 docname)
+                for uri, _, _, docname, _ in things
+                for entry in domain.process_recipe.get(uri, [])
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO composition VALUES (?, ?, ?, ?)",
+            _composition_rows(domain, changed_set),
+        )
+        conn.executemany(
+            "INSERT INTO documents VALUES (?, ?)",
+            ((docname, read_times[docname]) for docname in changed),
+        )
+        conn.execute("COMMIT")
+        return len(changed), len(removed)
+    finally:
+        conn.close()
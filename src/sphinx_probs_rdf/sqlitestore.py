@@ -0,0 +1,475 @@
+"""Disk-backed rdflib store using the standard library's sqlite3.
+
+Used for the system graph when ``probs_rdf_store = "sqlite"``, so that very
+large systems need not fit in memory: quads are kept in an SQLite database
+(in the doctree directory by default) rather than in Python dictionaries,
+and `serialize_turtle` writes them out one subject at a time. Other uses of
+the graph (queries, post-processing, the view of the graph used for writing
+documents) still load what they need into memory.
+
+Terms are stored once in a ``terms`` table and quads refer to them by id.
+The ``quads`` table's primary key serves as the SPO index, with extra POS,
+OSP and context indexes. Contexts are the graph identifiers of the quads, so
+the per-document contexts used by the domain are kept as in the memory store.
+
+The store pickles as the path to its database, so it can be saved with the
+Sphinx environment and reopened on the next build, or in parallel reading
+processes.
+"""
+
+import os
+import re
+import sqlite3
+from itertools import groupby
+from typing import IO, Any, Dict, Generator, Iterable, Iterator, List, Optional, Tuple
+
+from rdflib import BNode, Literal, URIRef  # type: ignore
+from rdflib.namespace import RDF  # type: ignore
+from rdflib.graph import Graph  # type: ignore
+from rdflib.store import VALID_STORE, Store  # type: ignore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    datatype TEXT NOT NULL DEFAULT '',
+    lang TEXT NOT NULL DEFAULT '',
+    UNIQUE (kind, value, datatype, lang)
+);
+CREATE TABLE IF NOT EXISTS quads (
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    c INTEGER NOT NULL,
+    PRIMARY KEY (s, p, o, c)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS quads_pos ON quads (p, o, s);
+CREATE INDEX IF NOT EXISTS quads_osp ON quads (o, s, p);
+CREATE INDEX IF NOT EXISTS quads_c ON quads (c);
+CREATE TABLE IF NOT EXISTS namespaces (
+    prefix TEXT PRIMARY KEY,
+    uri TEXT NOT NULL
+);
+"""
+
+# Decoded terms are cached by id, and ids by term. The caches are cleared
+# when they grow past this size, to keep memory use bounded.
+CACHE_SIZE = 100_000
+
+# Quads are inserted in batches of this size by addN
+BATCH_SIZE = 10_000
+
+
+def _encode(term) -> Tuple[str, str, str, str]:
+    if isinstance(term, Literal):
+        return ("L", str(term), str(term.datatype or ""), term.language or "")
+    elif isinstance(term, BNode):
+        return ("B", str(term), "", "")
+    elif isinstance(term, URIRef):
+        return ("U", str(term), "", "")
+    raise TypeError("Cannot store %r in an SQLite store" % (term,))
+
+
+def _decode(kind: str, value: str, datatype: str, lang: str):
+    if kind == "U":
+        return URIRef(value)
+    elif kind == "B":
+        return BNode(value)
+    return Literal(
+        value,
+        lang=lang or None,
+        datatype=URIRef(datatype) if datatype else None,
+    )
+
+
+class SQLiteStore(Store):
+    """Context-aware rdflib store backed by an SQLite database."""
+
+    context_aware = True
+    formula_aware = False
+    graph_aware = False
+    transaction_aware = False
+
+    def __init__(self, configuration: Optional[str] = None, identifier=None):
+        self.identifier = identifier
+        self.path: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._ids: Dict[Tuple[str, str, str, str], int] = {}
+        self._terms: Dict[int, Any] = {}
+        super().__init__(configuration, identifier)
+
+    # Opening and closing
+
+    def open(self, configuration: str, create: bool = True) -> int:
+        self.path = os.path.abspath(configuration)
+        if create:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connect()
+        return VALID_STORE
+
+    def _connect(self):
+        assert self.path is not None, "store has not been opened"
+        self._conn = sqlite3.connect(self.path, timeout=600)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(SCHEMA)
+        self._pid = os.getpid()
+        self._ids.clear()
+        self._terms.clear()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # A connection can't be shared with forked processes (e.g. for
+        # parallel reading), which open their own instead
+        if self._conn is None or self._pid != os.getpid():
+            self._connect()
+        assert self._conn is not None
+        return self._conn
+
+    def close(self, commit_pending_transaction: bool = True):
+        if self._conn is not None and self._pid == os.getpid():
+            if commit_pending_transaction:
+                self._conn.commit()
+            self._conn.close()
+        self._conn = None
+
+    def destroy(self, configuration: str):
+        self.close(commit_pending_transaction=False)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(configuration + suffix):
+                os.remove(configuration + suffix)
+
+    def commit(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.rollback()
+
+    def clear(self):
+        """Remove all quads, terms and namespace bindings."""
+        self.conn.executescript(
+            "DELETE FROM quads; DELETE FROM terms; DELETE FROM namespaces;"
+        )
+        self._ids.clear()
+        self._terms.clear()
+
+    def __getstate__(self):
+        # Make what has been added so far visible to whoever unpickles this
+        self.commit()
+        return {"path": self.path, "identifier": self.identifier}
+
+    def __setstate__(self, state):
+        self.__init__(identifier=state["identifier"])
+        if state["path"] is not None:
+            self.open(state["path"], create=False)
+
+    # Terms
+
+    def _term_id(self, term, create: bool = False) -> Optional[int]:
+        key = _encode(term)
+        term_id = self._ids.get(key)
+        if term_id is not None:
+            return term_id
+        if create:
+            # Another process may have added the same term since we last
+            # looked, so insert first and then look up the id
+            self.conn.execute(
+                "INSERT OR IGNORE INTO terms (kind, value, datatype, lang) "
+                "VALUES (?, ?, ?, ?)",
+                key,
+            )
+        row = self.conn.execute(
+            "SELECT id FROM terms WHERE kind=? AND value=? AND datatype=? AND lang=?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        term_id = row[0]
+        if len(self._ids) >= CACHE_SIZE:
+            self._ids.clear()
+        self._ids[key] = term_id
+        return term_id
+
+    def _term(self, term_id: int):
+        term = self._terms.get(term_id)
+        if term is None:
+            row = self.conn.execute(
+                "SELECT kind, value, datatype, lang FROM terms WHERE id=?", (term_id,)
+            ).fetchone()
+            term = _decode(*row)
+            if len(self._terms) >= CACHE_SIZE:
+                self._terms.clear()
+            self._terms[term_id] = term
+        return term
+
+    @staticmethod
+    def _context_identifier(context):
+        if context is None:
+            return None
+        return context.identifier if isinstance(context, Graph) else context
+
+    # Adding and removing
+
+    def add(self, triple, context, quoted: bool = False):
+        if quoted:
+            raise NotImplementedError("SQLiteStore does not support formulae")
+        s, p, o = triple
+        c = self._context_identifier(context)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)",
+            tuple(self._term_id(term, create=True) for term in (s, p, o, c)),
+        )
+        Store.add(self, triple, context, quoted)
+
+    def addN(self, quads: Iterable[Tuple[Any, Any, Any, Any]]):
+        batch: List[Tuple[Optional[int], ...]] = []
+        for s, p, o, context in quads:
+            c = self._context_identifier(context)
+            batch.append(
+                tuple(self._term_id(term, create=True) for term in (s, p, o, c))
+            )
+            if len(batch) >= BATCH_SIZE:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+
+    def _insert(self, batch):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)", batch
+        )
+
+    def remove(self, triple, context=None):
+        where = self._where(triple, context)
+        if where is None:
+            return  # some term is not in the store
+        clause, params = where
+        if context is not None and all(term is None for term in triple):
+            # A whole context, e.g. of a document which is read again
+            self._remove_with_terms(clause, params)
+        else:
+            self.conn.execute("DELETE FROM quads" + clause, params)
+        Store.remove(self, triple, context)
+
+    def _remove_with_terms(self, clause: str, params: List[int]):
+        """Remove matching quads, and the terms no remaining quad uses.
+
+        Otherwise the terms table would keep growing with each incremental
+        build, as documents' contexts are removed and added again.
+        """
+        conn = self.conn
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS removed (id INTEGER PRIMARY KEY)")
+        for column in "spoc":
+            conn.execute(
+                "INSERT OR IGNORE INTO removed SELECT %s FROM quads%s"
+                % (column, clause),
+                params,
+            )
+        conn.execute("DELETE FROM quads" + clause, params)
+        conn.execute(
+            "DELETE FROM terms WHERE id IN (SELECT id FROM removed)"
+            " AND NOT EXISTS (SELECT 1 FROM quads WHERE s = terms.id)"
+            " AND NOT EXISTS (SELECT 1 FROM quads WHERE p = terms.id)"
+            " AND NOT EXISTS (SELECT 1 FROM quads WHERE o = terms.id)"
+            " AND NOT EXISTS (SELECT 1 FROM quads WHERE c = terms.id)"
+        )
+        conn.execute("DELETE FROM removed")
+        # Ids of removed terms may be reused
+        self._ids.clear()
+        self._terms.clear()
+
+    def _where(
+        self, triple, context, table: str = ""
+    ) -> Optional[Tuple[str, List[int]]]:
+        """Build a WHERE clause matching a triple pattern and context.
+
+        :param table: name or alias to qualify the columns with.
+        """
+        conditions = []
+        params = []
+        c = self._context_identifier(context)
+        for column, term in zip("spoc", tuple(triple) + (c,)):
+            if term is None:
+                continue
+            term_id = self._term_id(term)
+            if term_id is None:
+                return None
+            conditions.append("%s%s=?" % (table and table + ".", column))
+            params.append(term_id)
+        clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return clause, params
+
+    # Querying
+
+    def triples(self, triple_pattern, context=None) -> Iterator:
+        where = self._where(triple_pattern, context, "q")
+        if where is None:
+            return
+        clause, params = where
+        # Each triple is returned with the ids of all its contexts
+        if self._context_identifier(context) is None and not params:
+            # The whole graph, in subject order (see `serialize_turtle`). The
+            # condition on s makes SQLite scan the primary key, rather than
+            # an index followed by a sort.
+            sql = (
+                "SELECT s, p, o, GROUP_CONCAT(c) FROM quads WHERE s > 0 "
+                "GROUP BY s, p, o ORDER BY s, p, o"
+            )
+        elif self._context_identifier(context) is None:
+            sql = (
+                "SELECT s, p, o, GROUP_CONCAT(c) FROM quads AS q%s "
+                "GROUP BY s, p, o" % clause
+            )
+        else:
+            sql = (
+                "SELECT q.s, q.p, q.o, GROUP_CONCAT(a.c) FROM quads AS q "
+                "JOIN quads AS a ON a.s = q.s AND a.p = q.p AND a.o = q.o%s "
+                "GROUP BY q.s, q.p, q.o" % clause
+            )
+        if all(term is None for term in triple_pattern):
+            # Stream whole-graph scans (e.g. when serializing) rather than
+            # loading them into memory. This is done with a separate cursor.
+            rows: Iterable = self.conn.cursor().execute(sql, params)
+        else:
+            # Other patterns are usually modified while they are iterated
+            # over (e.g. when postprocessing), which SQLite cursors don't
+            # allow, so fetch these results first.
+            rows = self.conn.execute(sql, params).fetchall()
+        for s, p, o, contexts in rows:
+            triple = (self._term(s), self._term(p), self._term(o))
+            yield triple, [self._term(int(c)) for c in contexts.split(",")]
+
+    def __len__(self, context=None) -> int:
+        c = self._context_identifier(context)
+        if c is None:
+            sql = "SELECT COUNT(*) FROM (SELECT 1 FROM quads GROUP BY s, p, o)"
+            return self.conn.execute(sql).fetchone()[0]
+        c_id = self._term_id(c)
+        if c_id is None:
+            return 0
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM quads WHERE c=?", (c_id,)
+        ).fetchone()[0]
+
+    def contexts(self, triple=None) -> Generator[Any, None, None]:
+        if triple is None:
+            rows = self.conn.execute("SELECT DISTINCT c FROM quads").fetchall()
+        else:
+            where = self._where(triple, None)
+            if where is None:
+                return
+            clause, params = where
+            rows = self.conn.execute(
+                "SELECT DISTINCT c FROM quads" + clause, params
+            ).fetchall()
+        for (c,) in rows:
+            yield self._term(c)
+
+    # Namespace bindings
+
+    def bind(self, prefix: str, namespace, override: bool = True):
+        namespace = str(namespace)
+        if not override:
+            bound = self.conn.execute(
+                "SELECT 1 FROM namespaces WHERE prefix=? OR uri=?",
+                (prefix, namespace),
+            ).fetchone()
+            if bound:
+                return
+        self.conn.execute("DELETE FROM namespaces WHERE uri=?", (namespace,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO namespaces (prefix, uri) VALUES (?, ?)",
+            (prefix, namespace),
+        )
+
+    def prefix(self, namespace) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT prefix FROM namespaces WHERE uri=?", (str(namespace),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def namespace(self, prefix: str) -> Optional[URIRef]:
+        row = self.conn.execute(
+            "SELECT uri FROM namespaces WHERE prefix=?", (prefix,)
+        ).fetchone()
+        return URIRef(row[0]) if row else None
+
+    def namespaces(self) -> Iterator[Tuple[str, URIRef]]:
+        rows = self.conn.execute("SELECT prefix, uri FROM namespaces").fetchall()
+        for prefix, uri in rows:
+            yield prefix, URIRef(uri)
+
+
+# Local names which can be written as prefixed names in Turtle as they are
+LOCAL_NAME = re.compile(r"[A-Za-z0-9_]([A-Za-z0-9_.-]*[A-Za-z0-9_-])?\Z")
+
+
+def serialize_turtle(graph, f: IO[bytes]):
+    """Write `graph`, held in an `SQLiteStore`, to binary file `f` as Turtle.
+
+    rdflib's Turtle serializer sorts the whole graph in memory before
+    writing it. This writes one subject at a time instead, as they come
+    from the store's primary key, so memory use does not grow with the
+    size of the graph. The output is less compact: blank nodes are written
+    by label rather than nested, and subjects are not sorted.
+    """
+    store = graph.store
+    assert isinstance(store, SQLiteStore)
+
+    # Only declare the bound prefixes which are used
+    datatypes = [
+        row[0]
+        for row in store.conn.execute(
+            "SELECT DISTINCT datatype FROM terms WHERE kind='L' AND datatype != ''"
+        )
+    ]
+    prefixes: Dict[str, str] = {}
+    for prefix, namespace_uri in sorted(store.namespaces()):
+        namespace = str(namespace_uri)
+        used = store.conn.execute(
+            "SELECT 1 FROM terms WHERE kind='U' AND value >= ? AND value < ? LIMIT 1",
+            (namespace, namespace + "\U0010ffff"),
+        ).fetchone() or any(d.startswith(namespace) for d in datatypes)
+        if used and namespace not in prefixes:
+            prefixes[namespace] = prefix
+            f.write(("@prefix %s: <%s> .\n" % (prefix, namespace)).encode("utf-8"))
+    f.write(b"\n")
+
+    names: Dict[str, Optional[str]] = {}
+
+    def qname(uri) -> Optional[str]:
+        if uri not in names:
+            if len(names) >= CACHE_SIZE:
+                names.clear()
+            for i in (uri.rfind("#"), uri.rfind("/")):
+                prefix = prefixes.get(uri[:i + 1])
+                local = uri[i + 1:]
+                if prefix is not None and (not local or LOCAL_NAME.match(local)):
+                    names[uri] = "%s:%s" % (prefix, local)
+                    break
+            else:
+                names[uri] = None
+        return names[uri]
+
+    def datatype_name(uri: str) -> str:
+        return qname(uri) or "<%s>" % uri
+
+    def n3(term) -> str:
+        if isinstance(term, URIRef):
+            return qname(term) or term.n3()
+        elif isinstance(term, Literal):
+            return term._literal_n3(use_plain=True, qname_callback=datatype_name)
+        return term.n3()
+
+    triples = graph.triples((None, None, None))
+    for subject, items in groupby(triples, key=lambda triple: triple[0]):
+        lines = []
+        for predicate, group in groupby(items, key=lambda triple: triple[1]):
+            verb = "a" if predicate == RDF.type else n3(predicate)
+            objects = " ,\n        ".join(n3(o) for _, _, o in group)
+            lines.append("%s %s" % (verb, objects))
+        text = "%s %s .\n\n" % (n3(subject), " ;\n    ".join(lines))
+        f.write(text.encode("utf-8"))
@@ -0,0 +1,146 @@
+"""Statistics of the system model, written alongside `output.ttl`.
+
+With ``probs_rdf_stats = True``, `output.stats.json` and `output.stats.html`
+report the numbers of processes and objects (in total and per document),
+recipe coverage, the depth and fan-out of the composition hierarchies,
+orphan objects, and the number of market processes (one is defined for each
+object). They are computed from the domain data and the hierarchies in one
+pass over each, rather than with SPARQL over the graph.
+"""
+
+from collections import defaultdict
+import html
+import json
+from typing import Any, Dict, List, cast
+
+from .directives import SystemDomain
+
+STATS_JSON_FILENAME = "output.stats.json"
+STATS_HTML_FILENAME = "output.stats.html"
+
+
+def hierarchy_stats(hierarchy) -> Dict[str, Any]:
+    """Size, depth and fan-out of a composition `hierarchy`.
+
+    The depth of a root is 0, and of other nodes one more than their deepest
+    parent. Nodes in cycles are counted as nodes but not in the depth.
+    """
+    depth: Dict[Any, int] = {}
+    for node in hierarchy.order:  # parents before children
+        parents = hierarchy.parents(node)
+        depth[node] = 1 + max((depth[p] for p in parents if p in depth), default=-1)
+    # Numbers of children of nodes which have any
+    fan_out = [len(hierarchy.children(node)) for node in hierarchy.nodes]
+    fan_out = [n for n in fan_out if n]
+    return {
+        "nodes": len(hierarchy.nodes),
+        "roots": len(hierarchy.roots()),
+        "max_depth": max(depth.values(), default=0),
+        "max_fan_out": max(fan_out, default=0),
+        "mean_fan_out": round(sum(fan_out) / len(fan_out), 3) if fan_out else 0,
+        "in_cycles": len(hierarchy.nodes) - len(depth),
+    }
+
+
+def compute_stats(domain: SystemDomain) -> Dict[str, Any]:
+    """Compute statistics of the model from the domain data."""
+    from .namespaces import PROBS
+
+    processes = domain.get_hierarchy("process")
+    objects = domain.get_hierarchy("object")
+
+    per_document: Dict[str, Dict[str, int]] = defaultdict(
+        lambda: {"processes": 0, "objects": 0}
+    )
+    totals = {"processes": 0, "objects": 0}
+    recipes: Dict[str, float] = {
+        "processes_with_recipe": 0,
+        "recipe_items": 0,
+        "leaf_processes": 0,
+        "leaf_processes_with_recipe": 0,
+    }
+    orphans: List[str] = []
+    for uri, thing in domain.things.items():
+        key = "processes" if thing.thing_type == "process" else "objects"
+        per_document[thing.docname][key] += 1
+        totals[key] += 1
+        if thing.thing_type == "process":
+            entries = domain.process_recipe.get(uri)
+            leaf = not processes.children(uri)
+            recipes["processes_with_recipe"] += bool(entries)
+            recipes["recipe_items"] += len(entries or ())
+            recipes["leaf_processes"] += leaf
+            recipes["leaf_processes_with_recipe"] += leaf and bool(entries)
+        elif uri not in domain.object_usage and uri not in objects.nodes:
+            orphans.append(uri)
+    if recipes["leaf_processes"]:
+        recipes["leaf_coverage"] = round(
+            recipes["leaf_processes_with_recipe"] / recipes["leaf_processes"], 4
+        )
+
+    markets = sum(1 for _ in domain.graph.subjects(PROBS.marketForObject, None))
+    return {
+        "totals": dict(totals, documents=len(per_document), market_processes=markets),
+        "documents": dict(sorted(per_document.items())),
+        "recipes": recipes,
+        "hierarchy": {
+            "process": hierarchy_stats(processes),
+            "object": hierarchy_stats(objects),
+        },
+        "orphan_objects": sorted(orphans),
+    }
+
+
+def _table(rows, header=None) -> str:
+    lines = ["<table>"]
+    if header:
+        lines.append(
+            "<tr>%s</tr>" % "".join("<th>%s</th>" % html.escape(h) for h in header)
+        )
+    for row in rows:
+        lines.append(
+            "<tr>%s</tr>" % "".join("<td>%s</td>" % html.escape(str(c)) for c in row)
+        )
+    lines.append("</table>")
+    return "\n".join(lines)
+
+
+def stats_html(stats: Dict[str, Any]) -> str:
+    """Render `stats` as a standalone HTML page."""
+    hierarchy = stats["hierarchy"]
+    orphans = stats["orphan_objects"]
+    sections = [
+        ("Totals", _table(stats["totals"].items())),
+        ("Recipes", _table(stats["recipes"].items())),
+        ("Composition hierarchies", _table(
+            [[key] + [hierarchy[kind][key] for kind in hierarchy]
+             for key in hierarchy["process"]],
+            header=[""] + list(hierarchy),
+        )),
+        ("Documents", _table(
+            [[docname, counts["processes"], counts["objects"]]
+             for docname, counts in stats["documents"].items()],
+            header=["Document", "Processes", "Objects"],
+        )),
+        ("Orphan objects (%d)" % len(orphans), "<ul>\n%s\n</ul>" % "\n".join(
+            "<li>%s</li>" % html.escape(uri) for uri in orphans
+        )),
+    ]
+    body = "\n".join(
+        "<h2>%s</h2>\n%s" % (html.escape(title), content) for title, content in sections
+    )
+    return (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\" />\n"
+        "<title>System model statistics</title>\n</head>\n<body>\n"
+        "<h1>System model statistics</h1>\n%s\n</body>\n</html>\n" % body
+    )
+
+
+def write_stats(env, json_filename: str, html_filename: str):
+    """Write the model's statistics as JSON and HTML."""
+    domain = cast(SystemDomain, env.get_domain("system"))
+    stats = compute_stats(domain)
+    with open(json_filename, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=1, ensure_ascii=False)
+    with open(html_filename, "w", encoding="utf-8") as f:
+        f.write(stats_html(stats))
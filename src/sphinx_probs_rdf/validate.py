@@ -0,0 +1,162 @@
+"""Check references between processes and objects in the system graph."""
+
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from sphinx.util import logging
+
+if TYPE_CHECKING:
+    from .directives import SystemDomain
+
+logger = logging.getLogger(__name__)
+
+
+class Problem(NamedTuple):
+    kind: str  # "undefined-process", "undefined-object", "children-of", "duplicate"
+    uri: str
+    referrers: List[str]
+    docnames: List[str]
+    location: Optional[Tuple[str, int]] = None  # of the first referrer
+
+    def message(self) -> str:
+        referrers = ", ".join(str(uri) for uri in self.referrers)
+        if self.kind == "undefined-process":
+            return "Process %s is not defined (used by %s)" % (self.uri, referrers)
+        elif self.kind == "undefined-object":
+            return "Object %s is not defined (used by %s)" % (self.uri, referrers)
+        elif self.kind == "children-of":
+            return 'Requested child "%s" of "%s" is not a Process' % (
+                self.uri,
+                referrers,
+            )
+        elif self.kind == "duplicate":
+            return "%s is defined in more than one document: %s" % (
+                self.uri,
+                ", ".join(self.docnames),
+            )
+        raise ValueError(self.kind)
+
+
+# Reference kind -> (type of thing referred to, problem kind)
+REFERENCE_KINDS = {
+    "process": ("process", "undefined-process"),
+    "children-of": ("process", "children-of"),
+    "object": ("object", "undefined-object"),
+}
+
+
+def find_problems(domain: "SystemDomain") -> List[Problem]:
+    """Find references to undefined processes/objects, and duplicate definitions.
+
+    This works from the domain's index of things and the references noted
+    while reading, rather than walking the graph, so that it is fast for
+    large systems. The graph is only consulted for things which are not
+    defined by directives (e.g. in ``system:ttl`` blocks or external files).
+    Things in the inventories of other projects count as defined.
+    """
+    from rdflib import URIRef
+    from rdflib.namespace import RDF  # type: ignore
+    from .namespaces import PROBS
+
+    things = domain.things
+    external = domain.get_external_things()
+    graph = domain.graph
+    rdf_types = {"process": PROBS.Process, "object": PROBS.Object}
+
+    # kind -> referenced uri -> referrers
+    references: Dict[str, Dict[str, List[str]]] = {
+        kind: defaultdict(list) for kind in REFERENCE_KINDS
+    }
+    for referrer, items in domain.references.items():
+        for kind, uri in items:
+            references[kind][uri].append(referrer)
+    for obj, processes in domain.object_usage.items():
+        references["object"][obj].extend(processes)
+
+    problems = []
+    for kind, (thing_type, problem_kind) in REFERENCE_KINDS.items():
+        for uri in sorted(references[kind]):
+            thing = things.get(uri)
+            if thing is not None and thing.thing_type == thing_type:
+                continue
+            # Defined in another project, see inventory.py
+            external_thing = external.get(str(uri))
+            if external_thing is not None and external_thing.thing_type == thing_type:
+                continue
+            typed = graph.triples((URIRef(uri), RDF.type, rdf_types[thing_type]))
+            if next(typed, None) is not None:
+                continue
+            referrers = sorted(set(references[kind][uri]))
+            docnames = sorted({things[r].docname for r in referrers if r in things})
+            location = next(
+                (
+                    domain.reference_locations[r]
+                    for r in referrers
+                    if r in domain.reference_locations
+                ),
+                None,
+            )
+            problems.append(Problem(problem_kind, uri, referrers, docnames, location))
+
+    for uri in sorted(domain.duplicates):
+        docnames = sorted(domain.duplicates[uri])
+        if len(docnames) > 1:
+            problems.append(Problem("duplicate", uri, [], docnames))
+
+    return problems
+
+
+# Values of `probs_rdf_check_references` -> problem kinds
+CHECKS = {
+    "processes": {"undefined-process", "children-of"},
+    "objects": {"undefined-object"},
+    "duplicates": {"duplicate"},
+}
+
+
+def check_references(app, env):
+    """Report problems in the system graph once, after reading."""
+    from .directives import SystemDomain
+
+    # Objects are often used in recipes without being defined here, so
+    # checking them is opt-in (HTML builds still warn about them in the Object
+    # Index, see `warn_undefined_objects`)
+    enabled = set()
+    for name in env.config.probs_rdf_check_references:
+        if name not in CHECKS:
+            logger.warning("Unknown probs_rdf_check_references value: %r", name)
+            continue
+        enabled |= CHECKS[name]
+    if not enabled:
+        return
+
+    domain = env.get_domain("system")
+    assert isinstance(domain, SystemDomain)
+    if not domain.things and not domain.references:
+        return
+    for problem in find_problems(domain):
+        if problem.kind in enabled:
+            report(problem)
+
+
+def report(problem: Problem):
+    log = logger.error if problem.kind == "children-of" else logger.warning
+    location: Union[Tuple[str, int], str, None] = problem.location
+    if location is None and problem.docnames:
+        location = problem.docnames[0]
+    log(problem.message(), location=location)
+
+
+def warn_undefined_objects(domain: "SystemDomain"):
+    """Warn about undefined objects in recipes, unless already checked.
+
+    This is done when generating the Object Index, as HTML builds did before
+    `probs_rdf_check_references` existed.
+    """
+    if "objects" in domain.env.config.probs_rdf_check_references:
+        return  # reported by check_references
+    if not domain.object_usage:
+        return
+    for problem in find_problems(domain):
+        if problem.kind == "undefined-object":
+            report(problem)
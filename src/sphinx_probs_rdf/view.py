@@ -0,0 +1,246 @@
+"""Read-only compact view of the system graph, for filling in documents.
+
+`ProbsTransform` needs only a few things from the graph: labels, direct
+composition relations, recipes, and the prefixed (n3) forms of URIs. Looking
+these up in an rdflib graph is slow and touches many small Python objects.
+Instead they are extracted once per build into a `GraphView`, which keeps
+URIs in a single list and relations in flat arrays, and does not change
+afterwards.
+
+Before writing in parallel (``-j``), the garbage collector is frozen (see
+`freeze_for_parallel_write`), so that forked writing processes do not
+copy the memory pages of the graph and the domain data by scanning them.
+"""
+
+from array import array
+import gc
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from sphinx.util import logging
+
+if TYPE_CHECKING:
+    from rdflib.namespace import NamespaceManager
+
+logger = logging.getLogger(__name__)
+
+COMPOSITION_KINDS = ("process", "object")
+DIRECTIONS = ("consumes", "produces")
+
+
+class _Relation:
+    """Adjacency lists of a relation between URI indices, in CSR form."""
+
+    def __init__(self, size: int, pairs: List[Tuple[int, int]]):
+        counts = [0] * (size + 1)
+        for source, _ in pairs:
+            counts[source + 1] += 1
+        for i in range(size):
+            counts[i + 1] += counts[i]
+        self.offsets = array("l", counts)
+        targets = array("l", bytes(len(pairs) * array("l").itemsize))
+        position = list(counts[:size])
+        for source, target in pairs:
+            targets[position[source]] = target
+            position[source] += 1
+        self.targets = targets
+
+    def get(self, index: int) -> array:
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+
+class GraphView:
+    """Compact, read-only view of what documents show from the graph.
+
+    Build it with `build_view`.
+    """
+
+    def __init__(
+        self,
+        uris: List[str],
+        n3: List[str],
+        labels: Dict[int, Tuple[str, ...]],
+        composition: Dict[str, List[Tuple[int, int]]],
+        recipes: List[Tuple[int, int, int, float, int]],
+        has_recipe: Iterable[int],
+        namespaces: List[Tuple[str, str]],
+    ):
+        self._uris = uris
+        self._index = {uri: i for i, uri in enumerate(uris)}
+        self._n3 = n3
+        self._labels = labels
+        self._namespaces = namespaces
+        self._namespace_manager: Optional["NamespaceManager"] = None
+        size = len(uris)
+
+        self._children = {}
+        self._parents = {}
+        for kind, pairs in composition.items():
+            self._children[kind] = _Relation(size, pairs)
+            self._parents[kind] = _Relation(size, [(c, p) for p, c in pairs])
+
+        # Recipe items: (process, direction, object, amount, metric), with
+        # the processes' items adjacent
+        recipes.sort(key=lambda item: item[0])
+        self._recipe_items = _Relation(
+            size, [(item[0], i) for i, item in enumerate(recipes)]
+        )
+        self._item_direction = array("b", (item[1] for item in recipes))
+        self._item_object = array("l", (item[2] for item in recipes))
+        self._item_amount = array("d", (item[3] for item in recipes))
+        self._item_metric = array("l", (item[4] for item in recipes))
+        self._has_recipe = frozenset(has_recipe)
+
+    def __len__(self):
+        return len(self._uris)
+
+    def n3(self, uri) -> str:
+        """Return `uri` in prefixed form where possible, e.g. ``sys:P1``."""
+        i = self._index.get(str(uri))
+        if i is not None:
+            return self._n3[i]
+        return self._fallback_n3(uri)
+
+    def _fallback_n3(self, uri) -> str:
+        from rdflib import Graph, URIRef  # type: ignore
+
+        if self._namespace_manager is None:
+            g = Graph(bind_namespaces="none")
+            for prefix, namespace in self._namespaces:
+                g.bind(prefix, namespace, override=True, replace=True)
+            self._namespace_manager = g.namespace_manager
+        return URIRef(uri).n3(self._namespace_manager)
+
+    def labels(self, uri) -> Tuple[str, ...]:
+        """Preferred labels (skos:prefLabel, or else rdfs:label) of `uri`."""
+        i = self._index.get(str(uri))
+        return self._labels.get(i, ()) if i is not None else ()
+
+    def children(self, kind: str, uri) -> List[str]:
+        """Direct children of `uri` in the "process" or "object" hierarchy."""
+        return self._related(self._children[kind], uri)
+
+    def parents(self, kind: str, uri) -> List[str]:
+        """Direct parents of `uri` in the "process" or "object" hierarchy."""
+        return self._related(self._parents[kind], uri)
+
+    def _related(self, relation: _Relation, uri) -> List[str]:
+        i = self._index.get(str(uri))
+        if i is None:
+            return []
+        return [self._uris[j] for j in relation.get(i)]
+
+    def recipe(self, uri) -> Optional[Dict[str, List[dict]]]:
+        """Recipe rows of process `uri` by direction, or None if it has none.
+
+        Each row is a dict of "object", "amount" and "metric".
+        """
+        i = self._index.get(str(uri))
+        if i is None or i not in self._has_recipe:
+            return None
+        result: Dict[str, List[dict]] = {direction: [] for direction in DIRECTIONS}
+        for item in self._recipe_items.get(i):
+            result[DIRECTIONS[self._item_direction[item]]].append(
+                {
+                    "object": self._uris[self._item_object[item]],
+                    "amount": self._item_amount[item],
+                    "metric": self._uris[self._item_metric[item]],
+                }
+            )
+        return result
+
+
+def build_view(graph) -> GraphView:
+    """Extract a `GraphView` from the system graph."""
+    from rdflib import URIRef  # type: ignore
+    from rdflib.namespace import RDFS, SKOS  # type: ignore
+    from .namespaces import PROBS, PROBS_RECIPE
+
+    uris: List[str] = []
+    index: Dict[str, int] = {}
+
+    def intern(term) -> int:
+        key = str(term)
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(uris)
+            uris.append(key)
+        return i
+
+    def subject_objects(predicate) -> Iterable[tuple]:
+        return (
+            (s, o)
+            for s, o in graph.subject_objects(predicate)
+            if isinstance(s, URIRef)
+        )
+
+    labels: Dict[int, Tuple[str, ...]] = {}
+    for predicate in (RDFS.label, SKOS.prefLabel):
+        found: Dict[int, List[str]] = {}
+        for s, o in subject_objects(predicate):
+            found.setdefault(intern(s), []).append(str(o))
+        # Later predicates take precedence
+        labels.update((i, tuple(items)) for i, items in found.items())
+
+    composition = {
+        kind: [
+            (intern(s), intern(o))
+            for s, o in subject_objects(PROBS[kind + "ComposedOf"])
+            if isinstance(o, URIRef)
+        ]
+        for kind in COMPOSITION_KINDS
+    }
+
+    recipes = []
+    seen = set()
+    for process, recipe in subject_objects(PROBS_RECIPE.hasRecipe):
+        p = intern(process)
+        if p in seen:
+            continue  # only one recipe is shown
+        seen.add(p)
+        for d, direction in enumerate(DIRECTIONS):
+            for item in graph.objects(recipe, PROBS_RECIPE[direction]):
+                obj = graph.value(item, PROBS_RECIPE.object)
+                amount = graph.value(item, PROBS_RECIPE.quantity)
+                metric = graph.value(item, PROBS_RECIPE.metric)
+                if obj is None or amount is None:
+                    continue
+                recipes.append(
+                    (p, d, intern(obj), float(amount), intern(metric or ""))
+                )
+
+    namespace_manager = graph.namespace_manager
+    n3 = [URIRef(uri).n3(namespace_manager) for uri in uris]
+    namespaces = [(prefix, str(ns)) for prefix, ns in graph.namespaces()]
+    return GraphView(uris, n3, labels, composition, recipes, seen, namespaces)
+
+
+def freeze_for_parallel_write(app, env):
+    """Prepare for writing documents in parallel, before worker processes fork.
+
+    The view of the graph is built now, and all objects existing so far are
+    moved to the garbage collector's permanent generation, so that they are
+    not scanned (and their memory pages copied) in each worker.
+    """
+    from .directives import SystemDomain
+
+    if app.parallel <= 1 or not app.builder.allow_parallel:
+        return
+    if app.builder.name == "probs_rdf":
+        return  # documents are not written
+    domain = env.get_domain("system")
+    assert isinstance(domain, SystemDomain)
+    if domain.things:
+        domain.get_view()
+    gc.collect()
+    gc.freeze()
+    _frozen.append(True)
+
+
+_frozen: List[bool] = []
+
+
+def unfreeze(app, exc):
+    """Undo `freeze_for_parallel_write` once the build has finished."""
+    if _frozen:
+        _frozen.clear()
+        gc.unfreeze()
@@ -15,3 +15,32 @@ pytest_plugins = 'sphinx.testing.fixtures'
 @pytest.fixture(scope='session')
 def rootdir():
     return path(__file__).parent.abspath() / 'roots'
+
+
+@pytest.fixture
+def copy_root(rootdir, tmp_path):
+    """Copy a test root into the test's temporary directory, once.
+
+    Returns the path of the copy, for tests which change its sources.
+    """
+    def copy(testroot):
+        srcdir = path(str(tmp_path / testroot))
+        if not srcdir.exists():
+            (rootdir / ("test-" + testroot)).copytree(srcdir)
+        return srcdir
+
+    return copy
+
+
+@pytest.fixture
+def make_copied_app(make_app, copy_root):
+    """Make apps for a copy of a test root (see `copy_root`).
+
+    Later apps share the copy and its saved environment, as in incremental
+    builds.
+    """
+    def make(testroot, buildername="html", **kwargs):
+        srcdir = copy_root(testroot)
+        return make_app(buildername, srcdir=srcdir, freshenv=False, **kwargs)
+
+    return make
@@ -0,0 +1,3 @@
+extensions = ['sphinx_probs_rdf']
+probs_rdf_system_prefix = "http://example.org/system/"
+probs_rdf_aggregate_recipes = True
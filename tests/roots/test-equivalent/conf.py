@@ -0,0 +1 @@
+extensions = ['sphinx_probs_rdf']
@@ -0,0 +1,2 @@
+extensions = ['sphinx_probs_rdf']
+probs_rdf_paths = ['vocab1.ttl', 'vocab2.ttl', 'vocab3.ttl']
@@ -0,0 +1,3 @@
+extensions = ['myst_nb', 'sphinx_probs_rdf']
+probs_rdf_system_prefix = "http://example.org/system/"
+exclude_patterns = ['_build']
@@ -0,0 +1,2 @@
+extensions = ['sphinx_probs_rdf']
+probs_rdf_system_prefix = "http://example.org/system/"
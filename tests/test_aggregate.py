@@ -0,0 +1,111 @@
+import pytest
+
+from rdflib import Literal, Namespace
+from sphinx_probs_rdf.aggregate import aggregate_recipes
+from sphinx_probs_rdf.directives import PROBS_RECIPE, RecipeEntry
+from sphinx_probs_rdf.namespaces import PROBS_RDF
+from sphinx_probs_rdf.hierarchy import Hierarchy
+
+SYS = Namespace("http://example.org/system/")
+KG = "http://qudt.org/vocab/quantitykind/Mass"
+
+
+def _recipe(consumes=(), produces=()):
+    return [RecipeEntry(obj, "consumes", amount, KG) for obj, amount in consumes] + [
+        RecipeEntry(obj, "produces", amount, KG) for obj, amount in produces
+    ]
+
+
+def test_aggregate_recipes():
+    hierarchy = Hierarchy([
+        ("Root", "Steel"), ("Root", "Power"),
+        ("Steel", "Furnace"), ("Steel", "Casting"),
+    ])
+    recipes = {
+        "Furnace": _recipe([("Ore", 2.0), ("Electricity", 1.0)], [("Pig", 1.0)]),
+        "Casting": _recipe([("Pig", 1.0)], [("Steel", 1.0), ("Slag", 0.1)]),
+        "Power": _recipe([("Coal", 3.0)], [("Electricity", 1.5)]),
+    }
+
+    result = aggregate_recipes(hierarchy, recipes)
+    assert result["Steel"] == _recipe(
+        [("Electricity", 1.0), ("Ore", 2.0)], [("Slag", 0.1), ("Steel", 1.0)]
+    )
+    # Internal flows cancel out, leaving net production of electricity
+    assert result["Root"] == _recipe(
+        [("Coal", 3.0), ("Ore", 2.0)],
+        [("Electricity", 0.5), ("Slag", 0.1), ("Steel", 1.0)],
+    )
+    assert "Furnace" not in result
+
+
+def test_aggregate_recipes_own_recipe_takes_precedence():
+    hierarchy = Hierarchy([("Root", "Parent"), ("Parent", "Child")])
+    recipes = {
+        "Parent": _recipe([("A", 1.0)]),
+        "Child": _recipe([("B", 5.0)]),
+    }
+    result = aggregate_recipes(hierarchy, recipes)
+    assert "Parent" not in result
+    assert result["Root"] == _recipe([("A", 1.0)])
+
+
+def test_aggregate_recipes_unquantified_recipe():
+    hierarchy = Hierarchy([
+        ("Root", "Parent"), ("Root", "Other"), ("Parent", "Child"),
+    ])
+    recipes = {
+        "Parent": [RecipeEntry("A", "consumes", None, None)],
+        "Child": _recipe([("B", 5.0)]),
+        "Other": _recipe([("C", 1.0)]),
+    }
+    result = aggregate_recipes(hierarchy, recipes)
+    # Parent's recipe has no amounts, so Child's flows are aggregated instead
+    assert result["Parent"] == _recipe([("B", 5.0)])
+    assert result["Root"] == _recipe([("B", 5.0), ("C", 1.0)])
+
+
+def test_aggregate_recipes_deep_hierarchy():
+    n = 100_000
+    edges = [("P%d" % i, "P%d" % (i + 1)) for i in range(n)]
+    edges += [("P%d" % i, "L%d" % i) for i in range(n)]
+    recipes = {"L%d" % i: _recipe([("Ore", 1.0)], [("Steel", 1.0)]) for i in range(n)}
+
+    result = aggregate_recipes(Hierarchy(edges), recipes)
+    assert result["P0"] == _recipe([("Ore", float(n))], [("Steel", float(n))])
+
+
+@pytest.mark.sphinx('probs_rdf', testroot='aggregate')
+def test_aggregate_recipes_in_output(app, status, warning):
+    app.builder.build_all()
+    from rdflib import Graph
+
+    g = Graph()
+    g.parse(app.outdir / "output.ttl", format="ttl")
+    # Aggregates are distinct from the recipes given in the source
+    assert g.value(SYS.Steelmaking, PROBS_RECIPE.hasRecipe) is None
+    recipe = g.value(SYS.Steelmaking, PROBS_RDF.hasAggregateRecipe)
+    assert recipe is not None
+    consumed = {
+        (g.value(item, PROBS_RECIPE.object), g.value(item, PROBS_RECIPE.quantity))
+        for item in g.objects(recipe, PROBS_RECIPE.consumes)
+    }
+    produced = {
+        (g.value(item, PROBS_RECIPE.object), g.value(item, PROBS_RECIPE.quantity))
+        for item in g.objects(recipe, PROBS_RECIPE.produces)
+    }
+    assert consumed == {(SYS.IronOre, Literal(2.0))}
+    assert produced == {(SYS.Steel, Literal(1.0))}
+
+    # The environment's graph is left unchanged
+    domain = app.env.get_domain("system")
+    assert domain.graph.value(SYS.Steelmaking, PROBS_RDF.hasAggregateRecipe) is None
+
+
+@pytest.mark.sphinx('html', testroot='aggregate')
+def test_aggregate_recipes_in_html(app, status, warning):
+    app.builder.build_all()
+    html = (app.outdir / "index.html").read_text()
+    assert "Aggregate consumes:" in html
+    assert "Aggregate produces:" in html
+    assert html.count("Aggregate consumes:") == 1
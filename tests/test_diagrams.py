@@ -0,0 +1,159 @@
+import os
+import re
+
+import pytest
+
+from sphinx_probs_rdf import diagrams
+from sphinx_probs_rdf.diagrams import DiagramSpec, diagram_spec, render_svg
+
+SYS = "http://example.org/system/"
+
+
+def test_render_svg():
+    spec = DiagramSpec(
+        "Casting",
+        ("Steelmaking",),
+        (),
+        (("PigIron", "1"),),
+        tuple(("Product%d" % i, "") for i in range(12)),
+    )
+    svg = render_svg(spec)
+    assert svg.startswith("<svg ")
+    assert ">Casting</text>" in svg
+    assert ">Steelmaking</text>" in svg
+    assert ">1</text>" in svg
+    # Long lists are summarised
+    assert ">Product6</text>" in svg
+    assert ">Product7</text>" not in svg
+    assert ">… 5 more</text>" in svg
+
+
+def test_diagram_key():
+    spec = DiagramSpec("A", (), (), (("B", "1"),), ())
+    assert spec.key() == DiagramSpec("A", (), (), (("B", "1"),), ()).key()
+    assert spec.key() != DiagramSpec("A", (), (), (("B", "2"),), ()).key()
+
+
+class _View:
+    def __init__(self, children, recipe):
+        self._children = children
+        self._recipe = recipe
+
+    def labels(self, uri):
+        return (uri.rsplit("/", 1)[1],)
+
+    def parents(self, kind, uri):
+        return []
+
+    def children(self, kind, uri):
+        return self._children
+
+    def recipe(self, uri):
+        return self._recipe
+
+
+def test_diagram_spec_order():
+    children = [SYS + "B", SYS + "C", SYS + "A"]
+    rows = [
+        {"object": SYS + "Y", "amount": 2.0, "metric": "Mass"},
+        {"object": SYS + "X", "amount": 0.5, "metric": "Mass"},
+    ]
+    spec = diagram_spec(_View(children, {"consumes": rows}), SYS + "P")
+    assert spec.children == ("A", "B", "C")
+    # Amounts are shown without the quantity kind
+    assert spec.consumes == (("X", "0.5"), ("Y", "2"))
+
+    reversed_view = _View(children[::-1], {"consumes": rows[::-1]})
+    assert diagram_spec(reversed_view, SYS + "P").key() == spec.key()
+
+
+@pytest.mark.sphinx(
+    'html', testroot='aggregate', freshenv=True,
+    confoverrides={'probs_rdf_process_diagrams': True})
+def test_process_diagrams(app, status, warning, monkeypatch):
+    app.build(force_all=True)
+
+    html = (app.outdir / "index.html").read_text()
+    keys = re.findall(r'src="_images/probs_rdf/([0-9a-f]+)\.svg"', html)
+    assert len(keys) == 3  # Steelmaking, BlastFurnace, Casting
+    outdir = app.outdir / "_images" / "probs_rdf"
+    for key in keys:
+        assert os.path.exists(outdir / (key + ".svg"))
+    assert "rendered 3 process diagrams" in status.getvalue()
+
+    # Aggregate recipe of Steelmaking, without the internal PigIron flow
+    svgs = [(outdir / (key + ".svg")).read_text() for key in keys]
+    assert any(
+        ">sys:IronOre</text>" in svg and ">sys:Steel</text>" in svg
+        and "PigIron" not in svg
+        for svg in svgs
+    )
+    assert any('class="amount"' in svg and '">2</text>' in svg for svg in svgs)
+
+    # Existing diagrams are not rendered again
+    rendered = []
+    monkeypatch.setattr(diagrams, "_render_file", rendered.append)
+    app.build(force_all=True)
+    assert rendered == []
+
+
+def test_unused_diagrams_removed(make_copied_app):
+    confoverrides = {"probs_rdf_process_diagrams": True}
+    app = make_copied_app("aggregate", confoverrides=confoverrides)
+    app.build()
+    outdir = app.outdir / "_images" / "probs_rdf"
+    before = {f for f in os.listdir(outdir) if f.endswith(".svg")}
+    assert len(before) == 3
+
+    # Casting now produces twice as much, changing its diagram and its
+    # parent's, but not BlastFurnace's
+    index = app.srcdir / "index.rst"
+    index.write_text(index.read_text().replace("Steel, amount: 1", "Steel, amount: 2"))
+    app = make_copied_app("aggregate", confoverrides=confoverrides)
+    app.build()
+    after = {f for f in os.listdir(outdir) if f.endswith(".svg")}
+    assert len(after) == 3
+    assert len(before & after) == 1
+    assert "removed 2 unused process diagrams" in app._status.getvalue()
+
+
+def _diagram_keys(app):
+    keys = {}
+    for docname in app.env.found_docs:
+        html = (app.outdir / (docname + ".html")).read_text()
+        keys[docname] = re.findall(r'src="_images/probs_rdf/([0-9a-f]+)\.svg"', html)
+    return keys
+
+
+def test_diagram_keys_parallel(make_app, tmp_path):
+    from sphinx.testing.path import path
+
+    # Children of Steelmaking are defined in separate documents, which are
+    # merged in a different order when read in parallel
+    docs = ["doc%d" % i for i in range(8)]
+    keys = []
+    for parallel in (1, 2):
+        srcdir = path(str(tmp_path / ("j%d" % parallel)))
+        srcdir.makedirs()
+        (srcdir / "conf.py").write_text(
+            "extensions = ['sphinx_probs_rdf']\n"
+            "probs_rdf_system_prefix = %r\n"
+            "probs_rdf_process_diagrams = True\n" % SYS
+        )
+        (srcdir / "index.rst").write_text(
+            "Index\n=====\n\n.. toctree::\n\n%s\n\n"
+            ".. system:process:: Steelmaking\n    :composed_of: %s\n"
+            % ("\n".join("   " + doc for doc in docs),
+               " ".join("Step%d" % (7 - i) for i in range(8)))
+        )
+        for i, doc in enumerate(docs):
+            (srcdir / (doc + ".rst")).write_text(
+                "Doc %d\n======\n\n.. system:process:: Step%d\n"
+                "    :consumes: {object: Input%d, amount: %d, unit: kg}\n"
+                % (i, i, i, i + 1)
+            )
+        app = make_app("html", srcdir=srcdir, parallel=parallel)
+        app.build()
+        keys.append(_diagram_keys(app))
+    assert keys[0] == keys[1]
+    assert len(keys[0]["index"]) == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from rdflib import BNode, Graph, Literal, Namespace, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import XSD
+from sphinx_probs_rdf import load
+from sphinx_probs_rdf.dump import write_dump
+from sphinx_probs_rdf.dump import Literal as DumpLiteral
+
+SYS = Namespace("http://example.org/system/")
+
+
+def test_dump_round_trip(tmp_path):
+    g = Graph()
+    g.bind("sys", SYS)
+    node = BNode()
+    g.add((SYS.A, SYS.name, Literal("Ä", lang="de")))
+    g.add((SYS.A, SYS['count'], Literal(3)))
+    g.add((SYS.A, SYS.note, Literal("plain")))
+    g.add((SYS.A, SYS.part, node))
+    g.add((node, SYS.link, URIRef("http://example.org/système/B")))
+
+    write_dump(g, str(tmp_path / "g.rdfbin"))
+    with load(str(tmp_path / "g.rdfbin")) as data:
+        assert len(data) == 5
+        assert ("sys", str(SYS)) in data.namespaces
+        assert set(data.triples(str(SYS.A), str(SYS.name))) == {
+            (str(SYS.A), str(SYS.name), DumpLiteral("Ä", language="de"))
+        }
+        assert list(data.triples(p=str(SYS['count']))) == [
+            (str(SYS.A), str(SYS['count']), DumpLiteral("3", str(XSD.integer)))
+        ]
+        assert [s for s, _, _ in data.triples(o="http://example.org/système/B")] == [
+            "_:" + str(node)
+        ]
+        assert list(data.triples(str(SYS.Unknown))) == []
+        assert isomorphic(data.to_graph(), g)
+
+
+def test_load_not_a_dump(tmp_path):
+    (tmp_path / "output.ttl").write_text("@prefix : <#> .\n" * 10)
+    with pytest.raises(ValueError, match="not a system graph dump"):
+        load(str(tmp_path / "output.ttl"))
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='aggregate',
+    confoverrides={'probs_rdf_binary_output': True})
+def test_binary_output(app, status, warning):
+    app.builder.build_all()
+
+    with load(app.outdir / "output.rdfbin") as system:
+        assert system.processes() == [
+            str(SYS.BlastFurnace), str(SYS.Casting), str(SYS.Steelmaking)
+        ]
+        assert system.objects() == []  # only used in recipes here
+        assert system.label(str(SYS.Casting)) == "Casting"
+        assert system.children(str(SYS.Steelmaking)) == [
+            str(SYS.BlastFurnace), str(SYS.Casting)
+        ]
+        assert system.parents(str(SYS.Casting)) == [str(SYS.Steelmaking)]
+
+        recipe = system.recipe(str(SYS.BlastFurnace))
+        assert [(r["object"], r["amount"]) for r in recipe["consumes"]] == [
+            (str(SYS.IronOre), 2.0)
+        ]
+        # Aggregate recipes are kept apart
+        assert system.recipe(str(SYS.Steelmaking)) is None
+        aggregate = system.recipe(str(SYS.Steelmaking), aggregate=True)
+        assert [(r["object"], r["amount"]) for r in aggregate["consumes"]] == [
+            (str(SYS.IronOre), 2.0)
+        ]
+        assert system.recipe(str(SYS.Casting), aggregate=True) is None
+        assert system.usage(str(SYS.PigIron)) == {
+            "consumes": [str(SYS.Casting)],
+            "produces": [str(SYS.BlastFurnace)],
+        }
+
+        expected = Graph().parse(app.outdir / "output.ttl", format="ttl")
+        assert isomorphic(system.to_graph(), expected)
@@ -0,0 +1,88 @@
+import pytest
+
+from rdflib import Graph, Namespace
+from sphinx.errors import ConfigError
+from sphinx_probs_rdf.directives import PROBS
+from sphinx_probs_rdf.equivalence import EquivalenceClasses, UnionFind
+
+SYS = Namespace("http://example.org/system/")
+
+
+def test_union_find():
+    uf = UnionFind()
+    uf.union("a", "b")
+    uf.union("c", "d")
+    uf.union("b", "d")
+    uf.add("e")
+
+    assert uf.find("a") == uf.find("d")
+    assert uf.find("e") == "e"
+    assert uf.groups() == [["a", "b", "c", "d"]]
+
+
+def test_equivalence_classes():
+    classes = EquivalenceClasses([("b", "a"), ("c", "b"), ("x", "y")])
+
+    assert classes.classes == [["a", "b", "c"], ["x", "y"]]
+    assert classes.members("c") == ["a", "b", "c"]
+    assert classes.representative("c") == "a"
+    assert classes.members("z") == ["z"]
+    assert len(classes) == 2
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='equivalent',
+    confoverrides={
+        'probs_rdf_system_prefix': str(SYS),
+        'probs_rdf_materialize_equivalence': 'closure',
+    })
+def test_materialize_equivalence_closure(app, status, warning):
+    app.builder.build_all()
+
+    g = Graph()
+    g.parse(app.outdir / 'output.ttl', format='ttl')
+    objects = [SYS.Steel, SYS.SteelProduct, SYS.FerrousMetal]
+    for a in objects:
+        for b in objects:
+            if a != b:
+                assert (a, PROBS.objectEquivalentTo, b) in g
+
+    # The environment's graph is left as it was
+    domain = app.env.get_domain("system")
+    assert (SYS.FerrousMetal, PROBS.objectEquivalentTo, SYS.Steel) not in domain.graph
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='equivalent',
+    confoverrides={
+        'probs_rdf_system_prefix': str(SYS),
+        'probs_rdf_materialize_equivalence': 'representative',
+    })
+def test_materialize_equivalence_representative(app, status, warning):
+    app.builder.build_all()
+
+    g = Graph()
+    g.parse(app.outdir / 'output.ttl', format='ttl')
+    # FerrousMetal is first in sorted order
+    assert (SYS.Steel, PROBS.objectEquivalentTo, SYS.FerrousMetal) in g
+    assert (SYS.FerrousMetal, PROBS.objectEquivalentTo, SYS.Steel) in g
+    assert (SYS.SteelProduct, PROBS.objectEquivalentTo, SYS.Steel) not in g
+
+
+@pytest.mark.sphinx(
+    'html', testroot='equivalent',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_equivalent_objects_shown(app, status, warning):
+    app.builder.build_all()
+    content = (app.outdir / "index.html").read_text()
+
+    assert """<p>Equivalent to: <a class="reference internal" href="#http-example.org-system-FerrousMetal" title="http://example.org/system/FerrousMetal"><span>sys:FerrousMetal</span></a> <a class="reference internal" href="#http-example.org-system-SteelProduct" title="http://example.org/system/SteelProduct"><span>sys:SteelProduct</span></a></p>""" in content
+
+
+def test_materialize_equivalence_invalid_mode(make_copied_app):
+    with pytest.raises(ConfigError, match="probs_rdf_materialize_equivalence"):
+        make_copied_app(
+            "equivalent",
+            "probs_rdf",
+            confoverrides={"probs_rdf_materialize_equivalence": "transitive"},
+        )
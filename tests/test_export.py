@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from rdflib import Graph, Namespace
+from sphinx_probs_rdf import export
+from sphinx_probs_rdf.namespaces import PROBS_RDF
+from sphinx_probs_rdf.export import ExportError
+
+SYS = Namespace("http://example.org/system/")
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    original = export.BackgroundExport
+
+    def background_export(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(export, "BackgroundExport", background_export)
+    monkeypatch.setattr(export, "_available_cpus", lambda: 2)
+    return calls
+
+
+@pytest.mark.sphinx('html', testroot='aggregate', freshenv=True)
+def test_background_export(app, status, warning, started):
+    app.build()
+
+    assert len(started) == 1
+    assert not os.path.exists(app.outdir / "output.ttl.part")
+    g = Graph().parse(app.outdir / "output.ttl", format="ttl")
+    assert g.value(SYS.Steelmaking, PROBS_RDF.hasAggregateRecipe) is not None
+
+    # The postprocessed triples were only added in the exporting process
+    domain = app.env.get_domain("system")
+    assert domain.graph.value(SYS.Steelmaking, PROBS_RDF.hasAggregateRecipe) is None
+    assert "export" not in domain.caches
+
+
+OUTPUTS = {
+    'probs_rdf_binary_output': True,
+    'probs_rdf_jsonld_output': True,
+    'probs_rdf_stats': True,
+}
+OUTPUT_FILES = ["output.ttl", "output.rdfbin", "output.jsonld"]
+
+
+@pytest.mark.sphinx('html', testroot='aggregate', freshenv=True,
+                    confoverrides=OUTPUTS)
+def test_background_export_all_outputs(app, status, warning, started):
+    app.build()
+
+    assert len(started) == 1
+    assert not [name for name in os.listdir(app.outdir) if name.endswith(".part")]
+    for name in OUTPUT_FILES:
+        assert os.path.exists(app.outdir / name)
+
+
+@pytest.mark.sphinx(
+    'html', testroot='aggregate',
+    confoverrides={'probs_rdf_background_export': False})
+def test_background_export_disabled(app, status, warning, started):
+    app.build()
+
+    assert started == []
+    g = Graph().parse(app.outdir / "output.ttl", format="ttl")
+    assert g.value(SYS.Steelmaking, PROBS_RDF.hasAggregateRecipe) is not None
+
+
+@pytest.mark.sphinx('html', testroot='aggregate', freshenv=True)
+def test_background_export_one_cpu(app, status, warning, monkeypatch, started):
+    monkeypatch.setattr(export, "_available_cpus", lambda: 1)
+    app.build()
+
+    assert started == []
+    assert os.path.exists(app.outdir / "output.ttl")
+
+
+@pytest.mark.sphinx('html', testroot='aggregate', freshenv=True,
+                    confoverrides=OUTPUTS)
+def test_background_export_error(app, status, warning, monkeypatch):
+    for name in OUTPUT_FILES:
+        if os.path.exists(app.outdir / name):
+            os.remove(app.outdir / name)
+
+    def write_graph(env, outdir, suffix=""):
+        with open(os.path.join(outdir, "output.jsonld" + suffix), "w") as f:
+            f.write("{")
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(export, "_available_cpus", lambda: 2)
+    monkeypatch.setattr(export, "write_graph", write_graph)
+    with pytest.raises(ExportError, match="disk full"):
+        app.build()
+    for name in OUTPUT_FILES:
+        assert not os.path.exists(app.outdir / name)
+        assert not os.path.exists(app.outdir / (name + ".part"))
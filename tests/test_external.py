@@ -0,0 +1,60 @@
+import pytest
+
+from rdflib import BNode, ConjunctiveGraph, Literal, Namespace, URIRef
+from rdflib.namespace import RDFS
+from sphinx_probs_rdf.external import add_parsed_file, parse_file, parse_files
+
+SYS = Namespace("http://example.org/system/")
+VOCAB2 = Namespace("http://example.org/vocab2/")
+
+
+def _quads(graph):
+    return {
+        (s, p, o, c.identifier)
+        for s, p, o, c in graph.quads((None, None, None))
+        if not isinstance(s, BNode) and not isinstance(o, BNode)
+    }
+
+
+def test_add_parsed_file_matches_parse(rootdir):
+    location = str(rootdir / "test-external" / "vocab2.ttl")
+    expected = ConjunctiveGraph()
+    expected.parse(location=location, format="ttl")
+
+    g = ConjunctiveGraph()
+    g.get_context(URIRef("file://" + location)).add((VOCAB2.Old, RDFS.label, Literal("x")))
+    add_parsed_file(g, parse_file(location))
+
+    assert _quads(g) == _quads(expected)
+    assert len(g) == len(expected)
+    assert dict(g.namespaces()) == dict(expected.namespaces())
+
+
+def test_parse_files_in_order(rootdir):
+    locations = [
+        str(rootdir / "test-external" / name)
+        for name in ("vocab3.ttl", "vocab1.ttl", "vocab2.ttl")
+    ]
+    serial = list(parse_files(locations))
+    parallel = list(parse_files(locations, nproc=2))
+    assert [p.identifier for p in parallel] == [p.identifier for p in serial]
+    assert [p.bindings for p in parallel] == [p.bindings for p in serial]
+    assert [p.identifier.rsplit("/", 1)[1] for p in serial] == [
+        "vocab3.ttl", "vocab1.ttl", "vocab2.ttl"
+    ]
+
+
+@pytest.mark.parametrize("parallel", [1, 2])
+def test_build_with_external_files(make_copied_app, parallel):
+    app = make_copied_app(
+        "external", "probs_rdf", parallel=parallel,
+        confoverrides={"probs_rdf_system_prefix": str(SYS)},
+    )
+    app.build()
+
+    domain = app.env.get_domain("system")
+    g = domain.graph
+    assert g.value(VOCAB2.Thing, RDFS.label) == Literal("Thing 2", lang="en")
+    assert len(list(g.contexts())) == 4  # index, and one per file
+    assert ("v2", URIRef(VOCAB2)) in list(g.namespaces())
+    assert len(domain.external_sources) == 3
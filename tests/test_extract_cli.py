@@ -0,0 +1,84 @@
+import pytest
+
+from rdflib import Graph, Namespace, Literal
+from rdflib.namespace import RDF, RDFS
+from sphinx_probs_rdf.cli import main
+from sphinx_probs_rdf.directives import PROBS, PROBS_RECIPE
+
+SYS = Namespace("http://example.org/system/")
+
+
+@pytest.fixture
+def srcdir(copy_root):
+    return copy_root("basic")
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_extract(srcdir, tmp_path, jobs):
+    outdir = tmp_path / "out"
+    status = main([
+        "extract", str(srcdir), str(outdir), "-q", "-j", jobs,
+        "-D", "probs_rdf_system_prefix=" + str(SYS),
+    ])
+    assert status == 0
+
+    g = Graph()
+    g.parse(outdir / "output.ttl", format="ttl")
+
+    assert (SYS.P1, RDF.type, PROBS.Process) in g
+    assert (SYS.P1, RDFS.label, Literal("Making crumble")) in g
+    assert (SYS.P1, PROBS.consumes, SYS.Apples) in g
+    assert (SYS.ParentOfP1P2, PROBS.processComposedOf, SYS.P1) in g
+    assert (SYS.AnotherParentOfP1P2, PROBS.processComposedOf, SYS.P2) in g
+    assert (SYS.Obj1, RDF.type, PROBS.ReferenceObject) in g
+
+
+def test_extract_matches_builder(rootdir, tmp_path):
+    from rdflib.compare import isomorphic
+    from sphinx.cmd.build import build_main
+
+    srcdir = rootdir / "test-myst"
+    defines = ["-D", "probs_rdf_system_prefix=" + str(SYS)]
+    assert main(["extract", str(srcdir), str(tmp_path / "a"), "-q"] + defines) == 0
+    assert build_main(
+        ["-q", "-b", "probs_rdf", str(srcdir), str(tmp_path / "b")] + defines
+    ) == 0
+
+    g1 = Graph().parse(tmp_path / "a" / "output.ttl", format="ttl")
+    g2 = Graph().parse(tmp_path / "b" / "output.ttl", format="ttl")
+    assert g1.value(SYS.P1, PROBS_RECIPE.hasRecipe) is not None
+    assert isomorphic(g1, g2)
+
+
+def test_watch_rebuilds_changed_files(srcdir, tmp_path, capsys):
+    import os
+    from sphinx.util.docutils import docutils_namespace
+    from sphinx_probs_rdf.cli import Watcher, build_parser, make_app
+
+    outdir = tmp_path / "out"
+    args = build_parser().parse_args(["watch", str(srcdir), str(outdir), "-q"])
+    with docutils_namespace():
+        app = make_app(args, {"probs_rdf_system_prefix": str(SYS)})
+        watcher = Watcher(app)
+        watcher.build()
+        assert watcher.poll() is False
+        capsys.readouterr()
+
+        index = srcdir / "index.rst"
+        with open(index, "a") as f:
+            f.write("\n.. system:process:: P3\n    :consumes: Crumble\n")
+        mtime = os.stat(index).st_mtime + 10
+        os.utime(index, (mtime, mtime))
+        assert watcher.poll() is True
+        # Quiet
+        assert capsys.readouterr().out == ""
+
+        g = Graph().parse(outdir / "output.ttl", format="ttl")
+        assert (SYS.P3, PROBS.consumes, SYS.Crumble) in g
+        # Postprocessing was applied to the output but not the kept graph
+        assert (SYS.AnotherParentOfP1P2, PROBS.processComposedOf, SYS.P1) in g
+        domain = app.env.get_domain("system")
+        assert (
+            SYS.AnotherParentOfP1P2, PROBS.processComposedOfChildrenOf,
+            SYS.ParentOfP1P2,
+        ) in domain.graph
@@ -0,0 +1,50 @@
+from rdflib import Graph, Namespace
+from rdflib.namespace import RDF
+
+from sphinx_probs_rdf.hierarchy import Hierarchy, build_hierarchy
+from sphinx_probs_rdf.directives import PROBS
+
+SYS = Namespace("http://example.org/system/")
+
+
+def test_hierarchy_closure():
+    h = Hierarchy([("A", "B"), ("A", "C"), ("B", "D"), ("C", "D"), ("D", "E")])
+
+    assert h.parents("D") == ["B", "C"]
+    assert h.children("A") == ["B", "C"]
+    assert h.ancestors("E") == {"A", "B", "C", "D"}
+    assert h.descendants("A") == {"B", "C", "D", "E"}
+    assert h.count_descendants("B") == 2
+    assert h.count_descendants("E") == 0
+    assert h.is_ancestor("A", "E")
+    assert not h.is_ancestor("E", "A")
+    assert h.roots() == ["A"]
+    assert h.breadcrumb("E") == ["A", "B", "D"]
+    assert h.breadcrumb("A") == []
+    assert h.ancestors("unknown") == set()
+
+
+def test_hierarchy_with_cycle():
+    h = Hierarchy([("A", "B"), ("B", "C"), ("C", "B"), ("C", "D")])
+
+    assert h.ancestors("D") == {"A", "B", "C"}
+    assert h.descendants("A") == {"B", "C", "D"}
+    assert h.descendants("B") == {"C", "D"}
+    assert h.breadcrumb("D") == ["A", "B", "C"]
+
+
+def test_build_hierarchy_expands_children_of():
+    g = Graph()
+    g.add((SYS.P1, RDF.type, PROBS.Process))
+    g.add((SYS.P1, PROBS.processComposedOf, SYS.P1a))
+    g.add((SYS.P1, PROBS.processComposedOf, SYS.P1b))
+    g.add((SYS.P2, PROBS.processComposedOfChildrenOf, SYS.P1))
+    g.add((SYS.O1, PROBS.objectComposedOf, SYS.O2))
+
+    processes = build_hierarchy(g, "process")
+    assert processes.children(SYS.P2) == [SYS.P1a, SYS.P1b]
+    assert processes.parents(SYS.P1a) == [SYS.P1, SYS.P2]
+    assert SYS.O1 not in processes.nodes
+
+    objects = build_hierarchy(g, "object")
+    assert objects.descendants(SYS.O1) == {SYS.O2}
@@ -0,0 +1,37 @@
+import pytest
+
+
+@pytest.mark.sphinx(
+    'html', testroot='query',
+    confoverrides={'probs_rdf_index_page_size': 1})
+def test_paginated_process_index(app, status, warning):
+    app.build()
+
+    landing = (app.outdir / "system-processindex.html").read_text()
+    assert 'href="system-processindex-1.html#cap-A"' in landing
+    assert 'href="system-processindex-2.html#cap-B"' in landing
+    assert '.html#"' not in landing
+    assert "index.html#http-example.org-system-BlastFurnace" not in landing
+
+    page1 = (app.outdir / "system-processindex-1.html").read_text()
+    assert "Process Index: ArcFurnace" in page1
+    assert 'id="cap-A"' in page1
+    assert "other.html#http-example.org-system-ArcFurnace" in page1
+    assert "BlastFurnace" not in page1
+
+    page2 = (app.outdir / "system-processindex-2.html").read_text()
+    assert "index.html#http-example.org-system-BlastFurnace" in page2
+
+
+@pytest.mark.sphinx('html', testroot='query')
+def test_process_index_single_page(app, status, warning):
+    app.build()
+
+    domain = app.env.get_domain("system")
+    assert [uri.rsplit("/", 1)[1] for uri, _ in domain.get_things_by_type("process")] \
+        == ["ArcFurnace", "BlastFurnace"]
+
+    html = (app.outdir / "system-processindex.html").read_text()
+    assert "other.html#http-example.org-system-ArcFurnace" in html
+    assert "index.html#http-example.org-system-BlastFurnace" in html
+    assert html.index("ArcFurnace") < html.index("BlastFurnace")
@@ -0,0 +1,115 @@
+import io
+
+from sphinx_probs_rdf.inventory import (
+    ExternalThing,
+    InventoryEntry,
+    dump_inventory,
+    find_external,
+    parse_inventory,
+)
+
+SYS = "http://example.org/system/"
+STEEL_URL = "https://example.org/steel/"
+
+
+def test_inventory_round_trip():
+    entries = {
+        SYS + "P1": InventoryEntry(
+            "process", "Making\tcrumble", "a/b", "p1", "a/b.html#p1"
+        ),
+        SYS + "Obj1": InventoryEntry(
+            "object", "Object 1", "index", "o1", "index.html#o1"
+        ),
+    }
+    f = io.BytesIO()
+    dump_inventory(f, entries, "Project")
+    data = f.getvalue()
+    assert data.startswith(b"# PRObs RDF inventory version 1\n# Project: Project\n")
+
+    result = parse_inventory(data)
+    assert result[SYS + "Obj1"] == entries[SYS + "Obj1"]
+    assert result[SYS + "P1"].label == "Making crumble"
+
+
+class _Domain:
+    def __init__(self, things):
+        self.things = things
+
+    def get_external_things(self):
+        return self.things
+
+
+def test_find_external():
+    steel = ExternalThing("steel", "process", "Steel", STEEL_URL + "#steel")
+    other = ExternalThing("other", "process", "Steel", "other.html#steel")
+    obj = ExternalThing("steel", "object", "Steel", STEEL_URL + "#steel-object")
+    domain = _Domain({
+        SYS + "Steel": steel,
+        SYS + "sub/Steel": other,
+        SYS + "objects/Steel": obj,
+    })
+
+    # An exact match is preferred to those ending with the name
+    assert find_external(domain, SYS + "Steel") == [(SYS + "Steel", steel)]
+    assert find_external(domain, "Steel", ["process"]) == [
+        (SYS + "Steel", steel), (SYS + "sub/Steel", other)
+    ]
+    assert find_external(domain, SYS + "Steel", ["object"]) == []
+    assert find_external(domain, "Steel", ["object"]) == [
+        (SYS + "objects/Steel", obj)
+    ]
+
+
+CONF = """\
+extensions = ['sphinx_probs_rdf']
+probs_rdf_system_prefix = "http://example.org/system/"
+probs_rdf_check_references = ["processes"]
+probs_rdf_inventories = {"steel": (%r, %r)}
+"""
+
+INDEX = """\
+Foundry
+=======
+
+.. system:process:: Foundry
+    :composed_of: Casting Moulding
+
+See :system:ref:`BlastFurnace` and :system:ref:`ing`.
+"""
+
+
+def test_external_references(make_app, make_copied_app, tmp_path):
+    from sphinx.testing.path import path
+
+    # The project defining the processes
+    app = make_copied_app("aggregate")
+    app.build()
+    inventory = app.outdir / "probs_rdf.inv"
+    assert inventory.exists()
+
+    srcdir = path(str(tmp_path / "foundry"))
+    srcdir.makedirs()
+    (srcdir / "conf.py").write_text(CONF % (STEEL_URL, str(inventory)))
+    (srcdir / "index.rst").write_text(INDEX)
+    app = make_app("html", srcdir=srcdir)
+    app.build()
+
+    html = (app.outdir / "index.html").read_text()
+    assert (
+        'href="%sindex.html#http-example.org-system-BlastFurnace"' % STEEL_URL
+    ) in html
+    # In the composition table
+    assert 'href="%sindex.html#http-example.org-system-Casting"' % STEEL_URL in html
+    warnings = app._warning.getvalue()
+    assert "Casting is not defined" not in warnings
+    assert "Moulding is not defined" in warnings
+    assert (
+        "more than one target found for cross-reference 'ing': %sCasting, "
+        "%sSteelmaking" % (SYS, SYS)
+    ) in warnings
+    assert "loaded system inventory 'steel' (3 things)" in app._status.getvalue()
+
+    # The inventory is cached in the environment until it changes
+    app = make_app("html", srcdir=srcdir, freshenv=False)
+    app.build()
+    assert "loaded system inventory" not in app._status.getvalue()
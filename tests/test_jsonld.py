@@ -0,0 +1,99 @@
+import io
+import json
+
+import pytest
+
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, Namespace
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF, XSD
+from sphinx_probs_rdf.jsonld import write_jsonld
+
+SYS = Namespace("http://example.org/system/")
+PROBS = "http://w3id.org/probs-lab/ontology#"
+CONTEXT = {"sys": str(SYS), "probs": PROBS, "xsd": str(XSD)}
+
+
+def _write(g):
+    f = io.StringIO()
+    write_jsonld(g, f, CONTEXT)
+    return f.getvalue()
+
+
+def test_jsonld_literals_and_nesting():
+    g = Graph()
+    item, a, b = BNode(), BNode(), BNode()
+    g.add((SYS.P, RDF.type, SYS.Process))
+    g.add((SYS.P, SYS.item, item))
+    g.add((item, SYS.amount, Literal(2.0)))
+    g.add((item, SYS["count"], Literal(3)))
+    g.add((item, SYS.name, Literal("Eisen", lang="de")))
+    g.add((item, SYS.when, Literal("2020", datatype=XSD.gYear)))
+    # Blank nodes referred to twice, or only from each other
+    g.add((SYS.P, SYS.shared, a))
+    g.add((SYS.Q, SYS.shared, a))
+    g.add((b, SYS.next, BNode()))
+
+    text = _write(g)
+    data = json.loads(text)
+    p = data["@graph"][0]
+    assert p["@id"] == "sys:P"
+    assert p["@type"] == "sys:Process"
+    assert p["sys:item"] == {
+        "sys:amount": {"@value": 2.0, "@type": "xsd:double"},
+        "sys:count": 3,
+        "sys:name": {"@value": "Eisen", "@language": "de"},
+        "sys:when": {"@value": "2020", "@type": "xsd:gYear"},
+    }
+    assert p["sys:shared"] == {"@id": "_:" + str(a)}
+    # One node per line
+    assert len(text.splitlines()) == len(data["@graph"]) + 3
+
+    assert isomorphic(Graph().parse(data=text, format="json-ld"), g)
+
+
+def test_jsonld_booleans():
+    g = Graph()
+    for i, value in enumerate(["true", "1", "false", "0", "yes"]):
+        literal = Literal(value, datatype=XSD.boolean, normalize=False)
+        g.add((SYS.P, SYS["flag%d" % i], literal))
+
+    p = json.loads(_write(g))["@graph"][0]
+    assert [p["sys:flag%d" % i] for i in range(4)] == [True, True, False, False]
+    # Not a boolean: kept as it was
+    assert p["sys:flag4"] == {"@value": "yes", "@type": "xsd:boolean"}
+
+
+def test_jsonld_non_finite_doubles():
+    g = Graph()
+    for i, value in enumerate(["NaN", "INF", "-INF", "1e3"]):
+        literal = Literal(value, datatype=XSD.double, normalize=False)
+        g.add((SYS.P, SYS["x%d" % i], literal))
+
+    # Strict JSON: no bare NaN or Infinity
+    p = json.loads(_write(g), parse_constant=pytest.fail)["@graph"][0]
+    assert [p["sys:x%d" % i] for i in range(4)] == [
+        {"@value": "NaN", "@type": "xsd:double"},
+        {"@value": "INF", "@type": "xsd:double"},
+        {"@value": "-INF", "@type": "xsd:double"},
+        {"@value": 1000.0, "@type": "xsd:double"},
+    ]
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='aggregate',
+    confoverrides={'probs_rdf_jsonld_output': True})
+def test_jsonld_output(app, status, warning):
+    app.builder.build_all()
+
+    with open(app.outdir / "output.jsonld", encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["@context"]["sys"] == str(SYS)
+    assert data["@context"]["rec"] == "http://w3id.org/probs-lab/process-recipe#"
+    ids = [node["@id"] for node in data["@graph"]]
+    assert ids[:2] == ["sys:BlastFurnace", "sys:Casting"]
+
+    expected = ConjunctiveGraph()
+    expected.parse(app.outdir / "output.ttl", format="ttl")
+    with open(app.outdir / "output.jsonld", encoding="utf-8") as f:
+        actual = Graph().parse(data=f.read(), format="json-ld")
+    assert isomorphic(actual, expected)
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+
+def _imported_modules(code, cwd=None):
+    """Run `code` in a fresh interpreter and list the modules it imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def _heavy(modules):
+    return sorted(m for m in modules if m.split(".")[0] in ("rdflib", "yaml"))
+
+
+def test_import_does_not_load_rdflib():
+    modules = _imported_modules("import sphinx_probs_rdf")
+    assert "sphinx_probs_rdf" in modules
+    assert _heavy(modules) == []
+
+
+def test_html_build_without_system_domain_does_not_load_rdflib(tmp_path):
+    (tmp_path / "conf.py").write_text("extensions = ['sphinx_probs_rdf']\n")
+    (tmp_path / "index.rst").write_text("Plain\n=====\n\nNo system here.\n")
+    code = (
+        "from sphinx.cmd.build import build_main; "
+        "assert build_main(['-q', '-b', 'html', '.', '_build']) == 0"
+    )
+    modules = _imported_modules(code, cwd=tmp_path)
+    assert "sphinx_probs_rdf.directives" in modules
+    assert _heavy(modules) == []
+    assert not (tmp_path / "_build" / "output.ttl").exists()
+
+
+def test_load_does_not_import_sphinx():
+    modules = _imported_modules("from sphinx_probs_rdf import load")
+    assert "sphinx_probs_rdf.dump" in modules
+    assert "sphinx" not in modules
+    assert _heavy(modules) == []
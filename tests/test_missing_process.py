@@ -15,3 +15,17 @@ def test_builder_reports_warning_for_missing_process(app, status, warning):
     assert "build succeeded" not in status.getvalue()
     warnings = warning.getvalue().strip()
     assert 'ERROR: Requested child "http://example.org/system/Missing" of "http://example.org/system/ErrorMissingProcess" is not a Process' in warnings
+
+
+@pytest.mark.sphinx(
+    'html', testroot='missing',
+    confoverrides={'probs_rdf_system_prefix': str(SYS), 'nitpicky': True})
+def test_missing_object_in_recipe_table_nitpicky(app, status, warning):
+    app.builder.build_all()
+
+    # Links in recipe tables to things not found are reported like any other
+    # missing reference
+    warnings = warning.getvalue()
+    assert "reference target not found: %s" % SYS.MissingObject in warnings
+    content = (app.outdir / "index.html").read_text()
+    assert "sys:MissingObject" in content
@@ -0,0 +1,45 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("myst_nb")
+
+from rdflib import Graph, Namespace  # noqa: E402
+from rdflib.namespace import RDF  # noqa: E402
+from sphinx_probs_rdf.directives import PROBS  # noqa: E402
+
+SYS = Namespace("http://example.org/system/")
+
+
+def _app(make_copied_app, builder="probs_rdf"):
+    return make_copied_app(
+        "notebook", builder,
+        confoverrides={"probs_rdf_skip_notebook_outputs": True},
+    )
+
+
+def test_skip_notebook_outputs(make_copied_app):
+    app = _app(make_copied_app)
+    app.build()
+    assert app.env.mystnb_config.execution_mode == "off"
+    g = Graph()
+    g.parse(app.outdir / "output.ttl", format="ttl")
+    assert (SYS.Baking, RDF.type, PROBS.Process) in g
+    assert "saved output" not in app.env.get_doctree("index").astext()
+    domain = app.env.get_domain("system")
+    assert list(domain.notebook_digests) == ["index"]
+
+    # Touched but unchanged: not read again
+    later = time.time() + 10
+    os.utime(app.srcdir / "index.ipynb", (later, later))
+    app = _app(make_copied_app)
+    app.build()
+    assert "0 added, 0 changed, 0 removed" in app._status.getvalue()
+
+    # Other builders read it again in full
+    app = _app(make_copied_app, "html")
+    app.build()
+    assert "0 added, 1 changed, 0 removed" in app._status.getvalue()
+    assert "saved output" in (app.outdir / "index.html").read_text()
+    assert not app.env.get_domain("system").notebook_digests
@@ -108,3 +108,88 @@ def test_recipe_output(app, status, warning):
 <tr class="row-odd"><td><p><a class="reference internal" href="#object-Blackberries" title="object-Blackberries"><span>Blackberries</span></a></p></td>
 <td><code class="docutils literal notranslate"><span class="pre">0.3</span> <span class="pre">kg</span></code></td>
 </tr>""" in content
+
+
+@pytest.mark.sphinx(
+    'singlehtml', testroot='myst',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_recipe_links_singlehtml(app, status, warning):
+    app.builder.build_all()
+    content = (app.outdir / "index.html").read_text()
+
+    # Links are rewritten to fragments of the single page, as usual
+    assert 'href="#http-example.org-system-Apples"' in content
+    assert "#document-index#" not in content
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='myst',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_object_usage_index(app, status, warning):
+    app.builder.build_all()
+    domain = app.env.get_domain("system")
+
+    usage = domain.get_object_usage(SYS.Apples)
+    assert [process for process, _ in usage] == [SYS.P1, SYS.P2, SYS.P3]
+    for _, entry in usage:
+        assert entry.direction == "consumes"
+        assert entry.amount == pytest.approx(0.7)
+        assert entry.metric == QUANTITYKIND.Mass
+
+    domain.clear_doc("index")
+    assert domain.object_usage == {}
+    assert domain.process_recipe == {}
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='myst',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_domain_data_shares_uris(app, status, warning):
+    app.builder.build_all()
+    domain = app.env.get_domain("system")
+
+    entries = [entry for _, entry in domain.get_object_usage(SYS.Apples)]
+    assert len(entries) == 3
+    # The same instances, so they are pickled once
+    assert all(entry.object is entries[0].object for entry in entries)
+    assert all(entry.metric is entries[0].metric for entry in entries)
+    processes = {uri: uri for uri in domain.things}
+    assert all(processes[p] is p for p in domain.object_usage[SYS.Apples])
+
+
+def test_domain_data_shares_uris_parallel(make_app, tmp_path):
+    from sphinx.testing.path import path
+
+    # Sphinx only reads in parallel with more than 5 documents
+    srcdir = path(str(tmp_path / "parallel"))
+    srcdir.makedirs()
+    (srcdir / "conf.py").write_text(
+        "extensions = ['sphinx_probs_rdf']\n"
+        "probs_rdf_system_prefix = %r\n" % str(SYS)
+    )
+    docs = ["doc%d" % i for i in range(8)]
+    (srcdir / "index.rst").write_text(
+        "Index\n=====\n\n.. toctree::\n\n" + "".join("   %s\n" % d for d in docs)
+    )
+    for i, doc in enumerate(docs):
+        # Each refers to the next, which may be read by another process
+        (srcdir / (doc + ".rst")).write_text(
+            "%s\n====\n\n.. system:process:: P%d\n"
+            "    :consumes: Apples = 0.7 kg\n"
+            "    :composed_of: P%d\n" % (doc, i, (i + 1) % len(docs))
+        )
+    app = make_app("probs_rdf", srcdir=srcdir, parallel=2)
+    app.build()
+    domain = app.env.get_domain("system")
+
+    entries = [entry for _, entry in domain.get_object_usage(SYS.Apples)]
+    assert len(entries) == 8
+    assert all(entry.object is entries[0].object for entry in entries)
+    assert all(entry.metric is entries[0].metric for entry in entries)
+    processes = {uri: uri for uri in domain.things}
+    assert all(processes[p] is p for p in domain.object_usage[SYS.Apples])
+    assert all(
+        processes[uri] is uri
+        for references in domain.references.values()
+        for _, uri in references
+    )
@@ -18,3 +18,32 @@ def test_probs_rdf_builder(app, status, warning):
 
     assert """
 <p>Parents: <a class="reference internal" href="#http-example.org-system-ParentOfP1P2" title="http://example.org/system/ParentOfP1P2"><span>sys:ParentOfP1P2</span></a></p>""" in content
+
+
+@pytest.mark.sphinx(
+    'html', testroot='basic',
+    confoverrides={
+        'probs_rdf_system_prefix': str(SYS),
+        'probs_rdf_show_ancestry': True,
+    })
+def test_process_ancestry(app, status, warning):
+    app.builder.build_all()
+    content = (app.outdir / "index.html").read_text()
+
+    assert """<p class="system-ancestry">Ancestry: <a class="reference internal" href="#http-example.org-system-AnotherParentOfP1P2" title="http://example.org/system/AnotherParentOfP1P2"><span>sys:AnotherParentOfP1P2</span></a></p>""" in content
+    assert """<p class="system-descendants">Descendants: 2</p>""" in content
+
+
+@pytest.mark.sphinx(
+    'html', testroot='myst',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_object_consumed_by(app, status, warning):
+    app.builder.build_all()
+    content = (app.outdir / "index.html").read_text()
+
+    apples = content[content.index('id="http-example.org-system-Apples"'):]
+    apples = apples[:apples.index('id="http-example.org-system-Blackberries"')]
+    assert "Consumed by: " in apples
+    assert "Produced by: " not in apples
+    for process in ["P1", "P2", "P3"]:
+        assert '<span>sys:%s</span>' % process in apples
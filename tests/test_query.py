@@ -0,0 +1,92 @@
+import pytest
+
+from sphinx_probs_rdf import query
+
+
+def _build(make_copied_app, **kwargs):
+    app = make_copied_app("query", **kwargs)
+    app.build()
+    return app
+
+
+@pytest.fixture
+def evaluated(monkeypatch):
+    calls = []
+    original = query.evaluate
+
+    def evaluate(graph, text):
+        calls.append(text)
+        return original(graph, text)
+
+    monkeypatch.setattr(query, "evaluate", evaluate)
+    return calls
+
+
+def test_query_table(make_copied_app, evaluated):
+    app = _build(make_copied_app)
+    html = (app.outdir / "queries.html").read_text()
+
+    assert 'class="steel-producers docutils align-default"' in html
+    assert "?process" in html and "?amount" in html
+    assert html.index("sys:ArcFurnace") < html.index("sys:BlastFurnace")
+    assert 'href="index.html#' in html
+    assert "No results" in html
+    assert len(evaluated) == 3
+
+    warnings = app._warning.getvalue()
+    assert "queries.rst:17: WARNING: SPARQL query failed" in warnings
+
+
+def test_query_cache(make_copied_app, evaluated):
+    app = _build(make_copied_app)
+    assert len(evaluated) == 3
+
+    # Unrelated change: the results are reused
+    index = app.srcdir / "index.rst"
+    index.write_text(index.read_text() + "\nMore text.\n")
+    app = _build(make_copied_app)
+    assert len(evaluated) == 3
+
+    # The graph changes: queries are evaluated again, and the page is
+    # written again even though it was not read again
+    other = app.srcdir / "other.rst"
+    other.write_text(other.read_text().replace("ArcFurnace", "InductionFurnace"))
+    app = _build(make_copied_app)
+    assert len(evaluated) == 6
+    html = (app.outdir / "queries.html").read_text()
+    assert "sys:InductionFurnace" in html
+    assert "sys:ArcFurnace" not in html
+
+
+def test_query_time_budget(make_copied_app):
+    app = _build(make_copied_app, confoverrides={"probs_rdf_query_time_budget": 0})
+    warnings = app._warning.getvalue()
+    assert "queries.rst:4: WARNING: SPARQL query took" in warnings
+
+
+def test_context_digest_blank_nodes():
+    from rdflib import BNode, Graph, Literal, Namespace
+
+    EX = Namespace("http://example.org/")
+
+    def recipe(amounts):
+        g = Graph()
+        for obj, amount in amounts:
+            item = BNode()
+            g.add((EX.recipe, EX.produces, item))
+            g.add((item, EX.object, obj))
+            g.add((item, EX.quantity, Literal(amount)))
+        return g
+
+    digest = query.context_digest(recipe([(EX.A, 1), (EX.B, 2)]))
+    assert query.context_digest(recipe([(EX.B, 2), (EX.A, 1)])) == digest
+    assert query.context_digest(recipe([(EX.A, 2), (EX.B, 1)])) != digest
+
+
+@pytest.mark.sphinx('text', testroot='query')
+def test_query_table_text(app, status, warning):
+    # Builders other than HTML get a docutils table
+    app.build()
+    text = (app.outdir / "queries.txt").read_text()
+    assert "| sys:ArcFurnace" in text
+    assert "| \"?process\"" in text
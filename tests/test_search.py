@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+
+@pytest.mark.sphinx(
+    'html', testroot='query',
+    confoverrides={'probs_rdf_search_index': True})
+def test_search_index(app, status, warning):
+    app.build()
+
+    with open(app.outdir / "_static" / "probs_rdf_search.json") as f:
+        index = json.load(f)
+    assert index["prefix"] == "http://example.org/system/"
+    assert index["docs"] == ["index.html", "other.html"]
+    assert index["things"] == [
+        ["ArcFurnace", "", 0, 1, "http-example.org-system-ArcFurnace"],
+        ["BlastFurnace", "", 0, 0, "http-example.org-system-BlastFurnace"],
+    ]
+
+    # Left out of Sphinx's own search index
+    searchindex = (app.outdir / "searchindex.js").read_text()
+    assert "ArcFurnace" not in searchindex.split('"objects":')[1].split('"objtypes"')[0]
+
+    assert (app.outdir / "_static" / "system-search.js").exists()
+    html = (app.outdir / "queries.html").read_text()
+    assert "system-search.js" in html
+    assert '<div class="system-search" role="search">' in html
+
+
+@pytest.mark.sphinx('html', testroot='query')
+def test_search_index_disabled(app, status, warning):
+    app.build()
+
+    assert "system-search.js" not in (app.outdir / "queries.html").read_text()
+    searchindex = (app.outdir / "searchindex.js").read_text()
+    assert "ArcFurnace" in searchindex.split('"objects":')[1].split('"objtypes"')[0]
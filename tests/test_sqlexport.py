@@ -0,0 +1,87 @@
+import sqlite3
+
+SYS = "http://example.org/system/"
+KG = "http://qudt.org/vocab/quantitykind/Mass"
+
+
+def _build(make_copied_app):
+    app = make_copied_app(
+        "query", "probs_rdf", confoverrides={"probs_rdf_sqlite_output": True}
+    )
+    app.build()
+    return app
+
+
+def _rows(app, sql):
+    conn = sqlite3.connect(app.outdir / "output.sqlite")
+    try:
+        return sorted(conn.execute(sql))
+    finally:
+        conn.close()
+
+
+def test_sqlite_output(make_copied_app):
+    app = _build(make_copied_app)
+
+    assert _rows(app, "SELECT uri, label, docname, anchor FROM processes") == [
+        (SYS + "ArcFurnace", "ArcFurnace", "other",
+         "http-example.org-system-ArcFurnace"),
+        (SYS + "BlastFurnace", "BlastFurnace", "index",
+         "http-example.org-system-BlastFurnace"),
+    ]
+    assert _rows(app, "SELECT * FROM recipe_items WHERE object LIKE '%Steel'") == [
+        (SYS + "ArcFurnace", "produces", SYS + "Steel", 1.0, KG, "other"),
+        (SYS + "BlastFurnace", "produces", SYS + "Steel", 1.0, KG, "index"),
+    ]
+    assert "output.sqlite: 3 documents updated, 0 removed" in app._status.getvalue()
+
+
+def test_sqlite_output_incremental(make_copied_app):
+    app = _build(make_copied_app)
+
+    other = app.srcdir / "other.rst"
+    other.write_text(
+        other.read_text().replace("ArcFurnace", "InductionFurnace")
+        + "\n.. system:process:: Melting\n    :composed_of: InductionFurnace\n"
+    )
+    app = _build(make_copied_app)
+    assert "output.sqlite: 1 documents updated, 0 removed" in app._status.getvalue()
+    assert _rows(app, "SELECT uri FROM processes") == [
+        (SYS + "BlastFurnace",), (SYS + "InductionFurnace",), (SYS + "Melting",),
+    ]
+    assert _rows(app, "SELECT process FROM recipe_items WHERE docname = 'other'") == [
+        (SYS + "InductionFurnace",), (SYS + "InductionFurnace",),
+    ]
+    assert _rows(app, "SELECT * FROM composition") == [
+        (SYS + "Melting", SYS + "InductionFurnace", "process", "other"),
+    ]
+
+    # Unchanged: nothing to do
+    app = _build(make_copied_app)
+    assert "output.sqlite: 0 documents updated, 0 removed" in app._status.getvalue()
+
+    other.unlink()
+    app = _build(make_copied_app)
+    assert "output.sqlite: 0 documents updated, 1 removed" in app._status.getvalue()
+    assert _rows(app, "SELECT uri FROM processes") == [(SYS + "BlastFurnace",)]
+    assert _rows(app, "SELECT * FROM composition") == []
+
+
+def test_sqlite_output_duplicate_moved(make_copied_app):
+    app = _build(make_copied_app)
+
+    # BlastFurnace is now defined again in "other", which is read last
+    other = app.srcdir / "other.rst"
+    other.write_text(
+        other.read_text()
+        + "\n.. system:process:: BlastFurnace\n"
+        + "    :produces: {object: Steel, amount: 3, unit: kg}\n"
+    )
+    app = _build(make_copied_app)
+    assert "output.sqlite: 1 documents updated, 0 removed" in app._status.getvalue()
+    assert _rows(app, "SELECT docname FROM things WHERE uri LIKE '%BlastFurnace'") == [
+        ("other",),
+    ]
+    assert _rows(
+        app, "SELECT amount, docname FROM recipe_items WHERE process LIKE '%Blast%'"
+    ) == [(3.0, "other")]
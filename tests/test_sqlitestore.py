@@ -0,0 +1,177 @@
+import pickle
+
+import pytest
+
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, Namespace, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF, RDFS, XSD
+from sphinx_probs_rdf.namespaces import PROBS, PROBS_RECIPE
+from sphinx_probs_rdf.sqlitestore import SQLiteStore
+
+SYS = Namespace("http://example.org/system/")
+
+
+@pytest.fixture
+def graph(tmp_path):
+    store = SQLiteStore()
+    store.open(str(tmp_path / "graph.sqlite"))
+    g = ConjunctiveGraph(store=store)
+    yield g
+    store.close()
+
+
+def test_add_and_query(graph):
+    doc1 = graph.get_context("doc1")
+    doc2 = graph.get_context("doc2")
+    recipe = BNode()
+    doc1.add((SYS.P1, RDF.type, PROBS.Process))
+    doc1.add((SYS.P1, RDFS.label, Literal("Making crumble", lang="en")))
+    doc1.add((SYS.P1, PROBS_RECIPE.hasRecipe, recipe))
+    doc1.add((recipe, PROBS_RECIPE.quantity, Literal(0.7)))
+    doc2.addN([
+        (SYS.P2, RDF.type, PROBS.Process, doc2),
+        (SYS.P1, RDF.type, PROBS.Process, doc2),
+    ])
+
+    assert len(doc1) == 4
+    assert len(doc2) == 2
+    assert len(graph) == 5
+    assert set(graph.subjects(RDF.type, PROBS.Process)) == {SYS.P1, SYS.P2}
+    assert graph.value(SYS.P1, RDFS.label) == Literal("Making crumble", lang="en")
+    quantity = graph.value(graph.value(SYS.P1, PROBS_RECIPE.hasRecipe),
+                           PROBS_RECIPE.quantity)
+    assert quantity.datatype == XSD.double
+    assert quantity.toPython() == 0.7
+    assert {c.identifier for c in graph.contexts((SYS.P1, RDF.type, None))} == {
+        URIRef("doc1"), URIRef("doc2")
+    }
+    # Quads' contexts are given by their identifiers
+    assert {c for _, _, _, c in graph.quads((SYS.P1, RDF.type, None))} == {
+        URIRef("doc1"), URIRef("doc2")
+    }
+    assert sorted(
+        (triple, sorted(contexts))
+        for triple, contexts in graph.store.triples((None, RDF.type, None), doc2)
+    ) == [
+        ((SYS.P1, RDF.type, PROBS.Process), [URIRef("doc1"), URIRef("doc2")]),
+        ((SYS.P2, RDF.type, PROBS.Process), [URIRef("doc2")]),
+    ]
+    assert (SYS.P2, RDF.type, PROBS.Process) in graph
+    assert (SYS.P2, RDF.type, PROBS.Object) not in graph
+    assert list(graph.triples((SYS.Unknown, None, None))) == []
+
+    doc1.remove((None, None, None))
+    assert len(doc1) == 0
+    assert set(graph.subjects(RDF.type, PROBS.Process)) == {SYS.P1, SYS.P2}
+    assert graph.value(SYS.P1, RDFS.label) is None
+
+
+def test_modify_while_iterating(graph):
+    for i in range(10):
+        graph.add((SYS.P1, PROBS.processComposedOfChildrenOf, SYS["P%d" % i]))
+    for s, p, o in graph.triples((None, PROBS.processComposedOfChildrenOf, None)):
+        graph.add((s, PROBS.processComposedOf, o))
+        graph.remove((s, p, o))
+    assert len(list(graph.objects(SYS.P1, PROBS.processComposedOf))) == 10
+    assert len(list(graph.objects(SYS.P1, PROBS.processComposedOfChildrenOf))) == 0
+
+
+def test_remove_context_prunes_terms(graph):
+    def count_terms():
+        return graph.store.conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+
+    doc1 = graph.get_context("doc1")
+    doc2 = graph.get_context("doc2")
+    doc2.add((SYS.P2, RDF.type, PROBS.Process))
+    before = count_terms()
+    for i in range(3):
+        doc1.remove((None, None, None))
+        doc1.add((SYS.P1, RDF.type, PROBS.Process))
+        doc1.add((SYS.P1, RDFS.label, Literal("Version %d" % i)))
+    assert count_terms() == before + 4  # doc1, P1, label, literal
+
+    doc1.remove((None, None, None))
+    assert count_terms() == before
+    # Terms still in use can be added again
+    doc1.add((SYS.P1, RDF.type, PROBS.Process))
+    assert set(graph.subjects(RDF.type, PROBS.Process)) == {SYS.P1, SYS.P2}
+
+
+def test_namespaces(graph):
+    graph.bind("sys", SYS)
+    assert graph.store.namespace("sys") == URIRef(SYS)
+    assert graph.store.prefix(SYS) == "sys"
+    assert SYS.P1.n3(graph.namespace_manager) == "sys:P1"
+
+
+def test_pickle(graph):
+    graph.get_context("doc1").add((SYS.P1, RDF.type, PROBS.Process))
+    graph.bind("sys", SYS)
+
+    copy = pickle.loads(pickle.dumps(graph))
+    assert copy.store.path == graph.store.path
+    assert (SYS.P1, RDF.type, PROBS.Process) in copy
+    assert len(copy.get_context("doc1")) == 1
+
+
+def test_serialize_matches_memory_store(graph):
+    memory = ConjunctiveGraph()
+    for g in (graph, memory):
+        g.bind("sys", SYS)
+        g.get_context("doc1").add((SYS.P1, RDFS.label, Literal("One")))
+        g.get_context("doc2").add((SYS.P1, PROBS.consumes, SYS.Apples))
+
+    for fmt in ("turtle", "nt"):
+        a = Graph().parse(data=graph.serialize(format=fmt), format=fmt)
+        b = Graph().parse(data=memory.serialize(format=fmt), format=fmt)
+        assert isomorphic(a, b)
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='myst',
+    confoverrides={
+        'probs_rdf_system_prefix': str(SYS),
+        'probs_rdf_store': 'sqlite',
+    })
+def test_build_with_sqlite_store(app, status, warning):
+    app.builder.build_all()
+
+    domain = app.env.get_domain("system")
+    assert isinstance(domain.graph.store, SQLiteStore)
+    assert domain.graph.store.path.startswith(str(app.doctreedir))
+
+    g = Graph()
+    g.parse(app.outdir / "output.ttl", format="ttl")
+    assert g.value(SYS.P1, PROBS_RECIPE.hasRecipe) is not None
+    assert (SYS.Crumble, RDF.type, PROBS.Object) in g
+
+
+def test_serialize_turtle(graph):
+    from io import BytesIO
+    from sphinx_probs_rdf.sqlitestore import serialize_turtle
+
+    memory = ConjunctiveGraph()
+    recipe = BNode()
+    for g in (graph, memory):
+        g.bind("sys", SYS)
+        g.bind("rec", PROBS_RECIPE)
+        doc1 = g.get_context("doc1")
+        doc1.add((SYS.P1, RDF.type, PROBS.Process))
+        doc1.add((SYS.P1, RDFS.label, Literal("One \"1\"", lang="en")))
+        doc1.add((SYS.P1, PROBS_RECIPE.hasRecipe, recipe))
+        doc1.add((recipe, PROBS_RECIPE.quantity, Literal(0.7)))
+        doc1.add((SYS["P1.x"], PROBS.consumes, SYS.Apples))
+        g.get_context("doc2").add((SYS.P1, PROBS.consumes, SYS["a/b"]))
+        g.get_context("doc2").add((SYS.P1, RDF.type, PROBS.Process))
+
+    f = BytesIO()
+    serialize_turtle(graph, f)
+    text = f.getvalue().decode("utf-8")
+    assert "@prefix sys: <%s> ." % SYS in text
+    assert "@prefix owl:" not in text  # bound by rdflib, but not used
+    assert "sys:P1 a " in text
+    assert "<%s>" % SYS["a/b"] in text
+
+    a = Graph().parse(data=text, format="turtle")
+    b = Graph().parse(data=memory.serialize(format="turtle"), format="turtle")
+    assert isomorphic(a, b)
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+SYS = "http://example.org/system/"
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='basic',
+    confoverrides={'probs_rdf_stats': True, 'probs_rdf_system_prefix': SYS})
+def test_stats(app, status, warning):
+    app.builder.build_all()
+
+    with open(app.outdir / "output.stats.json") as f:
+        stats = json.load(f)
+    assert stats["totals"] == {
+        "processes": 4, "objects": 1, "documents": 1, "market_processes": 1,
+    }
+    assert stats["documents"] == {"index": {"processes": 4, "objects": 1}}
+    assert stats["recipes"] == {
+        "processes_with_recipe": 2,
+        "recipe_items": 5,
+        "leaf_processes": 2,
+        "leaf_processes_with_recipe": 2,
+        "leaf_coverage": 1.0,
+    }
+    # Including the children of ParentOfP1P2 under AnotherParentOfP1P2
+    assert stats["hierarchy"]["process"] == {
+        "nodes": 4,
+        "roots": 2,
+        "max_depth": 1,
+        "max_fan_out": 2,
+        "mean_fan_out": 2.0,
+        "in_cycles": 0,
+    }
+    assert stats["hierarchy"]["object"]["nodes"] == 0
+    assert stats["orphan_objects"] == [SYS + "Obj1"]
+
+    page = (app.outdir / "output.stats.html").read_text()
+    assert "<li>%sObj1</li>" % SYS in page
+    assert "<tr><td>market_processes</td><td>1</td></tr>" in page
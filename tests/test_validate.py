@@ -0,0 +1,79 @@
+import pytest
+
+from rdflib import Namespace
+from sphinx_probs_rdf.validate import find_problems
+
+SYS = Namespace("http://example.org/system/")
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='references',
+    confoverrides={
+        'probs_rdf_system_prefix': str(SYS),
+        'probs_rdf_check_references': ['processes', 'objects', 'duplicates'],
+    })
+def test_reference_warnings(app, status, warning):
+    app.builder.build_all()
+
+    warnings = warning.getvalue().strip().splitlines()
+    assert len([w for w in warnings if "not defined" in w]) == 2
+    assert any(
+        "index.rst:8: WARNING: Process %s is not defined (used by %s)"
+        % (SYS.MissingChild, SYS.Parent) in w
+        for w in warnings
+    )
+    assert any(
+        "other.rst:4: WARNING: Object %s is not defined (used by %s)"
+        % (SYS.Pears, SYS.Child) in w
+        for w in warnings
+    )
+    assert any(
+        'index.rst:14: ERROR: Requested child "%s" of "%s" is not a Process'
+        % (SYS.MissingParent, SYS.Expanded) in w
+        for w in warnings
+    )
+    assert any(
+        "%s is defined in more than one document: index, other" % SYS.Child in w
+        for w in warnings
+    )
+
+
+@pytest.mark.sphinx(
+    'probs_rdf', testroot='references',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_find_problems(app, status, warning):
+    app.builder.build_all()
+    domain = app.env.get_domain("system")
+
+    problems = find_problems(domain)
+    assert [(p.kind, p.uri) for p in problems] == [
+        ("undefined-process", SYS.MissingChild),
+        ("children-of", SYS.MissingParent),
+        ("undefined-object", SYS.Pears),
+        ("duplicate", SYS.Child),
+    ]
+    assert problems[0].referrers == [SYS.Parent]
+    assert problems[0].docnames == ["index"]
+    assert problems[0].location == ("index", 8)
+    assert problems[3].docnames == ["index", "other"]
+    # Undefined objects are not reported by default
+    assert "Pears" not in warning.getvalue()
+
+    # Clearing a document forgets its definitions and references
+    domain.clear_doc("other")
+    assert [(p.kind, p.uri) for p in find_problems(domain)] == [
+        ("undefined-process", SYS.MissingChild),
+        ("children-of", SYS.MissingParent),
+    ]
+
+
+@pytest.mark.sphinx(
+    'html', testroot='references',
+    confoverrides={'probs_rdf_system_prefix': str(SYS)})
+def test_undefined_objects_warned_in_html(app, status, warning):
+    app.builder.build_all()
+
+    # As before the reference checks, from the Object Index
+    warnings = warning.getvalue()
+    assert "other.rst:4: WARNING: Object %s is not defined" % SYS.Pears in warnings
+    assert warnings.count("Object %s is not defined" % SYS.Pears) == 1
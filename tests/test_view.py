@@ -0,0 +1,41 @@
+import pytest
+
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDFS
+from sphinx_probs_rdf.namespaces import PROBS
+from sphinx_probs_rdf.view import build_view
+
+SYS = Namespace("http://example.org/system/")
+
+
+def test_view_from_graph():
+    g = Graph()
+    g.bind("sys", SYS)
+    g.add((SYS.Steelmaking, PROBS.processComposedOf, SYS.BlastFurnace))
+    g.add((SYS.Steelmaking, PROBS.processComposedOf, SYS.Casting))
+    g.add((SYS.Steelmaking, RDFS.label, Literal("Steel making")))
+
+    view = build_view(g)
+    assert view.n3(SYS.Casting) == "sys:Casting"
+    assert view.n3("http://example.org/system/Unknown") == "sys:Unknown"
+    assert view.labels(SYS.Steelmaking) == ("Steel making",)
+    assert view.labels(SYS.Casting) == ()
+    assert sorted(view.children("process", SYS.Steelmaking)) == [
+        str(SYS.BlastFurnace), str(SYS.Casting)
+    ]
+    assert view.parents("process", SYS.Casting) == [str(SYS.Steelmaking)]
+    assert view.children("object", SYS.Steelmaking) == []
+    assert view.recipe(SYS.Steelmaking) is None
+
+
+@pytest.mark.sphinx("html", testroot="aggregate")
+def test_view_recipes(app, status, warning):
+    app.build()
+
+    view = app.env.get_domain("system").get_view()
+    recipe = view.recipe(SYS.BlastFurnace)
+    assert [(row["object"], row["amount"]) for row in recipe["consumes"]] == [
+        (str(SYS.IronOre), 2.0)
+    ]
+    assert [row["object"] for row in recipe["produces"]] == [str(SYS.PigIron)]
+    assert view.recipe(SYS.Steelmaking) is None